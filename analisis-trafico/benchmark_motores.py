@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Compara de punta a punta (exportación + filtrado + procesamiento) los motores Pig, pandas y MongoDB.
+
+Con TAMANOS_BENCHMARK (por ejemplo "10000,100000,1000000") se repite la comparación sobre
+copias de los primeros N documentos de cada colección, para ver cómo escala cada motor.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+from datetime import datetime
+from functools import partial
+
+from filtrar_data import ultima_ejecucion
+from pipeline import copiar_entrada_pig, limpiar_salidas_pig, parametros_pig
+from procesar_data import REPORTES
+
+DIRECTORIO_RESULTADOS = os.environ.get('DIRECTORIO_RESULTADOS', '/app/results')
+REPETICIONES = int(os.environ.get('REPETICIONES_BENCHMARK', 3))
+# Los CSV exportados van a un directorio propio que se vacía antes de cada corrida
+DIRECTORIO_DATOS_BENCHMARK = os.environ.get('DIRECTORIO_DATOS_BENCHMARK', '/app/data_benchmark')
+# Salidas filtradas, carpetas ejecucion_* y benchmark_motores.json van a una carpeta propia para no
+# pisar los archivos de producción ni pasar por la última ejecución ante graficar.py o pipeline.py
+DIRECTORIO_RESULTADOS_BENCHMARK = os.environ.get('DIRECTORIO_RESULTADOS_BENCHMARK',
+                                                 os.path.join(DIRECTORIO_RESULTADOS, 'benchmark_motores'))
+# Entrada de procesar_data.pig; queda dentro de DIRECTORIO_DATOS_BENCHMARK, que se vacía en cada corrida
+DIRECTORIO_ENTRADA_PIG_BENCHMARK = os.path.join(DIRECTORIO_DATOS_BENCHMARK, 'entrada_pig')
+PARAMETROS_PIG = parametros_pig(DIRECTORIO_DATOS_BENCHMARK, DIRECTORIO_RESULTADOS_BENCHMARK,
+                                DIRECTORIO_ENTRADA_PIG_BENCHMARK)
+TAMANOS = [int(t) for t in os.environ.get('TAMANOS_BENCHMARK', '').split(',') if t.strip()]
+MONGO_URI = os.environ.get('MONGODB_URI', 'mongodb://mongo:27017/')
+MONGO_DB = os.environ.get('MONGODB_DB', 'waze_data')
+BASE_BENCHMARK = os.environ.get('MONGODB_DB_BENCHMARK', 'waze_benchmark')
+COLECCIONES = [os.environ.get('MONGODB_COLECCION_ALERTAS', 'alertas'),
+               os.environ.get('MONGODB_COLECCION_ATASCOS', 'atascos')]
+
+EXPORTAR = [sys.executable, 'exportar_mongo.py']
+
+MOTORES = {
+    'pig': [
+        EXPORTAR,
+        ['pig', '-x', 'local', *PARAMETROS_PIG, 'filtrar_data.pig'],
+        # Las partes que escribió filtrar_data.pig, no los CSV de una corrida anterior de pandas
+        partial(copiar_entrada_pig, DIRECTORIO_RESULTADOS_BENCHMARK, DIRECTORIO_ENTRADA_PIG_BENCHMARK),
+        ['pig', '-x', 'local', *PARAMETROS_PIG, 'procesar_data.pig'],
+    ],
+    'pandas': [
+        EXPORTAR,
+        [sys.executable, 'filtrar_data.py'],
+        [sys.executable, 'procesar_data.py'],
+    ],
+    'mongo': [
+        [sys.executable, 'motor_mongo.py'],
+    ],
+}
+# Preparación de cada corrida que no se cronometra
+PREPARAR = {'pig': partial(limpiar_salidas_pig, DIRECTORIO_RESULTADOS_BENCHMARK)}
+# Motor contra el que se comparan los reportes de los demás
+REFERENCIA = 'pandas'
+
+def preparar_base(tamano):
+    """Copia los primeros `tamano` documentos (por _id) de cada colección a la base del benchmark."""
+    import pymongo
+    client = pymongo.MongoClient(MONGO_URI)
+    documentos = {}
+    for coleccion in COLECCIONES:
+        client[MONGO_DB][coleccion].aggregate([
+            {'$sort': {'_id': 1}},
+            {'$limit': tamano},
+            {'$out': {'db': BASE_BENCHMARK, 'coll': coleccion}},
+        ], allowDiskUse=True)
+        documentos[coleccion] = client[BASE_BENCHMARK][coleccion].estimated_document_count()
+    client.close()
+    return documentos
+
+def ejecutar_motor(motor, entorno):
+    shutil.rmtree(DIRECTORIO_DATOS_BENCHMARK, ignore_errors=True)
+    os.makedirs(DIRECTORIO_DATOS_BENCHMARK)
+    if motor in PREPARAR:
+        PREPARAR[motor]()
+    produccion, anterior = ultima_ejecucion(DIRECTORIO_RESULTADOS), ultima_ejecucion(DIRECTORIO_RESULTADOS_BENCHMARK)
+    tiempos = []
+    for comando in MOTORES[motor]:
+        inicio = time.perf_counter()
+        if callable(comando):
+            comando()
+        else:
+            subprocess.run(comando, check=True, stdout=subprocess.DEVNULL, env=entorno)
+        tiempos.append(time.perf_counter() - inicio)
+    # Pig nombra la carpeta por segundo: esperar para no reutilizar el mismo nombre
+    time.sleep(1)
+    # Cada motor (también motor_mongo.py, que no pasa por exportar_mongo.py) debe dejar su carpeta
+    # ejecucion_* en la del benchmark y no en la de producción
+    if ultima_ejecucion(DIRECTORIO_RESULTADOS) != produccion:
+        raise RuntimeError(f"{motor} escribió una ejecución en {DIRECTORIO_RESULTADOS}")
+    carpeta = ultima_ejecucion(DIRECTORIO_RESULTADOS_BENCHMARK)
+    if carpeta == anterior:
+        raise RuntimeError(f"{motor} no dejó una ejecución nueva en {DIRECTORIO_RESULTADOS_BENCHMARK}")
+    return tiempos, carpeta
+
+def leer_lineas(ruta):
+    """Filas del reporte sin encabezado y ordenadas (Pig no garantiza el orden de los empates)."""
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding='utf-8') as archivo:
+        return sorted(archivo.read().splitlines()[1:])
+
+def comparar_salidas(carpeta, carpeta_referencia):
+    diferencias = {}
+    for reporte in REPORTES:
+        lineas = leer_lineas(os.path.join(carpeta, reporte))
+        lineas_referencia = leer_lineas(os.path.join(carpeta_referencia, reporte))
+        if lineas != lineas_referencia:
+            diferencias[reporte] = {
+                'filas': None if lineas is None else len(lineas),
+                'filas_referencia': None if lineas_referencia is None else len(lineas_referencia),
+            }
+    return diferencias
+
+def medir_escenario(tamano):
+    entorno = dict(os.environ, DIRECTORIO_DATOS=DIRECTORIO_DATOS_BENCHMARK,
+                   DIRECTORIO_RESULTADOS=DIRECTORIO_RESULTADOS_BENCHMARK, MODO_INCREMENTAL='0',
+                   FORMATO_INTERMEDIO='csv')
+    escenario = {'tamano': tamano, 'motores': {}}
+    if tamano is not None:
+        escenario['documentos'] = preparar_base(tamano)
+        entorno['MONGODB_DB'] = BASE_BENCHMARK
+        print(f"\n== {tamano} documentos por colección: {escenario['documentos']} ==")
+
+    carpetas = {}
+    for motor in MOTORES:
+        corridas = []
+        for repeticion in range(REPETICIONES):
+            tiempos, carpetas[motor] = ejecutar_motor(motor, entorno)
+            corridas.append({'pasos': tiempos, 'total': sum(tiempos)})
+            print(f"{motor} [{repeticion + 1}/{REPETICIONES}]: {sum(tiempos):.2f} s "
+                  f"({', '.join(f'{t:.2f}' for t in tiempos)})")
+        totales = sorted(corrida['total'] for corrida in corridas)
+        escenario['motores'][motor] = {
+            'corridas': corridas,
+            'mediana': totales[len(totales) // 2],
+            'minimo': totales[0],
+        }
+
+    escenario['diferencias'] = {motor: comparar_salidas(carpetas[motor], carpetas[REFERENCIA])
+                                for motor in MOTORES if motor != REFERENCIA}
+    # El motor MongoDB también contra la ruta exportación + Pig que reemplaza
+    escenario['diferencias_vs_pig'] = {motor: comparar_salidas(carpetas[motor], carpetas['pig'])
+                                       for motor in MOTORES if motor not in ('pig', REFERENCIA)}
+    escenario['aceleracion_vs_pig'] = {motor: escenario['motores']['pig']['mediana'] / datos['mediana']
+                                       for motor, datos in escenario['motores'].items() if motor != 'pig'}
+    return escenario
+
+def main():
+    os.makedirs(DIRECTORIO_RESULTADOS_BENCHMARK, exist_ok=True)
+    resultados = {'fecha': datetime.now().isoformat(), 'repeticiones': REPETICIONES, 'escenarios': []}
+
+    for tamano in TAMANOS or [None]:
+        escenario = medir_escenario(tamano)
+        resultados['escenarios'].append(escenario)
+        print(', '.join(f"mediana {motor}: {datos['mediana']:.2f} s"
+                        for motor, datos in escenario['motores'].items()))
+        for motor, diferencias in escenario['diferencias'].items():
+            if diferencias:
+                print(f"ADVERTENCIA: {motor} genera reportes distintos a {REFERENCIA}: {list(diferencias)}")
+        for motor, diferencias in escenario['diferencias_vs_pig'].items():
+            if diferencias:
+                print(f"ADVERTENCIA: {motor} genera reportes distintos a pig: {list(diferencias)}")
+
+    ruta = os.path.join(DIRECTORIO_RESULTADOS_BENCHMARK, 'benchmark_motores.json')
+    with open(ruta, 'w') as archivo:
+        json.dump(resultados, archivo, indent=2)
+    print(f"Resultados guardados en: {ruta}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""Agregación espacial: cuenta alertas y atascos por celda geohash y ventana de tiempo.
+
+La codificación geohash se calcula en NumPy sobre arreglos completos (intercalando los
+bits de longitud y latitud), y los conteos por (ventana, celda) salen de un np.unique sobre
+una clave entera, así que no hay bucles por punto. Genera CSV con los conteos, un mapa de
+calor PNG y, si folium está instalado, un mapa HTML.
+"""
+import os
+import glob
+import time
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+
+from filtrar_data import DIRECTORIO_DATOS, EXTENSION, ultima_ejecucion
+from procesar_data import ENTRADA_ALERTAS
+
+PRECISION_GEOHASH = int(os.environ.get('PRECISION_GEOHASH', 6))
+VENTANA_ESPACIAL = os.environ.get('VENTANA_ESPACIAL', '1h')
+MAPA_HTML = os.environ.get('MAPA_HTML', '1') == '1'
+# Celdas por lado como máximo en el PNG (se agrupan celdas vecinas si la zona es más grande)
+LADO_MAXIMO_MAPA = int(os.environ.get('LADO_MAXIMO_MAPA', 2000))
+
+BASE32 = np.array(list('0123456789bcdefghjkmnpqrstuvwxyz'))
+# La clave (ventana, celda) usa 40 bits para la celda: precisión máxima 8 (celdas de ~38 m)
+BITS_CELDA = 40
+
+def bits_por_eje(precision):
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+def codificar_geohash(latitud, longitud, precision=PRECISION_GEOHASH):
+    """Geohash de cada punto como entero de 5·precision bits (bits de longitud y latitud intercalados)."""
+    bits_lon, bits_lat = bits_por_eje(precision)
+    indice_lon = np.clip(((longitud + 180.0) / 360.0 * (1 << bits_lon)).astype(np.int64), 0, (1 << bits_lon) - 1)
+    indice_lat = np.clip(((latitud + 90.0) / 180.0 * (1 << bits_lat)).astype(np.int64), 0, (1 << bits_lat) - 1)
+    codigo = np.zeros(len(indice_lon), dtype=np.int64)
+    for posicion in range(5 * precision):
+        if posicion % 2 == 0:
+            bit = (indice_lon >> (bits_lon - 1 - posicion // 2)) & 1
+        else:
+            bit = (indice_lat >> (bits_lat - 1 - posicion // 2)) & 1
+        codigo = (codigo << 1) | bit
+    return codigo
+
+def indices_celda(codigo, precision=PRECISION_GEOHASH):
+    """Separa el código en los índices enteros de longitud y latitud de la celda."""
+    bits_lon, bits_lat = bits_por_eje(precision)
+    bits = 5 * precision
+    indice_lon = np.zeros(len(codigo), dtype=np.int64)
+    indice_lat = np.zeros(len(codigo), dtype=np.int64)
+    for posicion in range(bits):
+        bit = (codigo >> (bits - 1 - posicion)) & 1
+        if posicion % 2 == 0:
+            indice_lon = (indice_lon << 1) | bit
+        else:
+            indice_lat = (indice_lat << 1) | bit
+    return indice_lon, indice_lat
+
+def centro_celda(codigo, precision=PRECISION_GEOHASH):
+    bits_lon, bits_lat = bits_por_eje(precision)
+    indice_lon, indice_lat = indices_celda(codigo, precision)
+    return ((indice_lat + 0.5) * 180.0 / (1 << bits_lat) - 90.0,
+            (indice_lon + 0.5) * 360.0 / (1 << bits_lon) - 180.0)
+
+def texto_geohash(codigo, precision=PRECISION_GEOHASH):
+    caracteres = [BASE32[(codigo >> (5 * (precision - 1 - i))) & 31] for i in range(precision)]
+    return np.array([''.join(fila) for fila in zip(*caracteres)]) if len(codigo) else np.array([], dtype=str)
+
+def leer_columnas(ruta, columnas):
+    if ruta.endswith('.parquet'):
+        return pd.read_parquet(ruta, columns=columnas)
+    return pd.read_csv(ruta, usecols=columnas, dtype={'uuid': str, 'fecha': str, 'documento': str})
+
+def cargar_alertas():
+    if not os.path.exists(ENTRADA_ALERTAS):
+        return None
+    datos = leer_columnas(ENTRADA_ALERTAS, ['location_x', 'location_y', 'fecha'])
+    return datos.rename(columns={'location_x': 'x', 'location_y': 'y'})
+
+def leer_puntos(archivo):
+    if archivo.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        disponibles = pq.read_schema(archivo).names
+    else:
+        disponibles = pd.read_csv(archivo, nrows=0).columns
+    puntos = leer_columnas(archivo, [c for c in ['uuid', 'fecha', 'x', 'y', 'documento'] if c in disponibles])
+    if 'documento' not in puntos:
+        # Exportado antes de la columna documento: el archivo hace de documento
+        puntos['documento'] = os.path.basename(archivo)
+    return puntos
+
+def cargar_puntos_atascos():
+    """Vértices de los atascos exportados: por uuid, los de un solo documento con la fecha más temprana.
+
+    Un atasco recolectado varias veces conserva uuid y fecha, así que sin elegir un documento sus
+    copias quedarían una detrás de otra y se unirían en segmentos que no existen.
+    """
+    archivos = sorted(glob.glob(os.path.join(DIRECTORIO_DATOS, f'puntos_atasco_*.{EXTENSION}')))
+    if not archivos:
+        return None
+    puntos = pd.concat([leer_puntos(archivo) for archivo in archivos], ignore_index=True)
+    puntos = puntos.dropna(subset=['uuid', 'fecha', 'documento'])
+    puntos = puntos[puntos['fecha'] == puntos.groupby('uuid')['fecha'].transform('min')]
+    return puntos[puntos['documento'] == puntos.groupby('uuid')['documento'].transform('first')]
+
+def preparar(puntos, por_entidad=None):
+    """Filtra coordenadas inválidas y agrega las columnas celda y ventana (enteros)."""
+    x = pd.to_numeric(puntos['x'], errors='coerce').to_numpy(dtype='float64')
+    y = pd.to_numeric(puntos['y'], errors='coerce').to_numpy(dtype='float64')
+    fechas = pd.to_datetime(puntos['fecha'], format='ISO8601', errors='coerce')
+    validos = (np.isfinite(x) & np.isfinite(y) & (np.abs(y) <= 90) & (np.abs(x) <= 180)
+               & ~((x == 0) & (y == 0)) & fechas.notna().to_numpy())
+    resultado = pd.DataFrame({
+        'celda': codificar_geohash(y[validos], x[validos]),
+        'ventana': fechas[validos].dt.floor(VENTANA_ESPACIAL).to_numpy(),
+    })
+    if por_entidad is not None:
+        # Un atasco con varios vértices en la misma celda cuenta una sola vez
+        resultado['entidad'] = puntos[por_entidad].to_numpy()[validos]
+        resultado = resultado.drop_duplicates(['entidad', 'celda', 'ventana']).drop(columns='entidad')
+    return resultado
+
+def contar(preparados):
+    """Conteo por (ventana, celda) con np.unique sobre una clave entera combinada."""
+    if preparados is None or preparados.empty:
+        return pd.DataFrame(columns=['ventana', 'celda', 'cantidad'])
+    ventanas, indice_ventana = np.unique(preparados['ventana'].to_numpy(), return_inverse=True)
+    clave = (indice_ventana.astype(np.int64) << BITS_CELDA) | preparados['celda'].to_numpy()
+    claves, cantidades = np.unique(clave, return_counts=True)
+    return pd.DataFrame({
+        'ventana': ventanas[claves >> BITS_CELDA],
+        'celda': claves & ((1 << BITS_CELDA) - 1),
+        'cantidad': cantidades,
+    })
+
+def combinar(conteos, claves):
+    combinados = None
+    for nombre, conteo in conteos.items():
+        tabla = conteo.groupby(claves, sort=False)['cantidad'].sum().rename(nombre)
+        combinados = tabla.to_frame() if combinados is None else combinados.join(tabla, how='outer')
+    combinados = combinados.fillna(0).astype('int64').reset_index()
+    latitud, longitud = centro_celda(combinados['celda'].to_numpy())
+    combinados.insert(combinados.columns.get_loc('celda') + 1, 'latitud', latitud)
+    combinados.insert(combinados.columns.get_loc('celda') + 2, 'longitud', longitud)
+    combinados['celda'] = texto_geohash(combinados['celda'].to_numpy())
+    return combinados.rename(columns={'celda': 'geohash'})
+
+def mapa_calor(totales, nombre, ruta):
+    """Imagen de la grilla geohash con la cantidad por celda en escala logarítmica."""
+    codigos = totales['codigo'].to_numpy()
+    valores = totales[nombre].to_numpy()
+    codigos, valores = codigos[valores > 0], valores[valores > 0]
+    if len(codigos) == 0:
+        return False
+    indice_lon, indice_lat = indices_celda(codigos)
+    indice_lon -= indice_lon.min()
+    indice_lat -= indice_lat.min()
+    factor = max(1, int(np.ceil(max(indice_lon.max(), indice_lat.max()) / LADO_MAXIMO_MAPA)))
+    indice_lon //= factor
+    indice_lat //= factor
+    ancho, alto = indice_lon.max() + 1, indice_lat.max() + 1
+    grilla = np.bincount(indice_lat * ancho + indice_lon, weights=valores, minlength=ancho * alto)
+    grilla = np.ma.masked_equal(grilla.reshape(alto, ancho), 0)
+
+    latitud, longitud = totales['latitud'].to_numpy(), totales['longitud'].to_numpy()
+    plt.figure(figsize=(10, 10))
+    plt.imshow(grilla, origin='lower', cmap='inferno', norm=LogNorm(),
+               extent=[longitud.min(), longitud.max(), latitud.min(), latitud.max()], aspect='auto')
+    plt.colorbar(label=f'Cantidad de {nombre}')
+    plt.title(f'Mapa de calor de {nombre} (geohash {PRECISION_GEOHASH})', fontsize=16, fontweight='bold')
+    plt.xlabel('Longitud')
+    plt.ylabel('Latitud')
+    plt.savefig(ruta, dpi=150, bbox_inches='tight', facecolor='white')
+    plt.close('all')
+    return True
+
+def mapa_html(totales, ruta):
+    try:
+        import folium
+        from folium.plugins import HeatMap
+    except ImportError:
+        print("folium no está instalado: se omite el mapa HTML")
+        return False
+    centro = [totales['latitud'].mean(), totales['longitud'].mean()]
+    mapa = folium.Map(location=centro, zoom_start=11)
+    for nombre in ('alertas', 'atascos'):
+        if nombre in totales and totales[nombre].sum() > 0:
+            puntos = totales.loc[totales[nombre] > 0, ['latitud', 'longitud', nombre]].to_numpy().tolist()
+            HeatMap(puntos, name=nombre.capitalize(), radius=12).add_to(mapa)
+    folium.LayerControl().add_to(mapa)
+    mapa.save(ruta)
+    return True
+
+def main():
+    if not 1 <= PRECISION_GEOHASH <= BITS_CELDA // 5:
+        raise ValueError(f"PRECISION_GEOHASH debe estar entre 1 y {BITS_CELDA // 5}")
+    directorio_salida = os.environ.get('DIRECTORIO_SALIDA') or ultima_ejecucion()
+    if directorio_salida is None:
+        print("ERROR: No se encontraron directorios de ejecución.")
+        return
+
+    inicio = time.perf_counter()
+    conteos = {}
+    for nombre, datos, por_entidad in (('alertas', cargar_alertas(), None),
+                                       ('atascos', cargar_puntos_atascos(), 'uuid')):
+        if datos is None:
+            print(f"Sin datos de {nombre} con coordenadas, se omiten")
+            continue
+        conteos[nombre] = contar(preparar(datos, por_entidad))
+        print(f"{nombre}: {len(datos)} puntos en {conteos[nombre]['celda'].nunique()} celdas")
+    if not conteos:
+        return
+
+    por_ventana = combinar(conteos, ['ventana', 'celda']).sort_values(['ventana', 'geohash'])
+    totales = combinar(conteos, ['celda'])
+    totales['codigo'] = codificar_geohash(totales['latitud'].to_numpy(), totales['longitud'].to_numpy())
+    totales = totales.sort_values(list(conteos), ascending=False)
+    segundos = time.perf_counter() - inicio
+
+    por_ventana.to_csv(os.path.join(directorio_salida, 'celdas_por_ventana.csv'), index=False)
+    totales.drop(columns='codigo').to_csv(os.path.join(directorio_salida, 'celdas_totales.csv'), index=False)
+
+    carpeta_imagenes = os.path.join(directorio_salida, 'visualizaciones_optimizadas')
+    os.makedirs(carpeta_imagenes, exist_ok=True)
+    for nombre in conteos:
+        ruta = os.path.join(carpeta_imagenes, f'mapa_calor_{nombre}.png')
+        if mapa_calor(totales, nombre, ruta):
+            print(f"Mapa de calor de {nombre} guardado en: {ruta}")
+    if MAPA_HTML and mapa_html(totales, os.path.join(directorio_salida, 'mapa_calor.html')):
+        print(f"Mapa HTML guardado en: {os.path.join(directorio_salida, 'mapa_calor.html')}")
+
+    print(f"Agregación espacial: {len(totales)} celdas, {por_ventana['ventana'].nunique()} ventanas "
+          f"de {VENTANA_ESPACIAL} en {segundos:.2f} s")
+
+if __name__ == "__main__":
+    main()
@@ -1,106 +1,320 @@
 #!/usr/bin/env python3
 import os
 import csv
+import json
+import time
 import pymongo
+from bson import ObjectId
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-def procesar_ciudad(city):
+from polilinea import decodificar
+
+# Variables de configuración
+MONGO_URI = os.environ.get('MONGODB_URI', 'mongodb://mongo:27017/')
+MONGO_DB = os.environ.get('MONGODB_DB', 'waze_data')
+COL_ALERTAS = os.environ.get('MONGODB_COLECCION_ALERTAS', 'alertas')
+COL_ATASCOS = os.environ.get('MONGODB_COLECCION_ATASCOS', 'atascos')
+# Procesos que exportan rangos de _id en paralelo y documentos por lote del cursor
+TRABAJADORES_EXPORTACION = int(os.environ.get('TRABAJADORES_EXPORTACION', os.cpu_count() or 1))
+TAMANO_LOTE_EXPORTACION = int(os.environ.get('TAMANO_LOTE_EXPORTACION', 5000))
+# Por debajo de esta cantidad de documentos por parte no conviene dividir más la colección
+MINIMO_POR_PARTE = int(os.environ.get('MINIMO_POR_PARTE', 20000))
+# "csv" (por defecto, compatible con Pig) o "parquet" (columnas tipadas y comprimidas)
+FORMATO_INTERMEDIO = os.environ.get('FORMATO_INTERMEDIO', 'csv')
+COMPRESION_PARQUET = os.environ.get('COMPRESION_PARQUET', 'zstd')
+
+COLUMNAS_ALERTAS = [
+    "uuid", "city", "municipalityUser", "type", "street",
+    "confidence", "location_x", "location_y", "fecha"
+]
+COLUMNAS_ATASCOS = [
+    "uuid", "severity", "country", "length", "endnode",
+    "roadtype", "speed", "street", "fecha", "region", "city"
+]
+# Vértices de la línea de cada atasco, en un archivo aparte para el análisis espacial
+COLUMNAS_PUNTOS_ATASCOS = ["uuid", "fecha", "x", "y", "documento"]
+
+# Campos que se piden al servidor (el resto del documento no viaja por la red)
+PROYECCION_ALERTAS = ["uuid", "city", "reportByMunicipalityUser", "type", "street",
+                      "confidence", "location", "x", "y", "fecha"]
+PROYECCION_ATASCOS = ["uuid", "severity", "country", "length", "endNode", "roadType",
+                      "speedKMH", "speed", "street", "fecha", "region", "city", "line", "polyline"]
+
+# Columnas que se guardan como float64 en Parquet (el resto como texto)
+NUMERICAS = {"confidence", "location_x", "location_y", "severity", "length", "roadtype", "speed", "x", "y"}
+
+def procesar_ciudad(city, separador=';'):
     if not city or not isinstance(city, str):
         return city
-    
-    # Reemplazar comas por punto y coma
+
+    # Reemplazar comas por punto y coma (en Parquet no hace falta: se conserva la coma)
     city_limpia = city.replace(',', ';')
     partes = city_limpia.split(';')
     partes_formateadas = [parte.strip().title() for parte in partes]
-    
-    return ';'.join(partes_formateadas)
+
+    return separador.join(partes_formateadas)
+
+def fila_alerta(documento, separador=';'):
+    ubicacion = documento.get("location", {})
+    return [
+        documento.get("uuid", f"item_{documento['_id']}"),
+        procesar_ciudad(documento.get("city", ""), separador),
+        documento.get("reportByMunicipalityUser", ""),
+        documento.get("type", ""),
+        documento.get("street", ""),
+        documento.get("confidence", 0),
+        ubicacion.get("x", documento.get("x", 0)),
+        ubicacion.get("y", documento.get("y", 0)),
+        documento.get("fecha", ""),
+    ]
+
+def fila_atasco(documento, separador=';'):
+    return [
+        documento.get("uuid", f"item_{documento['_id']}"),
+        documento.get("severity", ""),
+        documento.get("country", ""),
+        documento.get("length", ""),
+        documento.get("endNode", ""),
+        documento.get("roadType", ""),
+        documento.get("speedKMH", documento.get("speed", "")),
+        documento.get("street", ""),
+        documento.get("fecha", ""),
+        documento.get("region", ""),
+        procesar_ciudad(documento.get("city", ""), separador),
+    ]
+
+def filas_puntos_atasco(documento):
+    """Vértices del atasco, ya sea como lista de puntos (`line`) o codificados (`polyline`).
+
+    La columna documento (el _id) separa las copias de un mismo atasco recolectado varias veces,
+    que comparten uuid y fecha.
+    """
+    identificador = documento.get("uuid", f"item_{documento['_id']}")
+    fecha = documento.get("fecha", "")
+    origen = str(documento["_id"])
+    if documento.get("polyline"):
+        return [[identificador, fecha, x, y, origen] for x, y in decodificar(documento["polyline"])]
+    return [[identificador, fecha, punto.get("x"), punto.get("y"), origen]
+            for punto in documento.get("line") or [] if isinstance(punto, dict)]
+
+# tipo -> (prefijo del archivo, columnas, proyección, transformación,
+#          archivo adicional escrito en la misma lectura: (prefijo, columnas, transformación a varias filas))
+EXPORTACIONES = {
+    'alertas': ('transformed_alerta', COLUMNAS_ALERTAS, PROYECCION_ALERTAS, fila_alerta, None),
+    'atascos': ('transformed_atasco', COLUMNAS_ATASCOS, PROYECCION_ATASCOS, fila_atasco,
+                ('puntos_atasco', COLUMNAS_PUNTOS_ATASCOS, filas_puntos_atasco)),
+}
+
+class EscritorCsv:
+    def __init__(self, ruta, columnas):
+        self.archivo = open(ruta, 'w', newline='')
+        self.escritor = csv.writer(self.archivo, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+        self.escritor.writerow(columnas)
+
+    def escribir(self, filas):
+        self.escritor.writerows(filas)
+
+    def cerrar(self):
+        self.archivo.close()
+
+class EscritorParquet:
+    """Escribe cada lote como un row group con tipos fijos; los valores vacíos quedan como nulos."""
+
+    def __init__(self, ruta, columnas):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.columnas = columnas
+        self.esquema = pa.schema([(c, pa.float64() if c in NUMERICAS else pa.string()) for c in columnas])
+        self.escritor = pq.ParquetWriter(ruta, self.esquema, compression=COMPRESION_PARQUET)
+
+    @staticmethod
+    def convertir(valor, numerica):
+        if valor is None or valor == "":
+            return None
+        if not numerica:
+            return str(valor)
+        try:
+            return float(valor)
+        except (TypeError, ValueError):
+            return None
+
+    def escribir(self, filas):
+        if not filas:
+            return
+        arreglos = [self.pa.array([self.convertir(valor, columna in NUMERICAS) for valor in valores],
+                                  type=self.esquema.field(columna).type)
+                    for columna, valores in zip(self.columnas, zip(*filas))]
+        self.escritor.write_table(self.pa.Table.from_arrays(arreglos, schema=self.esquema))
+
+    def cerrar(self):
+        self.escritor.close()
+
+def cargar_marcas(ruta):
+    """Último _id exportado por colección (marca de agua del modo incremental)."""
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta) as archivo:
+        return json.load(archivo)
+
+def guardar_marcas(ruta, marcas):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w') as archivo:
+        json.dump(marcas, archivo, indent=2)
+    os.replace(temporal, ruta)
+
+def filtro_base(coleccion, marcas, incremental):
+    # En modo incremental solo los documentos posteriores a la marca
+    if incremental and coleccion in marcas:
+        return {'_id': {'$gt': ObjectId(marcas[coleccion])}}
+    return {}
+
+def calcular_rangos(coleccion, filtro, trabajadores):
+    """Divide la colección en rangos [desde, hasta) de _id con cantidades similares de documentos.
+
+    Los límites se buscan recorriendo el índice de _id, sin leer los documentos.
+    """
+    total = coleccion.count_documents(filtro)
+    partes = max(1, min(trabajadores, total // MINIMO_POR_PARTE))
+    limites = [None]
+    for i in range(1, partes):
+        documento = next(coleccion.find(filtro, {'_id': 1}).sort('_id', pymongo.ASCENDING)
+                         .skip(i * total // partes).limit(1), None)
+        if documento is not None and documento['_id'] != limites[-1]:
+            limites.append(documento['_id'])
+    limites.append(None)
+    return total, list(zip(limites[:-1], limites[1:]))
+
+_cliente = None
+
+def exportar_rango(tarea):
+    """Exporta un rango de _id a su propio archivo parte; se ejecuta en un proceso trabajador."""
+    global _cliente
+    if _cliente is None:
+        # Cada proceso abre su propia conexión (MongoClient no se comparte entre procesos)
+        _cliente = pymongo.MongoClient(MONGO_URI)
+    _, columnas, proyeccion, transformar, adicional = EXPORTACIONES[tarea['tipo']]
+
+    filtro = dict(tarea['filtro'])
+    condicion_id = dict(filtro.get('_id', {}))
+    if tarea['desde'] is not None:
+        condicion_id['$gte'] = tarea['desde']
+    if tarea['hasta'] is not None:
+        condicion_id['$lt'] = tarea['hasta']
+    if condicion_id:
+        filtro['_id'] = condicion_id
+
+    parquet = FORMATO_INTERMEDIO == 'parquet'
+    separador = ', ' if parquet else ';'
+    inicio = time.perf_counter()
+    cursor = _cliente[MONGO_DB][tarea['coleccion']].find(filtro, proyeccion, batch_size=TAMANO_LOTE_EXPORTACION)
+    contador = 0
+    ultimo_id = None
+    clase_escritor = EscritorParquet if parquet else EscritorCsv
+    escritor = clase_escritor(tarea['ruta'], columnas)
+    escritor_adicional = clase_escritor(tarea['ruta_adicional'], adicional[1]) if adicional else None
+    try:
+        lote = []
+        lote_adicional = []
+        for documento in cursor:
+            lote.append(transformar(documento, separador))
+            if adicional:
+                lote_adicional.extend(adicional[2](documento))
+            if ultimo_id is None or documento['_id'] > ultimo_id:
+                ultimo_id = documento['_id']
+            if len(lote) >= TAMANO_LOTE_EXPORTACION:
+                escritor.escribir(lote)
+                contador += len(lote)
+                lote = []
+                if escritor_adicional:
+                    escritor_adicional.escribir(lote_adicional)
+                    lote_adicional = []
+        escritor.escribir(lote)
+        contador += len(lote)
+        if escritor_adicional:
+            escritor_adicional.escribir(lote_adicional)
+    finally:
+        escritor.cerrar()
+        if escritor_adicional:
+            escritor_adicional.cerrar()
+    return {'ruta': tarea['ruta'], 'ruta_adicional': tarea.get('ruta_adicional'),
+            'tipo': tarea['tipo'], 'documentos': contador,
+            'segundos': time.perf_counter() - inicio, 'ultimo_id': str(ultimo_id) if ultimo_id else None}
 
 def main():
     print("Iniciando exportación desde MongoDB")
-    
-    # Variables de configuración
-    mongo_uri = os.environ.get('MONGODB_URI', 'mongodb://mongo:27017/')
-    mongo_db = os.environ.get('MONGODB_DB', 'waze_data')
-    col_alertas = os.environ.get('MONGODB_COLECCION_ALERTAS', 'alertas')
-    col_atascos = os.environ.get('MONGODB_COLECCION_ATASCOS', 'atascos')
-    
+    incremental = os.environ.get('MODO_INCREMENTAL') == '1'
+
     # Conexión a la base de datos
-    client = pymongo.MongoClient(mongo_uri)
-    database = client[mongo_db]
-    
+    client = pymongo.MongoClient(MONGO_URI)
+    database = client[MONGO_DB]
+
     # Crear directorio y timestamp
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    directorio_salida = "/app/data"
+    directorio_salida = os.environ.get('DIRECTORIO_DATOS', "/app/data")
     os.makedirs(directorio_salida, exist_ok=True)
-    
-    # Procesar alertas
-    archivo_alertas = f"{directorio_salida}/transformed_alerta_alertas_{timestamp}.csv"
-    columnas_alertas = [
-        "uuid", "city", "municipalityUser", "type", "street", 
-        "confidence", "location_x", "location_y", "fecha"
-    ]
-    
-    with open(archivo_alertas, 'w', newline='') as archivo:
-        escritor = csv.DictWriter(
-            archivo, fieldnames=columnas_alertas, delimiter=',', 
-            quotechar='"', quoting=csv.QUOTE_MINIMAL
-        )
-        escritor.writeheader()
-        
-        contador_alertas = 0
-        for documento in database[col_alertas].find({}, {'_id': 0}):
-            ciudad_procesada = procesar_ciudad(documento.get("city", ""))
-            registro = {
-                "uuid": documento.get("uuid", f"item_{contador_alertas}"),
-                "city": ciudad_procesada,
-                "municipalityUser": documento.get("reportByMunicipalityUser", ""),
-                "type": documento.get("type", ""),
-                "street": documento.get("street", ""),
-                "confidence": documento.get("confidence", 0),
-                "location_x": documento.get("location", {}).get("x", documento.get("x", 0)),
-                "location_y": documento.get("location", {}).get("y", documento.get("y", 0)),
-                "fecha": documento.get("fecha", "")
-            }
-            escritor.writerow(registro)
-            contador_alertas += 1
-    
-    print(f"Exportadas {contador_alertas} alertas")
-    
-    # Procesar atascos
-    archivo_atascos = f"{directorio_salida}/transformed_atasco_atascos_{timestamp}.csv"
-    columnas_atascos = [
-        "uuid", "severity", "country", "length", "endnode", 
-        "roadtype", "speed", "street", "fecha", "region", "city"
-    ]
-    
-    with open(archivo_atascos, 'w', newline='') as archivo:
-        escritor = csv.DictWriter(
-            archivo, fieldnames=columnas_atascos, delimiter=',', 
-            quotechar='"', quoting=csv.QUOTE_MINIMAL
-        )
-        escritor.writeheader()
-        
-        contador_atascos = 0
-        for documento in database[col_atascos].find({}, {'_id': 0}):
-            ciudad_procesada = procesar_ciudad(documento.get("city", ""))
-            registro = {
-                "uuid": documento.get("uuid", f"item_{contador_atascos}"),
-                "severity": documento.get("severity", ""),
-                "country": documento.get("country", ""),
-                "length": documento.get("length", ""),
-                "endnode": documento.get("endNode", ""),
-                "roadtype": documento.get("roadType", ""),
-                "speed": documento.get("speedKMH", documento.get("speed", "")),
-                "street": documento.get("street", ""),
-                "fecha": documento.get("fecha", ""),
-                "region": documento.get("region", ""),
-                "city": ciudad_procesada
-            }
-            escritor.writerow(registro)
-            contador_atascos += 1
-    
-    print(f"Exportados {contador_atascos} atascos")
+    ruta_marcas = f"{directorio_salida}/estado_exportacion.json"
+    marcas = cargar_marcas(ruta_marcas) if incremental else {}
+    if incremental:
+        print(f"Modo incremental, marcas de agua: {marcas or 'ninguna (exportación completa)'}")
+
+    # Alertas y atascos se reparten en rangos de _id y se exportan a la vez
+    extension = 'parquet' if FORMATO_INTERMEDIO == 'parquet' else 'csv'
+    tareas = []
+    for tipo, coleccion in (('alertas', COL_ALERTAS), ('atascos', COL_ATASCOS)):
+        filtro = filtro_base(coleccion, marcas, incremental)
+        total, rangos = calcular_rangos(database[coleccion], filtro, TRABAJADORES_EXPORTACION)
+        print(f"{tipo}: {total} documentos en {len(rangos)} partes")
+        prefijo, adicional = EXPORTACIONES[tipo][0], EXPORTACIONES[tipo][4]
+        for numero, (desde, hasta) in enumerate(rangos):
+            tareas.append({
+                'tipo': tipo, 'coleccion': coleccion, 'filtro': filtro, 'desde': desde, 'hasta': hasta,
+                'ruta': f"{directorio_salida}/{prefijo}_{coleccion}_{timestamp}_part{numero}.{extension}",
+                'ruta_adicional': adicional and
+                    f"{directorio_salida}/{adicional[0]}_{coleccion}_{timestamp}_part{numero}.{extension}",
+            })
+    client.close()
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(1, min(TRABAJADORES_EXPORTACION, len(tareas)))) as ejecutor:
+        partes = list(ejecutor.map(exportar_rango, tareas))
+    segundos = time.perf_counter() - inicio
+
+    metricas = {'fecha': timestamp, 'trabajadores': TRABAJADORES_EXPORTACION,
+                'tamano_lote': TAMANO_LOTE_EXPORTACION, 'segundos': segundos, 'colecciones': {}}
+    for tipo, coleccion in (('alertas', COL_ALERTAS), ('atascos', COL_ATASCOS)):
+        del_tipo = [parte for parte in partes if parte['tipo'] == tipo]
+        documentos = sum(parte['documentos'] for parte in del_tipo)
+        metricas['colecciones'][tipo] = {
+            'documentos': documentos,
+            'partes': [{'archivo': os.path.basename(p['ruta']), 'documentos': p['documentos'],
+                        'documentos_por_segundo': p['documentos'] / p['segundos'] if p['segundos'] > 0 else None}
+                       for p in del_tipo],
+        }
+        print(f"Exportad{'as' if tipo == 'alertas' else 'os'} {documentos} {tipo} "
+              f"({documentos / segundos if segundos > 0 else 0:,.0f} docs/s)")
+
+        if incremental:
+            ids = [parte['ultimo_id'] for parte in del_tipo if parte['ultimo_id']]
+            if ids:
+                marcas[coleccion] = max(ids, key=ObjectId)
+
+    total = sum(parte['documentos'] for parte in partes)
+    metricas['documentos_por_segundo'] = total / segundos if segundos > 0 else None
+    print(f"Total: {total} documentos en {segundos:.2f} s ({metricas['documentos_por_segundo'] or 0:,.0f} docs/s)")
+    with open(f"{directorio_salida}/metricas_exportacion.json", 'w') as archivo:
+        json.dump(metricas, archivo, indent=2)
+
+    if incremental:
+        # Sin documentos nuevos no se deja un archivo vacío para el siguiente paso
+        for parte in partes:
+            if parte['documentos'] == 0:
+                os.remove(parte['ruta'])
+                if parte['ruta_adicional']:
+                    os.remove(parte['ruta_adicional'])
+        guardar_marcas(ruta_marcas, marcas)
     print("Exportación completada")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""Equivalente en pandas de filtrar_data.pig: filtra registros incompletos y elimina duplicados por uuid.
+
+Los archivos se recorren en bloques: la validación es vectorizada por bloque y la deduplicación
+mantiene solo el registro más temprano de cada uuid, sin ordenar todo el conjunto de una vez.
+"""
+import os
+import re
+import sys
+import glob
+import json
+import shutil
+import tempfile
+import pandas as pd
+
+DIRECTORIO_DATOS = os.environ.get('DIRECTORIO_DATOS', '/app/data')
+DIRECTORIO_RESULTADOS = os.environ.get('DIRECTORIO_RESULTADOS', '/app/results')
+# Formato de los archivos entre etapas: "csv" (por defecto, compatible con Pig) o "parquet"
+FORMATO_INTERMEDIO = os.environ.get('FORMATO_INTERMEDIO', 'csv')
+EXTENSION = 'parquet' if FORMATO_INTERMEDIO == 'parquet' else 'csv'
+COMPRESION_PARQUET = os.environ.get('COMPRESION_PARQUET', 'zstd')
+# Filas por bloque de lectura
+TAMANO_BLOQUE_FILTRO = int(os.environ.get('TAMANO_BLOQUE_FILTRO', 200000))
+# Uuids distintos que se mantienen en memoria antes de repartir el resto en disco
+MAXIMO_FILAS_DEDUP = int(os.environ.get('MAXIMO_FILAS_DEDUP', 5000000))
+PARTICIONES_DEDUP = int(os.environ.get('PARTICIONES_DEDUP', 16))
+DIRECTORIO_TEMPORAL_DEDUP = os.environ.get('DIRECTORIO_TEMPORAL_DEDUP') or None
+
+COLUMNAS_ALERTAS = [
+    "uuid", "city", "municipalityUser", "type", "street",
+    "confidence", "location_x", "location_y", "fecha"
+]
+NUMERICAS_ALERTAS = ["confidence", "location_x", "location_y"]
+
+COLUMNAS_ATASCOS = [
+    "uuid", "severity", "country", "length", "endnode",
+    "roadtype", "speed", "street", "fecha", "region", "city"
+]
+NUMERICAS_ATASCOS = ["severity", "length", "roadtype", "speed"]
+ENTERAS_ATASCOS = ["severity", "length", "roadtype"]
+
+SALIDA_ALERTAS = os.path.join(DIRECTORIO_RESULTADOS, 'reportes_ciudadanos_procesados', f'reportes_ciudadanos_final.{EXTENSION}')
+SALIDA_ATASCOS = os.path.join(DIRECTORIO_RESULTADOS, 'congestion_vehicular_procesada', f'congestion_vehicular_final.{EXTENSION}')
+
+def ultima_ejecucion(directorio=DIRECTORIO_RESULTADOS):
+    """Carpeta ejecucion_AAAAMMDD_HHMMSS más reciente, o None si todavía no hay ninguna."""
+    expresion = re.compile(r'ejecucion_\d{8}_\d{6}$')
+    if not os.path.isdir(directorio):
+        return None
+    carpetas = sorted(d for d in os.listdir(directorio)
+                      if expresion.match(d) and os.path.isdir(os.path.join(directorio, d)))
+    return os.path.join(directorio, carpetas[-1]) if carpetas else None
+
+def leer_archivo(archivo, columnas):
+    if archivo.endswith('.parquet'):
+        return pd.read_parquet(archivo, columns=columnas)
+    return pd.read_csv(archivo, names=columnas, header=None, dtype=str, keep_default_na=False)
+
+def cargar_csv(patron, columnas, numericas):
+    """Carga todos los CSV (o Parquet) que calzan con el patrón, con los tipos del esquema de Pig."""
+    archivos = sorted(glob.glob(patron))
+    partes = [leer_archivo(archivo, columnas) for archivo in archivos]
+    if not partes:
+        return pd.DataFrame(columns=columnas)
+    datos = pd.concat(partes, ignore_index=True)
+    # Encabezados repetidos de cada archivo (equivalente a FILTER ... BY uuid != 'uuid')
+    datos = datos[datos['uuid'] != 'uuid']
+    for columna in numericas:
+        datos[columna] = pd.to_numeric(datos[columna], errors='coerce').astype('float64')
+    return datos
+
+def leer_bloques(archivo, columnas, filas=TAMANO_BLOQUE_FILTRO):
+    """Lee un archivo en bloques de `filas` filas para no cargarlo entero."""
+    if archivo.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for lote in pq.ParquetFile(archivo).iter_batches(batch_size=filas, columns=columnas):
+            yield lote.to_pandas()
+    else:
+        yield from pd.read_csv(archivo, names=columnas, header=None, dtype=str, keep_default_na=False,
+                               chunksize=filas)
+
+def iterar_bloques(patron, columnas, numericas):
+    """Bloques de todos los archivos que calzan con el patrón, con los tipos del esquema de Pig."""
+    for archivo in sorted(glob.glob(patron)):
+        for datos in leer_bloques(archivo, columnas):
+            datos = datos[datos['uuid'] != 'uuid']
+            for columna in numericas:
+                datos[columna] = pd.to_numeric(datos[columna], errors='coerce').astype('float64')
+            yield datos
+
+def filtrar_completos(datos, numericas):
+    """Descarta filas con campos nulos o de texto vacíos."""
+    texto = datos.columns.difference(numericas)
+    completos = datos.notna().all(axis=1) & (datos[texto] != '').all(axis=1)
+    return datos[completos]
+
+def eliminar_duplicados(datos):
+    """Conserva por uuid el registro con la fecha más temprana."""
+    return datos.sort_values('fecha', kind='stable').drop_duplicates('uuid', keep='first')
+
+class Deduplicador:
+    """Mínimo de fecha por uuid sobre un flujo de bloques, equivalente a GROUP BY uuid + ORDER + LIMIT 1.
+
+    Cada bloque se reduce a su primer registro por uuid y se acumula; cuando lo acumulado supera
+    a los ganadores se compactan juntos, así que en memoria queda a lo más una fila por uuid más
+    un bloque por compactar. Si los ganadores pasan de MAXIMO_FILAS_DEDUP, el resto del flujo se
+    reparte por hash del uuid en PARTICIONES_DEDUP archivos en disco que se deduplican de a uno.
+    Los empates de fecha los gana el registro que aparece primero, igual que con un solo sort estable.
+    """
+
+    def __init__(self, maximo_filas=None, particiones=None):
+        self.maximo_filas = maximo_filas or MAXIMO_FILAS_DEDUP
+        self.particiones = particiones or PARTICIONES_DEDUP
+        self.ganadores = None
+        self.pendientes = []
+        self.filas_pendientes = 0
+        self.directorio = None
+        self.piezas = 0
+
+    def agregar(self, datos):
+        datos = eliminar_duplicados(datos)
+        if self.directorio is not None:
+            self.derramar(datos)
+            return
+        self.pendientes.append(datos)
+        self.filas_pendientes += len(datos)
+        acumulados = len(self.ganadores) if self.ganadores is not None else 0
+        if self.filas_pendientes >= max(TAMANO_BLOQUE_FILTRO, acumulados):
+            self.compactar()
+            if len(self.ganadores) > self.maximo_filas:
+                self.directorio = tempfile.mkdtemp(prefix='dedup_', dir=DIRECTORIO_TEMPORAL_DEDUP)
+                self.derramar(self.ganadores)
+                self.ganadores = None
+
+    def compactar(self):
+        partes = ([self.ganadores] if self.ganadores is not None else []) + self.pendientes
+        self.ganadores = eliminar_duplicados(pd.concat(partes, ignore_index=True))
+        self.pendientes = []
+        self.filas_pendientes = 0
+
+    def derramar(self, datos):
+        """Agrega el bloque (ya sin duplicados internos) a la partición de cada uuid."""
+        particion = pd.util.hash_pandas_object(datos['uuid'], index=False).to_numpy() % self.particiones
+        for numero, grupo in datos.groupby(particion, sort=False):
+            grupo.to_pickle(os.path.join(self.directorio, f'{numero}_{self.piezas:08d}.pkl'))
+            self.piezas += 1
+
+    def resultados(self):
+        """DataFrames sin duplicados: uno solo ordenado por fecha, o uno por partición si hubo derrame."""
+        if self.directorio is None:
+            if self.pendientes:
+                self.compactar()
+            if self.ganadores is not None:
+                yield self.ganadores
+            return
+        try:
+            for numero in range(self.particiones):
+                # Las piezas se leen en el orden en que se escribieron para respetar los empates
+                piezas = sorted(glob.glob(os.path.join(self.directorio, f'{numero}_*.pkl')))
+                if piezas:
+                    yield eliminar_duplicados(pd.concat([pd.read_pickle(pieza) for pieza in piezas],
+                                                        ignore_index=True))
+        finally:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+
+class Escritor:
+    """Escribe los resultados por partes en un CSV o Parquet; el archivo queda completo al cerrar."""
+
+    def __init__(self, ruta, columnas, numericas=(), enteras=()):
+        self.ruta = ruta
+        self.columnas = columnas
+        self.numericas = numericas
+        self.enteras = enteras
+        self.temporal = os.path.join(os.path.dirname(ruta), f'.tmp_{os.path.basename(ruta)}')
+        self.parquet = None
+        self.filas = 0
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    def esquema(self):
+        """Tipos fijos del esquema: no se infieren del primer bloque, donde una columna puede venir toda nula."""
+        import pyarrow as pa
+        return pa.schema([(columna, pa.int64() if columna in self.enteras
+                           else pa.float64() if columna in self.numericas else pa.string())
+                          for columna in self.columnas])
+
+    def abrir_parquet(self):
+        import pyarrow.parquet as pq
+        if self.parquet is None:
+            self.parquet = pq.ParquetWriter(self.temporal, self.esquema(), compression=COMPRESION_PARQUET)
+        return self.parquet
+
+    def escribir(self, datos):
+        if self.ruta.endswith('.parquet'):
+            import pyarrow as pa
+            escritor = self.abrir_parquet()
+            escritor.write_table(pa.Table.from_pandas(datos[self.columnas], schema=escritor.schema,
+                                                      preserve_index=False))
+        else:
+            datos.to_csv(self.temporal, index=False, header=self.filas == 0, mode='w' if self.filas == 0 else 'a')
+        self.filas += len(datos)
+
+    def cerrar(self):
+        if self.ruta.endswith('.parquet'):
+            self.abrir_parquet().close()
+        elif not os.path.exists(self.temporal):
+            guardar_csv(pd.DataFrame(columns=self.columnas), self.temporal)
+        os.replace(self.temporal, self.ruta)
+        return self.filas
+
+def guardar_csv(datos, ruta):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    if ruta.endswith('.parquet'):
+        datos.to_parquet(ruta, index=False, compression=COMPRESION_PARQUET)
+    else:
+        datos.to_csv(ruta, index=False)
+
+def guardar_estadisticas(nombre, total, completos, sin_duplicados, ruta_salida):
+    """Los mismos conteos que filtrar_data.pig muestra con DUMP, junto al archivo de salida."""
+    ruta = os.path.join(os.path.dirname(ruta_salida), 'estadisticas_filtrado.json')
+    with open(ruta, 'w') as archivo:
+        json.dump({'nombre': nombre, 'total': total, 'completos': completos,
+                   'sin_duplicados': sin_duplicados}, archivo, indent=2)
+
+def filtrar(nombre, patron, columnas, numericas, enteras, ruta_salida):
+    total = completos = 0
+    deduplicador = Deduplicador()
+    for datos in iterar_bloques(patron, columnas, numericas):
+        total += len(datos)
+        datos = filtrar_completos(datos, numericas)
+        completos += len(datos)
+        deduplicador.agregar(datos)
+
+    escritor = Escritor(ruta_salida, columnas, numericas, enteras)
+    for datos in deduplicador.resultados():
+        escritor.escribir(datos.astype({columna: 'int64' for columna in enteras}))
+    sin_duplicados = escritor.cerrar()
+    guardar_estadisticas(nombre, total, completos, sin_duplicados, ruta_salida)
+
+    print(f"{nombre}: {total} registros, {completos} completos, "
+          f"{sin_duplicados} sin duplicados -> {ruta_salida}")
+    return total, completos, sin_duplicados
+
+FILTROS = {
+    'alertas': ("Alertas", f'transformed_alerta_*.{EXTENSION}', COLUMNAS_ALERTAS, NUMERICAS_ALERTAS, [], SALIDA_ALERTAS),
+    'atascos': ("Atascos", f'transformed_atasco_*.{EXTENSION}', COLUMNAS_ATASCOS, NUMERICAS_ATASCOS,
+                ENTERAS_ATASCOS, SALIDA_ATASCOS),
+}
+
+def main(tipos=None):
+    """Filtra los tipos pedidos (por defecto alertas y atascos); cada uno es independiente del otro."""
+    print("Iniciando filtrado de datos")
+    for tipo in tipos or FILTROS:
+        nombre, patron, columnas, numericas, enteras, ruta_salida = FILTROS[tipo]
+        filtrar(nombre, os.path.join(DIRECTORIO_DATOS, patron), columnas, numericas, enteras, ruta_salida)
+    print("Filtrado completado")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
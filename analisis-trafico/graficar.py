@@ -1,15 +1,42 @@
 #!/usr/bin/env python3
 import os
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+import matplotlib
+# Backend sin ventana: los gráficos solo se guardan a disco, también desde los procesos del pool
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import seaborn as sns
-import re
-from pathlib import Path
+
+from filtrar_data import ultima_ejecucion
 
 # Configurar estilo de matplotlib
 plt.style.use('seaborn-v0_8')
 sns.set_palette("husl")
 
+DIRECTORIO_RESULTADOS = os.environ.get('DIRECTORIO_RESULTADOS', '/app/results')
+TRABAJADORES_GRAFICOS = int(os.environ.get('TRABAJADORES_GRAFICOS', os.cpu_count() or 1))
+DPI_GRAFICOS = int(os.environ.get('DPI_GRAFICOS', 300))
+# Hash de la última entrada renderizada por gráfico, compartido entre ejecuciones
+CACHE_GRAFICOS = os.environ.get('CACHE_GRAFICOS', os.path.join(DIRECTORIO_RESULTADOS, 'cache_graficos.json'))
+
+# (fragmento del nombre del CSV, gráficos que se generan a partir de él)
+GRAFICOS_POR_ARCHIVO = [
+    ('tipos_alerta_frecuencia', ['frecuencia_tipos_alertas']),
+    ('horas_pico', ['distribucion_horaria']),
+    ('atascos_por_ciudad', ['congestiones_cantidad', 'congestiones_longitud']),
+    ('comunas_con_mas_alertas', ['sectores_alertas_max']),
+    ('comunas_con_mas_accidentes', ['sectores_siniestros_max']),
+    ('calles_con_mas_alertas', ['vias_alertas_max']),
+    ('calles_con_mas_accidentes', ['vias_siniestros_max']),
+]
+
 def generar_visualizacion(datos, categoria, ruta_destino):
     # Configuración de figura más compacta
     plt.figure(figsize=(12, 8))
@@ -167,8 +194,9 @@ def generar_visualizacion(datos, categoria, ruta_destino):
     
     # Guardar con mayor calidad
     archivo_salida = os.path.join(ruta_destino, f"{categoria}.png")
-    plt.savefig(archivo_salida, dpi=300, bbox_inches='tight', facecolor='white')
-    plt.close()
+    plt.savefig(archivo_salida, dpi=DPI_GRAFICOS, bbox_inches='tight', facecolor='white')
+    # pandas abre su propia figura además de la inicial: cerrar todas para no acumularlas
+    plt.close('all')
     print(f"Gráfico {categoria} optimizado y guardado en: {archivo_salida}")
 
 def buscar_archivos_datos(carpeta):
@@ -179,20 +207,55 @@ def buscar_archivos_datos(carpeta):
                 lista_archivos.append(os.path.join(directorio_raiz, archivo))
     return lista_archivos
 
+def hash_entrada(ruta_archivo, categorias):
+    """Hash del CSV, de este script y de la configuración del render (DPI y gráficos que se generan
+    del archivo): si cambia cualquiera, el gráfico se vuelve a generar."""
+    contenido = hashlib.sha256()
+    contenido.update(Path(__file__).read_bytes())
+    contenido.update(json.dumps({'dpi': DPI_GRAFICOS, 'categorias': categorias}).encode())
+    contenido.update(Path(ruta_archivo).read_bytes())
+    return contenido.hexdigest()
+
+def cargar_cache():
+    if not os.path.exists(CACHE_GRAFICOS):
+        return {}
+    with open(CACHE_GRAFICOS) as archivo:
+        return json.load(archivo)
+
+def guardar_cache(cache):
+    os.makedirs(os.path.dirname(CACHE_GRAFICOS), exist_ok=True)
+    temporal = f"{CACHE_GRAFICOS}.tmp"
+    with open(temporal, 'w') as archivo:
+        json.dump(cache, archivo, indent=2)
+    os.replace(temporal, CACHE_GRAFICOS)
+
+def graficos_para(ruta_archivo):
+    identificador_archivo = Path(ruta_archivo).stem.lower()
+    for fragmento, categorias in GRAFICOS_POR_ARCHIVO:
+        if fragmento in identificador_archivo:
+            return categorias
+    return None
+
+def renderizar_archivo(tarea):
+    """Lee el CSV una sola vez y genera todos sus gráficos; se ejecuta en un proceso del pool."""
+    ruta_archivo, categorias, carpeta_imagenes = tarea
+    tiempos = {}
+    try:
+        dataframe = pd.read_csv(ruta_archivo)
+        for categoria in categorias:
+            inicio = time.perf_counter()
+            generar_visualizacion(dataframe, categoria, carpeta_imagenes)
+            tiempos[categoria] = time.perf_counter() - inicio
+    except Exception as error:
+        return ruta_archivo, tiempos, str(error)
+    return ruta_archivo, tiempos, None
+
 def ejecutar_proceso():
-    carpeta_resultados = "/app/results"
-    
-    expresion_regular = re.compile(r'ejecucion_\d{8}_\d{6}$')
-    carpetas_disponibles = [directorio for directorio in os.listdir(carpeta_resultados) 
-                           if os.path.isdir(os.path.join(carpeta_resultados, directorio)) and 
-                           expresion_regular.match(directorio)]
-    
-    if not carpetas_disponibles:
+    carpeta_trabajo = ultima_ejecucion(DIRECTORIO_RESULTADOS)
+    if carpeta_trabajo is None:
         print("ERROR: No se encontraron directorios de ejecución.")
         return
     
-    carpetas_disponibles.sort(reverse=True)
-    carpeta_trabajo = os.path.join(carpeta_resultados, carpetas_disponibles[0])
     print(f"PROCESANDO DIRECTORIO: {carpeta_trabajo}")
     
     carpeta_imagenes = os.path.join(carpeta_trabajo, 'visualizaciones_optimizadas')
@@ -205,49 +268,52 @@ def ejecutar_proceso():
         return
     
     print("INICIANDO GENERACIÓN DE VISUALIZACIONES OPTIMIZADAS...")
-    
+    inicio_total = time.perf_counter()
+    cache = cargar_cache()
+    registro = {}
+    tareas = []
+    hashes = {}
+
     for ruta_archivo in archivos_datos:
-        try:
-            identificador_archivo = Path(ruta_archivo).stem.lower()
-            
-            if 'tipos_alerta_frecuencia' in identificador_archivo:
-                tipo_visualizacion = 'frecuencia_tipos_alertas'
-            elif 'horas_pico' in identificador_archivo:
-                dataframe = pd.read_csv(ruta_archivo)
-                generar_visualizacion(dataframe, 'distribucion_horaria', carpeta_imagenes)
-                continue
-            elif 'atascos_por_ciudad' in identificador_archivo:
-                dataframe = pd.read_csv(ruta_archivo)
-                generar_visualizacion(dataframe, 'congestiones_cantidad', carpeta_imagenes)
-                generar_visualizacion(dataframe, 'congestiones_longitud', carpeta_imagenes)
-                continue
-            elif 'comunas_con_mas_alertas' in identificador_archivo:
-                tipo_visualizacion = 'sectores_alertas_max'
-            elif 'comunas_con_mas_accidentes' in identificador_archivo:
-                tipo_visualizacion = 'sectores_siniestros_max'
-            elif 'calles_con_mas_alertas' in identificador_archivo:
-                tipo_visualizacion = 'vias_alertas_max'
-            elif 'calles_con_mas_accidentes' in identificador_archivo:
-                tipo_visualizacion = 'vias_siniestros_max'
+        categorias = graficos_para(ruta_archivo)
+        if categorias is None:
+            print(f"ADVERTENCIA: No se reconoce el tipo de archivo: {Path(ruta_archivo).stem.lower()}")
+            continue
+
+        # Gráficos cuya entrada no cambió desde el último render: se copia la imagen anterior
+        hashes[ruta_archivo] = hash_entrada(ruta_archivo, categorias)
+        pendientes = []
+        for categoria in categorias:
+            anterior = cache.get(categoria, {})
+            destino = os.path.join(carpeta_imagenes, f"{categoria}.png")
+            if anterior.get('hash') == hashes[ruta_archivo] and os.path.exists(anterior.get('imagen', '')):
+                if os.path.abspath(anterior['imagen']) != os.path.abspath(destino):
+                    shutil.copy2(anterior['imagen'], destino)
+                registro[categoria] = {'segundos': 0.0, 'omitido': True}
+                print(f"Gráfico {categoria} sin cambios en su entrada, se reutiliza {anterior['imagen']}")
             else:
-                print(f"ADVERTENCIA: No se reconoce el tipo de archivo: {identificador_archivo}")
-                continue
-            
-            dataframe = pd.read_csv(ruta_archivo)
-            generar_visualizacion(dataframe, tipo_visualizacion, carpeta_imagenes)
-                
-        except Exception as error:
-            print(f"ERROR al procesar {ruta_archivo}: {error}")
-    
+                pendientes.append(categoria)
+        if pendientes:
+            tareas.append((ruta_archivo, pendientes, carpeta_imagenes))
+
+    if tareas:
+        with ProcessPoolExecutor(max_workers=max(1, min(TRABAJADORES_GRAFICOS, len(tareas)))) as ejecutor:
+            for ruta_archivo, tiempos, error in ejecutor.map(renderizar_archivo, tareas):
+                for categoria, segundos in tiempos.items():
+                    registro[categoria] = {'segundos': segundos, 'omitido': False}
+                    cache[categoria] = {'hash': hashes[ruta_archivo],
+                                        'imagen': os.path.join(carpeta_imagenes, f"{categoria}.png")}
+                if error:
+                    print(f"ERROR al procesar {ruta_archivo}: {error}")
+        guardar_cache(cache)
+
+    segundos_total = time.perf_counter() - inicio_total
+    with open(os.path.join(carpeta_imagenes, 'tiempos_render.json'), 'w') as archivo:
+        json.dump({'total_segundos': segundos_total, 'trabajadores': TRABAJADORES_GRAFICOS,
+                   'graficos': registro}, archivo, indent=2)
+    generados = sum(1 for datos in registro.values() if not datos['omitido'])
+    print(f"{generados} gráficos generados y {len(registro) - generados} reutilizados en {segundos_total:.2f} s")
     print(f"PROCESO COMPLETADO: Visualizaciones generadas en {carpeta_imagenes}")
 
 if __name__ == "__main__":
-    # Importar numpy si no está disponible
-    try:
-        import numpy as np
-    except ImportError:
-        print("INSTALANDO DEPENDENCIA: numpy...")
-        os.system("pip install numpy")
-        import numpy as np
-    
-    ejecutar_proceso()
\ No newline at end of file
+    ejecutar_proceso()
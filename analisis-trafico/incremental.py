@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Análisis incremental: incorpora solo los archivos exportados nuevos a un estado persistente.
+
+El estado (SQLite) guarda los registros sin duplicados y los agregados de cada reporte.
+Cada archivo nuevo se filtra, se deduplica contra el estado (gana la fecha más temprana,
+restando la contribución del registro reemplazado) y se suma a los agregados, de modo que
+el tiempo de ejecución depende de los datos nuevos y no de todo el historial.
+"""
+import os
+import glob
+import sqlite3
+from datetime import datetime
+import pandas as pd
+
+from filtrar_data import (
+    DIRECTORIO_DATOS, DIRECTORIO_RESULTADOS, EXTENSION,
+    COLUMNAS_ALERTAS, NUMERICAS_ALERTAS, COLUMNAS_ATASCOS, NUMERICAS_ATASCOS, ENTERAS_ATASCOS,
+    cargar_csv, filtrar_completos, eliminar_duplicados,
+)
+from procesar_data import guardar_parte
+
+ESTADO_INCREMENTAL = os.environ.get('ESTADO_INCREMENTAL', os.path.join(DIRECTORIO_DATOS, 'estado_incremental.db'))
+
+# (reporte, clave, clave secundaria, condición) que se acumulan por cada alerta
+AGREGADOS_ALERTAS = [
+    ('horas_pico', "substr(fecha, 12, 2)", "''", "1"),
+    ('comunas', "city", "''", "1"),
+    ('tipos', "type", "''", "1"),
+    ('calles', "street", "''", "1"),
+    ('comunas_accidentes', "city", "''", "type = 'ACCIDENT'"),
+    ('calles_accidentes', "street", "city", "type = 'ACCIDENT'"),
+]
+AGREGADOS_ATASCOS = [
+    ('atascos_ciudad', "city", "''", "1"),
+]
+
+# Archivo de reporte: (reporte, encabezado, columnas, orden)
+REPORTES = {
+    'horas_pico.csv': ('horas_pico', ['hora', 'cantidad_alertas'], "clave, cantidad", "cantidad DESC"),
+    'comunas_con_mas_alertas.csv': ('comunas', ['comuna', 'cantidad_alertas'], "clave, cantidad", "cantidad DESC"),
+    'tipos_alerta_frecuencia.csv': ('tipos', ['tipo_alerta', 'cantidad'], "clave, cantidad", "cantidad DESC"),
+    'comunas_con_mas_accidentes.csv': ('comunas_accidentes', ['comuna', 'cantidad_accidentes'],
+                                       "clave, cantidad", "cantidad DESC"),
+    'calles_con_mas_alertas.csv': ('calles', ['calle', 'cantidad_alertas'], "clave, cantidad", "cantidad DESC"),
+    'calles_con_mas_accidentes.csv': ('calles_accidentes', ['calle', 'ciudad', 'cantidad_accidentes'],
+                                      "clave, clave2, cantidad", "cantidad DESC"),
+    'atascos_por_ciudad.csv': ('atascos_ciudad', ['ciudad', 'largo_total', 'num_atascos'],
+                               "clave, suma, cantidad", "suma DESC"),
+}
+
+def conectar(ruta=ESTADO_INCREMENTAL):
+    conn = sqlite3.connect(ruta)
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS alertas (
+            {', '.join(f'{c} REAL' if c in NUMERICAS_ALERTAS else f'{c} TEXT' for c in COLUMNAS_ALERTAS)},
+            PRIMARY KEY (uuid)
+        );
+        CREATE INDEX IF NOT EXISTS alertas_por_tipo ON alertas (type);
+        CREATE TABLE IF NOT EXISTS atascos (
+            {', '.join(f'{c} INTEGER' if c in ENTERAS_ATASCOS else f'{c} REAL' if c in NUMERICAS_ATASCOS
+                       else f'{c} TEXT' for c in COLUMNAS_ATASCOS)},
+            PRIMARY KEY (uuid)
+        );
+        CREATE INDEX IF NOT EXISTS atascos_por_largo ON atascos (length);
+        CREATE TABLE IF NOT EXISTS agregados (
+            reporte TEXT, clave TEXT, clave2 TEXT, cantidad INTEGER, suma REAL,
+            PRIMARY KEY (reporte, clave, clave2)
+        );
+        CREATE TABLE IF NOT EXISTS contadores (nombre TEXT PRIMARY KEY, valor INTEGER);
+        CREATE TABLE IF NOT EXISTS archivos_procesados (ruta TEXT PRIMARY KEY, procesado_en TEXT);
+    """)
+    return conn
+
+def sumar_contador(conn, nombre, valor):
+    conn.execute("INSERT INTO contadores VALUES (?, ?) "
+                 "ON CONFLICT (nombre) DO UPDATE SET valor = valor + excluded.valor", (nombre, valor))
+
+def aplicar_contribucion(conn, tabla_filas, definiciones, signo, columna_suma="0"):
+    """Suma (signo=1) o resta (signo=-1) la contribución de las filas de tabla_filas a los agregados."""
+    for reporte, clave, clave2, condicion in definiciones:
+        conn.execute(f"""
+            INSERT INTO agregados (reporte, clave, clave2, cantidad, suma)
+            SELECT '{reporte}', {clave}, {clave2}, {signo} * COUNT(*), {signo} * SUM({columna_suma})
+            FROM {tabla_filas} WHERE {condicion}
+            GROUP BY {clave}, {clave2}
+            ON CONFLICT (reporte, clave, clave2) DO UPDATE SET
+                cantidad = cantidad + excluded.cantidad,
+                suma = suma + excluded.suma
+        """)
+    conn.execute("DELETE FROM agregados WHERE cantidad <= 0")
+
+def incorporar(conn, tabla, nuevos, columnas, definiciones, columna_suma="0"):
+    """Deduplica el lote contra el estado y actualiza filas y agregados."""
+    nuevos.to_sql('lote', conn, if_exists='replace', index=False)
+    lista = ', '.join(columnas)
+
+    # Registros del estado que el lote reemplaza por tener una fecha más temprana
+    conn.execute(f"""
+        CREATE TEMP TABLE reemplazados AS
+        SELECT {', '.join(f't.{c}' for c in columnas)} FROM {tabla} t JOIN lote l USING (uuid)
+        WHERE l.fecha < t.fecha
+    """)
+    aplicar_contribucion(conn, 'reemplazados', definiciones, -1, columna_suma)
+    conn.execute(f"DELETE FROM {tabla} WHERE uuid IN (SELECT uuid FROM reemplazados)")
+    conn.execute("DROP TABLE reemplazados")
+
+    # Registros del lote cuyo uuid no queda en el estado
+    conn.execute(f"""
+        CREATE TEMP TABLE insertados AS
+        SELECT {lista} FROM lote WHERE uuid NOT IN (SELECT uuid FROM {tabla})
+    """)
+    conn.execute(f"INSERT INTO {tabla} ({lista}) SELECT {lista} FROM insertados")
+    aplicar_contribucion(conn, 'insertados', definiciones, 1, columna_suma)
+    conn.execute("DROP TABLE insertados")
+    conn.execute("DROP TABLE lote")
+
+def procesar_archivo(conn, ruta, nombre, columnas, numericas, enteras, definiciones, columna_suma="0"):
+    datos = cargar_csv(ruta, columnas, numericas)
+    completos = filtrar_completos(datos, numericas)
+    lote = eliminar_duplicados(completos).astype({columna: 'int64' for columna in enteras})
+    with conn:
+        antes = conn.execute(f"SELECT COUNT(*) FROM {nombre}").fetchone()[0]
+        incorporar(conn, nombre, lote, columnas, definiciones, columna_suma)
+        despues = conn.execute(f"SELECT COUNT(*) FROM {nombre}").fetchone()[0]
+        sumar_contador(conn, f'{nombre}_total', len(datos))
+        sumar_contador(conn, f'{nombre}_completos', len(completos))
+        conn.execute("INSERT INTO archivos_procesados VALUES (?, ?)", (ruta, datetime.now().isoformat()))
+    print(f"{os.path.basename(ruta)}: {len(datos)} registros, {len(completos)} completos, "
+          f"{despues - antes} uuid nuevos")
+
+def escribir_reportes(conn, directorio_salida):
+    os.makedirs(directorio_salida, exist_ok=True)
+    for archivo, (reporte, encabezado, columnas, orden) in REPORTES.items():
+        datos = pd.read_sql_query(
+            f"SELECT {columnas} FROM agregados WHERE reporte = ? ORDER BY {orden}", conn, params=(reporte,))
+        datos.columns = encabezado
+        if 'largo_total' in datos:
+            datos['largo_total'] = datos['largo_total'].astype('int64')
+        datos.to_csv(os.path.join(directorio_salida, archivo), index=False)
+
+    pd.read_sql_query(f"SELECT {', '.join(COLUMNAS_ALERTAS)} FROM alertas WHERE type = 'false'", conn) \
+        .to_csv(os.path.join(directorio_salida, 'alertas_tipo_false.csv'), index=False)
+    pd.read_sql_query(f"SELECT {', '.join(COLUMNAS_ATASCOS)} FROM atascos ORDER BY length DESC", conn) \
+        .to_csv(os.path.join(directorio_salida, 'atascos_largos.csv'), index=False)
+
+    # Muestras y conteos (mismos directorios que deja Pig)
+    num_alertas = conn.execute("SELECT COUNT(*) FROM alertas").fetchone()[0]
+    num_atascos = conn.execute("SELECT COUNT(*) FROM atascos").fetchone()[0]
+    num_accidentes = conn.execute("SELECT COUNT(*) FROM alertas WHERE type = 'ACCIDENT'").fetchone()[0]
+    guardar_parte(pd.read_sql_query("SELECT * FROM atascos LIMIT 10", conn), os.path.join(directorio_salida, 'atascos_sample'))
+    guardar_parte(pd.read_sql_query("SELECT * FROM alertas LIMIT 10", conn), os.path.join(directorio_salida, 'alertas_sample'))
+    guardar_parte(pd.DataFrame({'count': [num_atascos]}), os.path.join(directorio_salida, 'atascos_count'))
+    guardar_parte(pd.DataFrame({'count': [num_alertas]}), os.path.join(directorio_salida, 'alertas_count'))
+    guardar_parte(pd.DataFrame({'count': [num_accidentes]}), os.path.join(directorio_salida, 'accidentes_count'))
+
+def main():
+    conn = conectar()
+    procesados = {fila[0] for fila in conn.execute("SELECT ruta FROM archivos_procesados")}
+
+    fuentes = [
+        (f'transformed_alerta_*.{EXTENSION}', 'alertas', COLUMNAS_ALERTAS, NUMERICAS_ALERTAS, [], AGREGADOS_ALERTAS, "0"),
+        (f'transformed_atasco_*.{EXTENSION}', 'atascos', COLUMNAS_ATASCOS, NUMERICAS_ATASCOS, ENTERAS_ATASCOS,
+         AGREGADOS_ATASCOS, "length"),
+    ]
+    nuevos = 0
+    for patron, nombre, columnas, numericas, enteras, definiciones, columna_suma in fuentes:
+        for ruta in sorted(glob.glob(os.path.join(DIRECTORIO_DATOS, patron))):
+            if ruta in procesados:
+                continue
+            procesar_archivo(conn, ruta, nombre, columnas, numericas, enteras, definiciones, columna_suma)
+            nuevos += 1
+
+    if nuevos == 0:
+        print("Sin archivos nuevos; se regeneran los reportes desde el estado")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    directorio_salida = os.environ.get('DIRECTORIO_SALIDA',
+                                       os.path.join(DIRECTORIO_RESULTADOS, f'ejecucion_{timestamp}'))
+    escribir_reportes(conn, directorio_salida)
+
+    contadores = dict(conn.execute("SELECT nombre, valor FROM contadores"))
+    for nombre in ('alertas', 'atascos'):
+        sin_duplicados = conn.execute(f"SELECT COUNT(*) FROM {nombre}").fetchone()[0]
+        print(f"{nombre.capitalize()}: {contadores.get(f'{nombre}_total', 0)} registros, "
+              f"{contadores.get(f'{nombre}_completos', 0)} completos, {sin_duplicados} sin duplicados")
+    print(f"Reportes guardados en: {directorio_salida}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Motor de análisis que calcula los reportes de procesar_data.pig con agregaciones en MongoDB.
+
+La transformación de exportar_mongo.py (salvo el formato de las ciudades, que se aplica
+después sobre los valores distintos), el filtrado de registros incompletos y la
+eliminación de duplicados se hacen en el servidor y dejan el resultado en colecciones
+temporales indexadas; cada reporte es luego un $match/$group/$sort sobre ellas. Solo
+viajan por la red las filas de los reportes.
+"""
+import os
+import time
+from datetime import datetime
+import pandas as pd
+import pymongo
+
+from filtrar_data import COLUMNAS_ALERTAS, COLUMNAS_ATASCOS, NUMERICAS_ALERTAS, ENTERAS_ATASCOS
+from exportar_mongo import procesar_ciudad
+from procesar_data import guardar_parte
+
+MONGO_URI = os.environ.get('MONGODB_URI', 'mongodb://mongo:27017/')
+MONGO_DB = os.environ.get('MONGODB_DB', 'waze_data')
+COL_ALERTAS = os.environ.get('MONGODB_COLECCION_ALERTAS', 'alertas')
+COL_ATASCOS = os.environ.get('MONGODB_COLECCION_ATASCOS', 'atascos')
+DIRECTORIO_RESULTADOS = os.environ.get('DIRECTORIO_RESULTADOS', '/app/results')
+# Sufijo de las colecciones temporales con los registros limpios
+SUFIJO_TEMPORAL = os.environ.get('SUFIJO_TEMPORAL', '_analisis')
+
+def texto(expresion):
+    """Mismo texto que deja csv.writer: nulos vacíos y booleanos como True/False."""
+    return {'$switch': {
+        'branches': [
+            {'case': {'$eq': [{'$type': expresion}, 'string']}, 'then': expresion},
+            {'case': {'$in': [{'$type': expresion}, ['null', 'missing']]}, 'then': ''},
+            {'case': {'$eq': [{'$type': expresion}, 'bool']}, 'then': {'$cond': [expresion, 'True', 'False']}},
+        ],
+        'default': {'$toString': expresion},
+    }}
+
+def numero(expresion):
+    return {'$convert': {'input': expresion, 'to': 'double', 'onError': None, 'onNull': None}}
+
+def identificador():
+    return {'$ifNull': ['$uuid', {'$concat': ['item_', {'$toString': '$_id'}]}]}
+
+PROYECCION_ALERTAS = {
+    '_id': 0,
+    'uuid': texto(identificador()),
+    'city': texto({'$ifNull': ['$city', '']}),
+    'municipalityUser': texto({'$ifNull': ['$reportByMunicipalityUser', '']}),
+    'type': texto({'$ifNull': ['$type', '']}),
+    'street': texto({'$ifNull': ['$street', '']}),
+    'confidence': numero({'$ifNull': ['$confidence', 0]}),
+    'location_x': numero({'$ifNull': ['$location.x', {'$ifNull': ['$x', 0]}]}),
+    'location_y': numero({'$ifNull': ['$location.y', {'$ifNull': ['$y', 0]}]}),
+    'fecha': texto({'$ifNull': ['$fecha', '']}),
+}
+PROYECCION_ATASCOS = {
+    '_id': 0,
+    'uuid': texto(identificador()),
+    'severity': numero('$severity'),
+    'country': texto({'$ifNull': ['$country', '']}),
+    'length': numero('$length'),
+    'endnode': texto({'$ifNull': ['$endNode', '']}),
+    'roadtype': numero('$roadType'),
+    'speed': numero({'$ifNull': ['$speedKMH', '$speed']}),
+    'street': texto({'$ifNull': ['$street', '']}),
+    'fecha': texto({'$ifNull': ['$fecha', '']}),
+    'region': texto({'$ifNull': ['$region', '']}),
+    'city': texto({'$ifNull': ['$city', '']}),
+}
+NUMERICAS_ATASCOS_MONGO = ['severity', 'length', 'roadtype', 'speed']
+
+# Índices de las colecciones temporales que usan los reportes filtrados y formatear_ciudades como hint
+INDICES_ALERTAS = [[('type', 1), ('city', 1)], [('city', 1)]]
+INDICES_ATASCOS = [[('length', -1), ('fecha', 1)], [('city', 1)]]
+
+def limpiar(database, origen, destino, proyeccion, columnas, numericas, indices):
+    """Transforma, filtra incompletos y deja por uuid el registro más temprano en la colección destino."""
+    completos = {columna: {'$ne': None} if columna in numericas else {'$nin': ['', None]}
+                 for columna in columnas}
+    database[origen].aggregate([
+        # Se conserva el _id de origen como desempate: a igual fecha queda el primero exportado,
+        # como en el sort estable de filtrar_data.py
+        {'$project': {**proyeccion, '_id': 1}},
+        {'$match': completos},
+        {'$sort': {'fecha': 1, '_id': 1}},
+        {'$group': {'_id': '$uuid', 'registro': {'$first': '$$ROOT'}}},
+        {'$replaceRoot': {'newRoot': '$registro'}},
+        {'$out': destino},
+    ], allowDiskUse=True)
+    for indice in indices:
+        database[destino].create_index(indice)
+    formatear_ciudades(database[destino])
+    return database[origen].estimated_document_count(), database[destino].estimated_document_count()
+
+def formatear_ciudades(coleccion):
+    """Aplica procesar_ciudad de exportar_mongo.py a cada ciudad distinta (son pocas).
+
+    Se hace en Python y no en la agregación para que el resultado sea idéntico a str.title()
+    (mayúsculas después de guiones, apóstrofos y dígitos), igual que en la ruta de exportación.
+    """
+    for original in coleccion.distinct('city'):
+        formateada = procesar_ciudad(original)
+        if formateada != original:
+            coleccion.update_many({'city': original}, {'$set': {'city': formateada}}, hint='city_1')
+
+def contar(coleccion, claves, nombres, filtro=None, hint=None):
+    """GROUP BY claves + COUNT + ORDER BY cantidad DESC, como DataFrame con los nombres del reporte.
+
+    claves es una expresión de agrupación o una lista de campos. El hint solo sirve junto a un
+    filtro que pueda usar el índice: sin $match, agrupar toda la colección es más rápido con un
+    recorrido completo que con el índice más un FETCH de cada documento.
+    """
+    grupo = {campo: f'${campo}' for campo in claves} if isinstance(claves, list) else claves
+    etapas = ([{'$match': filtro}] if filtro else []) + [
+        {'$group': {'_id': grupo, 'cantidad': {'$sum': 1}}},
+        {'$sort': {'cantidad': -1}},
+    ]
+    opciones = {'allowDiskUse': True}
+    if hint and filtro:
+        opciones['hint'] = hint
+    filas = []
+    for documento in coleccion.aggregate(etapas, **opciones):
+        clave = documento['_id']
+        filas.append([*clave.values(), documento['cantidad']] if isinstance(clave, dict)
+                     else [clave, documento['cantidad']])
+    return pd.DataFrame(filas, columns=nombres)
+
+def tabla(cursor, columnas, enteras=()):
+    datos = pd.DataFrame(list(cursor), columns=columnas)
+    return datos.astype({columna: 'int64' for columna in enteras})
+
+def generar_reportes(alertas, atascos):
+    """Devuelve {nombre de archivo: DataFrame} con los mismos reportes que procesar_data.py."""
+    proyeccion_alertas = {'_id': 0, **{columna: 1 for columna in COLUMNAS_ALERTAS}}
+    proyeccion_atascos = {'_id': 0, **{columna: 1 for columna in COLUMNAS_ATASCOS}}
+    accidentes = {'type': 'ACCIDENT'}
+
+    por_ciudad = pd.DataFrame(
+        [[d['_id'], d['largo_total'], d['num_atascos']] for d in atascos.aggregate([
+            {'$group': {'_id': '$city', 'largo_total': {'$sum': '$length'}, 'num_atascos': {'$sum': 1}}},
+            {'$sort': {'largo_total': -1}},
+        ], allowDiskUse=True)],
+        columns=['ciudad', 'largo_total', 'num_atascos']).astype({'largo_total': 'int64'})
+
+    return {
+        'horas_pico.csv': contar(alertas, {'$substrCP': ['$fecha', 11, 2]}, ['hora', 'cantidad_alertas']),
+        'comunas_con_mas_alertas.csv': contar(alertas, '$city', ['comuna', 'cantidad_alertas']),
+        'tipos_alerta_frecuencia.csv': contar(alertas, '$type', ['tipo_alerta', 'cantidad']),
+        'alertas_tipo_false.csv': tabla(alertas.find({'type': 'false'}, proyeccion_alertas)
+                                        .hint('type_1_city_1').sort('fecha', 1), COLUMNAS_ALERTAS),
+        'comunas_con_mas_accidentes.csv': contar(alertas, '$city', ['comuna', 'cantidad_accidentes'],
+                                                 accidentes, hint='type_1_city_1'),
+        'calles_con_mas_alertas.csv': contar(alertas, '$street', ['calle', 'cantidad_alertas']),
+        'calles_con_mas_accidentes.csv': contar(alertas, ['street', 'city'],
+                                                ['calle', 'ciudad', 'cantidad_accidentes'],
+                                                accidentes, hint='type_1_city_1'),
+        # El hint no garantiza el orden: el sort (resuelto por el mismo índice) sí; a igual largo
+        # queda primero el más antiguo, como en el sort estable de procesar_data.py
+        'atascos_largos.csv': tabla(atascos.find({}, proyeccion_atascos).sort([('length', -1), ('fecha', 1)])
+                                    .hint('length_-1_fecha_1'), COLUMNAS_ATASCOS, ENTERAS_ATASCOS),
+        'atascos_por_ciudad.csv': por_ciudad,
+    }
+
+def main():
+    client = pymongo.MongoClient(MONGO_URI)
+    database = client[MONGO_DB]
+    temporal_alertas = f"{COL_ALERTAS}{SUFIJO_TEMPORAL}"
+    temporal_atascos = f"{COL_ATASCOS}{SUFIJO_TEMPORAL}"
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    directorio_salida = os.environ.get('DIRECTORIO_SALIDA',
+                                       os.path.join(DIRECTORIO_RESULTADOS, f'ejecucion_{timestamp}'))
+    os.makedirs(directorio_salida, exist_ok=True)
+
+    inicio = time.perf_counter()
+    for nombre, origen, destino, proyeccion, columnas, numericas, indices in (
+        ('Alertas', COL_ALERTAS, temporal_alertas, PROYECCION_ALERTAS, COLUMNAS_ALERTAS,
+         NUMERICAS_ALERTAS, INDICES_ALERTAS),
+        ('Atascos', COL_ATASCOS, temporal_atascos, PROYECCION_ATASCOS, COLUMNAS_ATASCOS,
+         NUMERICAS_ATASCOS_MONGO, INDICES_ATASCOS),
+    ):
+        total, sin_duplicados = limpiar(database, origen, destino, proyeccion, columnas, numericas, indices)
+        print(f"{nombre}: {total} documentos, {sin_duplicados} completos sin duplicados")
+    print(f"Limpieza en MongoDB: {time.perf_counter() - inicio:.2f} s")
+
+    alertas, atascos = database[temporal_alertas], database[temporal_atascos]
+    try:
+        # Muestras y conteos (mismos directorios que deja Pig)
+        num_alertas = alertas.count_documents({})
+        num_atascos = atascos.count_documents({})
+        num_accidentes = alertas.count_documents({'type': 'ACCIDENT'}, hint='type_1_city_1')
+        guardar_parte(tabla(atascos.find({}, {'_id': 0, **{c: 1 for c in COLUMNAS_ATASCOS}}).limit(10),
+                            COLUMNAS_ATASCOS, ENTERAS_ATASCOS), os.path.join(directorio_salida, 'atascos_sample'))
+        guardar_parte(tabla(alertas.find({}, {'_id': 0, **{c: 1 for c in COLUMNAS_ALERTAS}}).limit(10),
+                            COLUMNAS_ALERTAS), os.path.join(directorio_salida, 'alertas_sample'))
+        guardar_parte(pd.DataFrame({'count': [num_atascos]}), os.path.join(directorio_salida, 'atascos_count'))
+        guardar_parte(pd.DataFrame({'count': [num_alertas]}), os.path.join(directorio_salida, 'alertas_count'))
+        guardar_parte(pd.DataFrame({'count': [num_accidentes]}), os.path.join(directorio_salida, 'accidentes_count'))
+
+        inicio = time.perf_counter()
+        reportes = generar_reportes(alertas, atascos)
+        for nombre, datos in reportes.items():
+            datos.to_csv(os.path.join(directorio_salida, nombre), index=False)
+        print(f"Reportes en MongoDB: {time.perf_counter() - inicio:.2f} s")
+    finally:
+        alertas.drop()
+        atascos.drop()
+        client.close()
+
+    print(f"({num_atascos})")
+    print(f"({num_alertas})")
+    print(reportes['horas_pico.csv'].to_string(index=False))
+    print(f"Reportes guardados en: {directorio_salida}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""Ejecuta las etapas del análisis como un grafo de pasos con entradas y salidas declaradas.
+
+Un paso se omite cuando la huella de sus entradas (contenido de los archivos, el script que
+lo ejecuta y las variables de configuración) es la misma de la última ejecución exitosa y sus
+salidas siguen existiendo. Los pasos cuyas dependencias ya terminaron corren en paralelo
+(filtrado de alertas y de atascos; gráficos, mapas y series de tiempo), y al final se escribe
+el tiempo de cada paso en DIRECTORIO_RESULTADOS/reporte_pipeline.json.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import hashlib
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from filtrar_data import (
+    DIRECTORIO_DATOS, DIRECTORIO_RESULTADOS, EXTENSION, SALIDA_ALERTAS, SALIDA_ATASCOS, ultima_ejecucion,
+)
+from procesar_data import REPORTES as REPORTES_MOTORES
+
+MOTOR_ANALISIS = os.environ.get('MOTOR_ANALISIS', 'pandas')
+MODO_INCREMENTAL = os.environ.get('MODO_INCREMENTAL') == '1'
+ESTADO_PIPELINE = os.environ.get('ESTADO_PIPELINE', os.path.join(DIRECTORIO_DATOS, 'estado_pipeline.json'))
+TRABAJADORES_PIPELINE = int(os.environ.get('TRABAJADORES_PIPELINE', 3))
+# PIPELINE_FORZAR=1 ejecuta todos los pasos aunque sus entradas no hayan cambiado
+FORZAR = os.environ.get('PIPELINE_FORZAR') == '1'
+# Métricas de cada paso en formato de texto de Prometheus (para el textfile collector de node_exporter)
+METRICAS_PIPELINE = os.environ.get('METRICAS_PIPELINE', os.path.join(DIRECTORIO_RESULTADOS, 'metricas_pipeline.prom'))
+# Configuración que cambia las salidas: si cambia, los pasos se vuelven a ejecutar
+VARIABLES_HUELLA = [
+    'MOTOR_ANALISIS', 'MODO_INCREMENTAL', 'FORMATO_INTERMEDIO', 'COMPRESION_PARQUET', 'MOTOR_PROCESAMIENTO',
+    'TOP_K', 'TOP_K_CAPACIDAD', 'DPI_GRAFICOS', 'PRECISION_GEOHASH', 'VENTANA_ESPACIAL', 'MAPA_HTML',
+    'NIVEL_PICOS', 'VENTANA_PICOS', 'UMBRAL_PICOS', 'VENTANA_MEDIA_MOVIL',
+    'DISTANCIA_UNION_M', 'VENTANA_UNION', 'LADO_CELDA_UNION_M',
+    'MONGODB_DB', 'MONGODB_COLECCION_ALERTAS', 'MONGODB_COLECCION_ATASCOS',
+]
+
+# Entrada de procesar_data.pig (parámetro directorio_entrada)
+DIRECTORIO_ENTRADA_PIG = os.environ.get('DIRECTORIO_ENTRADA_PIG', '/app/input')
+
+def entradas_pig(entrada=DIRECTORIO_ENTRADA_PIG):
+    return (os.path.join(entrada, 'alertas_completas', 'alertas_completas.csv'),
+            os.path.join(entrada, 'atascos_completos', 'atascos_completos.csv'))
+
+def partes_pig(resultados=DIRECTORIO_RESULTADOS):
+    """Partes que escribe filtrar_data.pig bajo su parámetro directorio_resultados."""
+    return (os.path.join(resultados, 'reportes_ciudadanos_procesados', 'datos_reportes_limpios', 'part-*'),
+            os.path.join(resultados, 'congestion_vehicular_procesada', 'datos_congestion_limpios', 'part-*'))
+
+def parametros_pig(datos=DIRECTORIO_DATOS, resultados=DIRECTORIO_RESULTADOS, entrada=DIRECTORIO_ENTRADA_PIG):
+    return ['-param', f'directorio_datos={datos}', '-param', f'directorio_resultados={resultados}',
+            '-param', f'directorio_entrada={entrada}']
+
+ENTRADA_PIG_ALERTAS, ENTRADA_PIG_ATASCOS = entradas_pig()
+PARTES_PIG_ALERTAS, PARTES_PIG_ATASCOS = partes_pig()
+
+EXPORTADOS_ALERTAS = '{datos}/transformed_alerta_*.{ext}'
+EXPORTADOS_ATASCOS = '{datos}/transformed_atasco_*.{ext}'
+PUNTOS_ATASCOS = '{datos}/puntos_atasco_*.{ext}'
+REPORTES = ['{ejecucion}/' + reporte for reporte in REPORTES_MOTORES]
+
+def python(script, *argumentos):
+    return [sys.executable, script, *argumentos]
+
+def huella_mongo():
+    """Cantidad de documentos y último _id de cada colección: cambia cuando llegan documentos nuevos."""
+    try:
+        import pymongo
+        client = pymongo.MongoClient(os.environ.get('MONGODB_URI', 'mongodb://mongo:27017/'),
+                                     serverSelectionTimeoutMS=5000)
+        base = client[os.environ.get('MONGODB_DB', 'waze_data')]
+        partes = []
+        for coleccion in (os.environ.get('MONGODB_COLECCION_ALERTAS', 'alertas'),
+                          os.environ.get('MONGODB_COLECCION_ATASCOS', 'atascos')):
+            ultimo = base[coleccion].find_one({}, {'_id': 1}, sort=[('_id', -1)])
+            partes.append(f"{coleccion}:{base[coleccion].estimated_document_count()}:{ultimo and ultimo['_id']}")
+        client.close()
+        return ','.join(partes)
+    except Exception as error:
+        print(f"ADVERTENCIA: no se pudo leer la huella de MongoDB ({error}); se ejecuta el paso")
+        return None
+
+def limpiar_salidas_pig(resultados=DIRECTORIO_RESULTADOS):
+    """Borra las carpetas de STORE de filtrar_data.pig: Pig no escribe sobre una carpeta existente."""
+    for patron in partes_pig(resultados):
+        shutil.rmtree(os.path.dirname(patron), ignore_errors=True)
+
+def filtrar_pig():
+    """Ejecuta filtrar_data.pig después de limpiar sus carpetas de STORE, que quedan de la corrida anterior."""
+    limpiar_salidas_pig()
+    subprocess.run(['pig', '-x', 'local', *parametros_pig(), 'filtrar_data.pig'], check=True)
+
+def copiar_entrada_pig(resultados=DIRECTORIO_RESULTADOS, entrada=DIRECTORIO_ENTRADA_PIG):
+    """Une las partes que deja filtrar_data.pig en la entrada de procesar_data.pig (sin encabezado)."""
+    for patron, destino in zip(partes_pig(resultados), entradas_pig(entrada)):
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        with open(destino, 'wb') as salida:
+            for parte in sorted(glob.glob(patron)):
+                with open(parte, 'rb') as entrada:
+                    salida.write(entrada.read())
+
+def paso(nombre, comando, depende=(), entradas=(), salidas=(), huella_externa=None):
+    return {'nombre': nombre, 'comando': comando, 'depende': list(depende), 'entradas': list(entradas),
+            'salidas': list(salidas), 'huella_externa': huella_externa}
+
+def definir_pasos(motor=MOTOR_ANALISIS, incremental=MODO_INCREMENTAL):
+    """Los mismos pasos que antes ejecutaba run.sh en secuencia, con sus dependencias reales."""
+    pasos = []
+    exportados = [EXPORTADOS_ALERTAS, EXPORTADOS_ATASCOS]
+    if motor != 'mongo' or incremental:
+        pasos.append(paso('exportar', python('exportar_mongo.py'), huella_externa=huella_mongo,
+                          salidas=exportados))
+    origen = ['exportar'] if pasos else []
+
+    if incremental:
+        pasos.append(paso('incremental', python('incremental.py'), origen, exportados, ['{ejecucion}/horas_pico.csv']))
+        final = 'incremental'
+    elif motor == 'mongo':
+        pasos.append(paso('motor_mongo', python('motor_mongo.py'), huella_externa=huella_mongo,
+                          salidas=['{ejecucion}/horas_pico.csv']))
+        final = 'motor_mongo'
+    elif motor == 'pig':
+        pasos += [
+            paso('filtrar_pig', filtrar_pig, origen, exportados + ['filtrar_data.pig'],
+                 [PARTES_PIG_ALERTAS, PARTES_PIG_ATASCOS]),
+            paso('copiar_entrada_pig', copiar_entrada_pig, ['filtrar_pig'], [PARTES_PIG_ALERTAS, PARTES_PIG_ATASCOS],
+                 [ENTRADA_PIG_ALERTAS, ENTRADA_PIG_ATASCOS]),
+            paso('procesar_pig', ['pig', '-x', 'local', *parametros_pig(), 'procesar_data.pig'],
+                 ['copiar_entrada_pig'],
+                 [ENTRADA_PIG_ALERTAS, ENTRADA_PIG_ATASCOS, 'procesar_data.pig'], ['{ejecucion}/horas_pico.csv']),
+        ]
+        final = 'procesar_pig'
+    else:
+        pasos += [
+            paso('filtrar_alertas', python('filtrar_data.py', 'alertas'), origen, [EXPORTADOS_ALERTAS],
+                 [SALIDA_ALERTAS]),
+            paso('filtrar_atascos', python('filtrar_data.py', 'atascos'), origen, [EXPORTADOS_ATASCOS],
+                 [SALIDA_ATASCOS]),
+            paso('procesar', python('procesar_data.py'), ['filtrar_alertas', 'filtrar_atascos'],
+                 [SALIDA_ALERTAS, SALIDA_ATASCOS, 'topk.py'], ['{ejecucion}/horas_pico.csv']),
+        ]
+        final = 'procesar'
+
+    # Escriben en la carpeta de ejecución que deja el paso final, así que esperan a que exista
+    pasos.append(paso('graficar', python('graficar.py'), [final], REPORTES,
+                      ['{ejecucion}/visualizaciones_optimizadas/tiempos_render.json']))
+    # Lee los archivos exportados: sin el paso exportar (motor mongo) serían los de una exportación anterior
+    if origen:
+        pasos.append(paso('series_tiempo', python('series_tiempo.py'), [final] + origen, [EXPORTADOS_ALERTAS],
+                          ['{ejecucion}/picos.csv']))
+    # Leen los archivos filtrados de filtrar_data.py: con otro motor no existen o quedaron de una
+    # ejecución anterior con pandas
+    if final == 'procesar':
+        pasos += [
+            paso('espacial', python('espacial.py'), [final], [SALIDA_ALERTAS, PUNTOS_ATASCOS],
+                 ['{ejecucion}/celdas_totales.csv']),
+            paso('union_espacial', python('union_espacial.py'), [final],
+                 [SALIDA_ALERTAS, SALIDA_ATASCOS, PUNTOS_ATASCOS], ['{ejecucion}/alertas_en_atascos.csv']),
+        ]
+    return pasos
+
+def expandir(patron):
+    ejecucion = ultima_ejecucion()
+    if '{ejecucion}' in patron and ejecucion is None:
+        return []
+    ruta = patron.format(datos=DIRECTORIO_DATOS, ext=EXTENSION, ejecucion=ejecucion)
+    return sorted(archivo for archivo in glob.glob(ruta) if os.path.isfile(archivo))
+
+class Estado:
+    """Huella de cada paso exitoso y hash de cada archivo ya leído (por tamaño y fecha de modificación)."""
+
+    def __init__(self, ruta=ESTADO_PIPELINE):
+        self.ruta = ruta
+        self.candado = threading.Lock()
+        self.datos = {'pasos': {}, 'archivos': {}}
+        if os.path.exists(ruta):
+            with open(ruta) as archivo:
+                self.datos.update(json.load(archivo))
+
+    def hash_archivo(self, ruta):
+        informacion = os.stat(ruta)
+        firma = [informacion.st_size, informacion.st_mtime_ns]
+        with self.candado:
+            guardado = self.datos['archivos'].get(ruta)
+        if guardado and guardado[:2] == firma:
+            return guardado[2]
+        contenido = hashlib.sha256()
+        with open(ruta, 'rb') as archivo:
+            for bloque in iter(lambda: archivo.read(1 << 20), b''):
+                contenido.update(bloque)
+        with self.candado:
+            self.datos['archivos'][ruta] = firma + [contenido.hexdigest()]
+        return contenido.hexdigest()
+
+    def huella(self, paso):
+        """None si el paso no se puede comparar (por ejemplo, MongoDB no responde)."""
+        contenido = hashlib.sha256()
+        contenido.update(json.dumps(paso['comando'] if isinstance(paso['comando'], list)
+                                    else paso['comando'].__name__).encode())
+        contenido.update(json.dumps({v: os.environ.get(v) for v in VARIABLES_HUELLA}, sort_keys=True).encode())
+        # El script del paso también es una entrada
+        scripts = [a for a in paso['comando'] if isinstance(a, str) and a.endswith(('.py', '.pig'))] \
+            if isinstance(paso['comando'], list) else [os.path.abspath(__file__)]
+        for patron in paso['entradas'] + scripts:
+            for ruta in expandir(patron):
+                contenido.update(self.hash_archivo(ruta).encode())
+        if paso['huella_externa']:
+            externa = paso['huella_externa']()
+            if externa is None:
+                return None
+            contenido.update(externa.encode())
+        return contenido.hexdigest()
+
+    def vigente(self, paso, huella):
+        with self.candado:
+            anterior = self.datos['pasos'].get(paso['nombre'])
+        return huella is not None and anterior == huella and all(expandir(s) for s in paso['salidas'])
+
+    def registrar(self, paso, huella):
+        with self.candado:
+            self.datos['pasos'][paso['nombre']] = huella
+            os.makedirs(os.path.dirname(self.ruta) or '.', exist_ok=True)
+            temporal = f"{self.ruta}.tmp"
+            with open(temporal, 'w') as archivo:
+                json.dump(self.datos, archivo, indent=2)
+            os.replace(temporal, self.ruta)
+
+def ejecutar_paso(paso, estado):
+    inicio = time.perf_counter()
+    registro = {'inicio': datetime.now().isoformat()}
+    huella = estado.huella(paso)
+    if not FORZAR and estado.vigente(paso, huella):
+        registro.update(estado='omitido', segundos=time.perf_counter() - inicio)
+        return registro, f"[{paso['nombre']}] entradas sin cambios, se omite"
+
+    if callable(paso['comando']):
+        paso['comando']()
+        salida, codigo = '', 0
+    else:
+        proceso = subprocess.run(paso['comando'], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        salida, codigo = proceso.stdout, proceso.returncode
+    registro.update(estado='ejecutado' if codigo == 0 else 'fallido', codigo=codigo,
+                    segundos=time.perf_counter() - inicio)
+    if codigo == 0:
+        # Las salidas de este paso son entradas de otros: la huella se toma antes de ejecutar
+        estado.registrar(paso, huella)
+    return registro, f"[{paso['nombre']}]\n{salida}".rstrip()
+
+def ejecutar(pasos, estado, trabajadores=TRABAJADORES_PIPELINE):
+    """Lanza cada paso apenas terminan sus dependencias; si uno falla, sus dependientes no corren."""
+    pendientes = {p['nombre']: p for p in pasos}
+    reporte, en_curso = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, trabajadores)) as ejecutor:
+        while pendientes or en_curso:
+            for nombre, p in list(pendientes.items()):
+                estados = [reporte.get(d, {}).get('estado') for d in p['depende']]
+                if any(e in ('fallido', 'cancelado') for e in estados):
+                    reporte[nombre] = {'estado': 'cancelado', 'segundos': 0.0}
+                    del pendientes[nombre]
+                elif all(e in ('ejecutado', 'omitido') for e in estados):
+                    en_curso[ejecutor.submit(ejecutar_paso, p, estado)] = nombre
+                    del pendientes[nombre]
+            if not en_curso:
+                break
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre = en_curso.pop(futuro)
+                try:
+                    reporte[nombre], salida = futuro.result()
+                except Exception as error:
+                    reporte[nombre], salida = {'estado': 'fallido', 'error': str(error), 'segundos': 0.0}, \
+                        f"[{nombre}] ERROR: {error}"
+                print(salida, flush=True)
+                print(f"[{nombre}] {reporte[nombre]['estado']} en {reporte[nombre]['segundos']:.2f} s\n", flush=True)
+    return reporte
+
+def escribir_metricas(reporte, total, ruta=METRICAS_PIPELINE):
+    """Duración y estado de cada paso de la última ejecución."""
+    lineas = [
+        '# HELP pipeline_step_duration_seconds Duración del paso en la última ejecución',
+        '# TYPE pipeline_step_duration_seconds gauge',
+    ]
+    lineas += [f'pipeline_step_duration_seconds{{step="{nombre}",status="{datos["estado"]}"}} {datos["segundos"]}'
+               for nombre, datos in reporte.items()]
+    lineas += [
+        '# HELP pipeline_duration_seconds Duración total de la última ejecución',
+        '# TYPE pipeline_duration_seconds gauge',
+        f'pipeline_duration_seconds {total}',
+        '# HELP pipeline_last_run_timestamp_seconds Fin de la última ejecución',
+        '# TYPE pipeline_last_run_timestamp_seconds gauge',
+        f'pipeline_last_run_timestamp_seconds {time.time()}',
+    ]
+    # Escritura atómica: el collector nunca debe leer un archivo a medias
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w') as archivo:
+        archivo.write('\n'.join(lineas) + '\n')
+    os.replace(temporal, ruta)
+
+def main():
+    print(f"=== Pipeline de análisis (motor {MOTOR_ANALISIS}"
+          f"{', incremental' if MODO_INCREMENTAL else ''}, {TRABAJADORES_PIPELINE} pasos en paralelo) ===")
+    inicio = time.perf_counter()
+    pasos = definir_pasos()
+    reporte = ejecutar(pasos, Estado())
+    total = time.perf_counter() - inicio
+
+    print(f"{'paso':<20} {'estado':<10} {'segundos':>9}")
+    for p in pasos:
+        datos = reporte[p['nombre']]
+        print(f"{p['nombre']:<20} {datos['estado']:<10} {datos['segundos']:>9.2f}")
+    print(f"{'total':<31} {total:>9.2f}")
+
+    os.makedirs(DIRECTORIO_RESULTADOS, exist_ok=True)
+    ruta = os.path.join(DIRECTORIO_RESULTADOS, 'reporte_pipeline.json')
+    with open(ruta, 'w') as archivo:
+        json.dump({'fecha': datetime.now().isoformat(), 'motor': MOTOR_ANALISIS, 'incremental': MODO_INCREMENTAL,
+                   'total_segundos': total, 'pasos': reporte}, archivo, indent=2)
+    print(f"Reporte de tiempos guardado en: {ruta}")
+    escribir_metricas(reporte, total)
+    if any(datos['estado'] in ('fallido', 'cancelado') for datos in reporte.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Decodifica las líneas de atascos guardadas como polilínea de Google (precisión 1e-5) por el scraper."""
+
+PRECISION = 1e5
+
+def decodificar(texto):
+    """Texto de la polilínea -> lista de (x, y), es decir (longitud, latitud)."""
+    puntos = []
+    indice = latitud = longitud = 0
+    valores = []
+    while indice < len(texto):
+        resultado = desplazamiento = 0
+        while True:
+            byte = ord(texto[indice]) - 63
+            indice += 1
+            resultado |= (byte & 0x1f) << desplazamiento
+            desplazamiento += 5
+            if byte < 0x20:
+                break
+        valores.append(~(resultado >> 1) if resultado & 1 else resultado >> 1)
+        if len(valores) == 2:
+            latitud += valores[0]
+            longitud += valores[1]
+            puntos.append((longitud / PRECISION, latitud / PRECISION))
+            valores = []
+    return puntos
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""Equivalente en pandas de procesar_data.pig: genera los reportes de alertas y atascos."""
+import os
+import csv
+import json
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+import pandas as pd
+
+from filtrar_data import (
+    COLUMNAS_ALERTAS, COLUMNAS_ATASCOS, NUMERICAS_ALERTAS, NUMERICAS_ATASCOS, ENTERAS_ATASCOS,
+    SALIDA_ALERTAS, SALIDA_ATASCOS,
+)
+from topk import EspacioAhorro
+
+ENTRADA_ALERTAS = os.environ.get('ENTRADA_ALERTAS', SALIDA_ALERTAS)
+ENTRADA_ATASCOS = os.environ.get('ENTRADA_ATASCOS', SALIDA_ATASCOS)
+DIRECTORIO_RESULTADOS = os.environ.get('DIRECTORIO_RESULTADOS', '/app/results')
+# "un_paso" (agregación por hash en una sola lectura, por defecto) o "pandas" (un groupby por reporte)
+MOTOR_PROCESAMIENTO = os.environ.get('MOTOR_PROCESAMIENTO', 'un_paso')
+# TOP_K > 0: los reportes de calles y comunas guardan solo las K primeras (memoria acotada con
+# Space-Saving y conteos exactos con una segunda lectura de los candidatos); 0 = listado completo
+TOP_K = int(os.environ.get('TOP_K', 0))
+TOP_K_CAPACIDAD = int(os.environ.get('TOP_K_CAPACIDAD', 0)) or max(50 * TOP_K, 1000)
+
+# Reportes que deja cada motor en la carpeta de ejecución (los mismos de procesar_data.pig)
+REPORTES = [
+    'horas_pico.csv', 'comunas_con_mas_alertas.csv', 'tipos_alerta_frecuencia.csv',
+    'alertas_tipo_false.csv', 'comunas_con_mas_accidentes.csv', 'calles_con_mas_alertas.csv',
+    'calles_con_mas_accidentes.csv', 'atascos_largos.csv', 'atascos_por_ciudad.csv',
+]
+
+def cargar_entrada(ruta, columnas, numericas, enteras=()):
+    if ruta.endswith('.parquet'):
+        datos = pd.read_parquet(ruta, columns=columnas)
+    else:
+        datos = pd.read_csv(ruta, dtype=str, keep_default_na=False)[columnas]
+    for columna in numericas:
+        datos[columna] = pd.to_numeric(datos[columna], errors='coerce').astype('float64')
+    return datos.astype({columna: 'Int64' for columna in enteras})
+
+def contar_por(datos, columnas, nombres):
+    """GROUP BY + COUNT + ORDER BY cantidad DESC, con los nombres de columna del reporte."""
+    conteo = datos.groupby(columnas, sort=False).size().reset_index(name=nombres[-1])
+    conteo.columns = nombres
+    return conteo.sort_values(nombres[-1], ascending=False, kind='stable')
+
+def guardar_parte(datos, directorio):
+    """Guarda sin encabezado como part-r-00000, igual que un STORE de Pig."""
+    os.makedirs(directorio, exist_ok=True)
+    datos.to_csv(os.path.join(directorio, 'part-r-00000'), index=False, header=False)
+
+def generar_reportes(alertas, atascos):
+    """Devuelve {nombre de archivo: DataFrame} con todos los reportes de procesar_data.pig."""
+    accidentes = alertas[alertas['type'] == 'ACCIDENT']
+
+    por_ciudad = atascos.groupby('city', sort=False).agg(
+        largo_total=('length', 'sum'), num_atascos=('length', 'size')).reset_index()
+    por_ciudad.columns = ['ciudad', 'largo_total', 'num_atascos']
+
+    return {
+        'horas_pico.csv': contar_por(alertas.assign(hora=alertas['fecha'].str.slice(11, 13)),
+                                     ['hora'], ['hora', 'cantidad_alertas']),
+        'comunas_con_mas_alertas.csv': contar_por(alertas, ['city'], ['comuna', 'cantidad_alertas']),
+        'tipos_alerta_frecuencia.csv': contar_por(alertas, ['type'], ['tipo_alerta', 'cantidad']),
+        'alertas_tipo_false.csv': alertas[alertas['type'] == 'false'],
+        'comunas_con_mas_accidentes.csv': contar_por(accidentes, ['city'], ['comuna', 'cantidad_accidentes']),
+        'calles_con_mas_alertas.csv': contar_por(alertas, ['street'], ['calle', 'cantidad_alertas']),
+        'calles_con_mas_accidentes.csv': contar_por(accidentes, ['street', 'city'],
+                                                    ['calle', 'ciudad', 'cantidad_accidentes']),
+        'atascos_largos.csv': atascos.sort_values('length', ascending=False, kind='stable'),
+        'atascos_por_ciudad.csv': por_ciudad.sort_values('largo_total', ascending=False, kind='stable'),
+    }
+
+def sumador(contador):
+    """Función que suma 1 a una clave, sea el contador un Counter o un resumen Space-Saving."""
+    if isinstance(contador, EspacioAhorro):
+        return contador.agregar
+    def sumar(clave):
+        contador[clave] += 1
+    return sumar
+
+class Acumuladores:
+    """Agregación por hash de todos los reportes de procesar_data.pig en una sola pasada.
+
+    Cada fila se lee una vez y actualiza todos los contadores que le corresponden;
+    los conteos globales (GROUP ALL) salen de los mismos acumuladores. Con top_k > 0 los
+    contadores de calles y comunas son resúmenes Space-Saving de tamaño fijo.
+    """
+
+    RESUMIDOS = ('comunas', 'calles', 'comunas_accidentes', 'calles_accidentes')
+
+    def __init__(self, top_k=0, capacidad=1000):
+        self.top_k = top_k
+        nuevo = (lambda: EspacioAhorro(capacidad)) if top_k else Counter
+        self.horas = Counter()
+        self.comunas = nuevo()
+        self.tipos = Counter()
+        self.calles = nuevo()
+        self.comunas_accidentes = nuevo()
+        self.calles_accidentes = nuevo()
+        self.alertas_false = []
+        self.muestra_alertas = []
+        self.num_alertas = 0
+        self.num_accidentes = 0
+
+        self.largo_por_ciudad = defaultdict(int)
+        self.atascos_por_ciudad = Counter()
+        self.atascos = []
+        self.muestra_atascos = []
+        self.num_atascos = 0
+
+    def agregar_alertas(self, filas, columnas):
+        i_city, i_type, i_street, i_fecha = (columnas.index(c) for c in ('city', 'type', 'street', 'fecha'))
+        sumar_comuna, sumar_calle, sumar_comuna_accidente, sumar_calle_accidente = (
+            sumador(getattr(self, nombre)) for nombre in self.RESUMIDOS)
+        for fila in filas:
+            city, tipo, street = fila[i_city], fila[i_type], fila[i_street]
+            self.horas[fila[i_fecha][11:13]] += 1
+            sumar_comuna(city)
+            self.tipos[tipo] += 1
+            sumar_calle(street)
+            if tipo == 'ACCIDENT':
+                sumar_comuna_accidente(city)
+                sumar_calle_accidente((street, city))
+                self.num_accidentes += 1
+            elif tipo == 'false':
+                self.alertas_false.append(fila)
+            if self.num_alertas < 10:
+                self.muestra_alertas.append(fila)
+            self.num_alertas += 1
+
+    def agregar_atascos(self, filas, columnas):
+        i_length, i_city = columnas.index('length'), columnas.index('city')
+        for fila in filas:
+            city = fila[i_city]
+            try:
+                largo = int(float(fila[i_length]))
+            except (TypeError, ValueError):
+                largo = None
+            else:
+                self.largo_por_ciudad[city] += largo
+            self.atascos_por_ciudad[city] += 1
+            self.atascos.append((largo, fila))
+            if self.num_atascos < 10:
+                self.muestra_atascos.append(fila)
+            self.num_atascos += 1
+
+    def refinar_top_k(self, filas, columnas):
+        """Segunda lectura: reemplaza cada resumen por los conteos exactos de sus candidatos al top-k."""
+        candidatos = {nombre: getattr(self, nombre).candidatos(self.top_k) for nombre in self.RESUMIDOS}
+        for nombre in self.RESUMIDOS:
+            if not getattr(self, nombre).exacto(self.top_k):
+                print(f"ADVERTENCIA: {nombre}: capacidad insuficiente para garantizar el top-{self.top_k} exacto")
+        exactos = {nombre: Counter() for nombre in self.RESUMIDOS}
+        i_city, i_type, i_street = (columnas.index(c) for c in ('city', 'type', 'street'))
+        for fila in filas:
+            city, street = fila[i_city], fila[i_street]
+            claves = [('comunas', city), ('calles', street)]
+            if fila[i_type] == 'ACCIDENT':
+                claves += [('comunas_accidentes', city), ('calles_accidentes', (street, city))]
+            for nombre, clave in claves:
+                if clave in candidatos[nombre]:
+                    exactos[nombre][clave] += 1
+        for nombre in self.RESUMIDOS:
+            setattr(self, nombre, exactos[nombre])
+        return {nombre: len(candidatos[nombre]) for nombre in self.RESUMIDOS}
+
+    def reportes(self):
+        """Devuelve {nombre de archivo: (encabezado, filas)} con el mismo contenido que generar_reportes.
+
+        Con top_k > 0 los reportes de calles y comunas quedan truncados a las K primeras filas.
+        """
+        k = self.top_k or None
+        atascos_largos = sorted((a for a in self.atascos if a[0] is not None), key=lambda a: a[0], reverse=True)
+        atascos_largos += [a for a in self.atascos if a[0] is None]
+        por_ciudad = sorted(self.atascos_por_ciudad, key=lambda c: self.largo_por_ciudad[c], reverse=True)
+        return {
+            'horas_pico.csv': (['hora', 'cantidad_alertas'], self.horas.most_common()),
+            'comunas_con_mas_alertas.csv': (['comuna', 'cantidad_alertas'], self.comunas.most_common(k)),
+            'tipos_alerta_frecuencia.csv': (['tipo_alerta', 'cantidad'], self.tipos.most_common()),
+            'alertas_tipo_false.csv': (COLUMNAS_ALERTAS, self.alertas_false),
+            'comunas_con_mas_accidentes.csv': (['comuna', 'cantidad_accidentes'],
+                                               self.comunas_accidentes.most_common(k)),
+            'calles_con_mas_alertas.csv': (['calle', 'cantidad_alertas'], self.calles.most_common(k)),
+            'calles_con_mas_accidentes.csv': (['calle', 'ciudad', 'cantidad_accidentes'],
+                                              [(*clave, n) for clave, n in self.calles_accidentes.most_common(k)]),
+            'atascos_largos.csv': (COLUMNAS_ATASCOS, [fila for _, fila in atascos_largos]),
+            'atascos_por_ciudad.csv': (['ciudad', 'largo_total', 'num_atascos'],
+                                       [(c, self.largo_por_ciudad[c], self.atascos_por_ciudad[c]) for c in por_ciudad]),
+        }
+
+def leer_filas(ruta, columnas):
+    """Itera las filas del CSV (o Parquet) reordenadas según el esquema, sin cargar el archivo en memoria."""
+    if ruta.endswith('.parquet'):
+        yield from leer_filas_parquet(ruta, columnas)
+        return
+    with open(ruta, newline='', encoding='utf-8') as archivo:
+        lector = csv.reader(archivo)
+        encabezado = next(lector)
+        indices = [encabezado.index(c) for c in columnas]
+        for fila in lector:
+            yield [fila[i] for i in indices]
+
+def leer_filas_parquet(ruta, columnas):
+    """Itera por lotes (row groups) las columnas ya tipadas, sin volver a interpretar texto."""
+    import pyarrow.parquet as pq
+    for lote in pq.ParquetFile(ruta).iter_batches(columns=columnas):
+        yield from zip(*(lote.column(columna).to_pylist() for columna in columnas))
+
+def escribir_csv(ruta, encabezado, filas):
+    with open(ruta, 'w', newline='', encoding='utf-8') as archivo:
+        escritor = csv.writer(archivo, lineterminator='\n')
+        escritor.writerow(encabezado)
+        escritor.writerows(filas)
+
+def procesar_un_paso(directorio_salida):
+    """Lee cada entrada una sola vez y escribe todos los reportes desde los acumuladores."""
+    acumuladores = Acumuladores(TOP_K, TOP_K_CAPACIDAD)
+    metricas = {}
+
+    for nombre, ruta, columnas, agregar in (
+        ('alertas', ENTRADA_ALERTAS, COLUMNAS_ALERTAS, acumuladores.agregar_alertas),
+        ('atascos', ENTRADA_ATASCOS, COLUMNAS_ATASCOS, acumuladores.agregar_atascos),
+    ):
+        inicio = time.perf_counter()
+        agregar(leer_filas(ruta, columnas), columnas)
+        segundos = time.perf_counter() - inicio
+        filas = acumuladores.num_alertas if nombre == 'alertas' else acumuladores.num_atascos
+        metricas[nombre] = {'filas': filas, 'segundos': segundos,
+                            'filas_por_segundo': filas / segundos if segundos > 0 else None}
+        print(f"{nombre}: {filas} filas en {segundos:.3f} s ({metricas[nombre]['filas_por_segundo'] or 0:,.0f} filas/s)")
+
+    if TOP_K:
+        # Las cuentas de Space-Saving son cotas superiores: se recuentan exacto solo los candidatos
+        inicio = time.perf_counter()
+        candidatos = acumuladores.refinar_top_k(leer_filas(ENTRADA_ALERTAS, COLUMNAS_ALERTAS), COLUMNAS_ALERTAS)
+        metricas['top_k'] = {'k': TOP_K, 'capacidad': TOP_K_CAPACIDAD, 'candidatos': candidatos,
+                             'segundos': time.perf_counter() - inicio}
+        print(f"Top-{TOP_K} (capacidad {TOP_K_CAPACIDAD}): candidatos recontados {candidatos}")
+
+    inicio = time.perf_counter()
+    reportes = acumuladores.reportes()
+    for archivo, (encabezado, filas) in reportes.items():
+        escribir_csv(os.path.join(directorio_salida, archivo), encabezado, filas)
+    for nombre, filas in (('atascos_sample', acumuladores.muestra_atascos),
+                          ('alertas_sample', acumuladores.muestra_alertas),
+                          ('atascos_count', [[acumuladores.num_atascos]]),
+                          ('alertas_count', [[acumuladores.num_alertas]]),
+                          ('accidentes_count', [[acumuladores.num_accidentes]])):
+        os.makedirs(os.path.join(directorio_salida, nombre), exist_ok=True)
+        with open(os.path.join(directorio_salida, nombre, 'part-r-00000'), 'w', newline='', encoding='utf-8') as archivo:
+            csv.writer(archivo, lineterminator='\n').writerows(filas)
+    metricas['escritura_segundos'] = time.perf_counter() - inicio
+
+    with open(os.path.join(directorio_salida, 'metricas_procesamiento.json'), 'w') as archivo:
+        json.dump(metricas, archivo, indent=2)
+
+    print(f"({acumuladores.num_atascos})")
+    print(f"({acumuladores.num_alertas})")
+    for hora, cantidad in reportes['horas_pico.csv'][1]:
+        print(f"{hora},{cantidad}")
+
+def procesar_pandas(directorio_salida):
+    alertas = cargar_entrada(ENTRADA_ALERTAS, COLUMNAS_ALERTAS, NUMERICAS_ALERTAS)
+    atascos = cargar_entrada(ENTRADA_ATASCOS, COLUMNAS_ATASCOS, NUMERICAS_ATASCOS, ENTERAS_ATASCOS)
+
+    # Muestras y conteos (mismos directorios que deja Pig)
+    guardar_parte(atascos.head(10), os.path.join(directorio_salida, 'atascos_sample'))
+    guardar_parte(alertas.head(10), os.path.join(directorio_salida, 'alertas_sample'))
+    guardar_parte(pd.DataFrame({'count': [len(atascos)]}), os.path.join(directorio_salida, 'atascos_count'))
+    guardar_parte(pd.DataFrame({'count': [len(alertas)]}), os.path.join(directorio_salida, 'alertas_count'))
+    num_accidentes = int((alertas['type'] == 'ACCIDENT').sum())
+    guardar_parte(pd.DataFrame({'count': [num_accidentes]}), os.path.join(directorio_salida, 'accidentes_count'))
+
+    reportes = generar_reportes(alertas, atascos)
+    for nombre, datos in reportes.items():
+        datos.to_csv(os.path.join(directorio_salida, nombre), index=False)
+
+    print(f"({len(atascos)})")
+    print(f"({len(alertas)})")
+    print(reportes['horas_pico.csv'].to_string(index=False))
+
+def main():
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    directorio_salida = os.environ.get('DIRECTORIO_SALIDA',
+                                       os.path.join(DIRECTORIO_RESULTADOS, f'ejecucion_{timestamp}'))
+    os.makedirs(directorio_salida, exist_ok=True)
+
+    if MOTOR_PROCESAMIENTO == 'pandas':
+        procesar_pandas(directorio_salida)
+    else:
+        procesar_un_paso(directorio_salida)
+    print(f"Reportes guardados en: {directorio_salida}")
+
+if __name__ == "__main__":
+    main()
@@ -3,40 +3,32 @@
 echo "=== Iniciando proceso completo de análisis de datos de tráfico ==="
 echo ""
 
-echo "Paso 1: Exportando datos de MongoDB..."
-echo ""
-python3 exportar_mongo.py
-echo ""
-
-echo "Paso 2: Filtrando datos con Apache Pig..."
-echo ""
-pig -x local filtrar_data.pig
-echo ""
-
-echo "Paso 3: Copiando datos filtrados a directorio de entrada para procesamiento..."
-echo ""
-# Crear directorio de entrada si no existe
-mkdir -p /app/input/alertas_completas
-mkdir -p /app/input/atascos_completos
-
-# Copiar datos filtrados
-cp /app/results/alertas_completas/alertas_completas.csv /app/input/alertas_completas/
-cp /app/results/atascos_completos/atascos_completos.csv /app/input/atascos_completos/
-
-echo "Paso 4: Verificando archivos de entrada..."
-ls -la /app/input/alertas_completas/
-ls -la /app/input/atascos_completos/
-
-echo "Paso 5: Procesando datos con Apache Pig..."
-echo ""
-pig -x local procesar_data.pig
-
-echo "Paso 6: Resultados del procesamiento:"
+# MODO_INCREMENTAL=1 exporta solo los documentos nuevos y actualiza los agregados guardados
+export MODO_INCREMENTAL=${MODO_INCREMENTAL:-0}
+
+# Motor de análisis: "pandas" (en proceso, por defecto), "pig" (Apache Pig en modo local)
+# o "mongo" (agregaciones en MongoDB, sin exportar los documentos)
+export MOTOR_ANALISIS=${MOTOR_ANALISIS:-pandas}
+
+# Formato entre etapas: "csv" (por defecto) o "parquet"; Pig solo lee CSV
+export FORMATO_INTERMEDIO=${FORMATO_INTERMEDIO:-csv}
+if [ "$MOTOR_ANALISIS" = "pig" ] && [ "$FORMATO_INTERMEDIO" != "csv" ]; then
+    echo "Apache Pig requiere CSV: se ignora FORMATO_INTERMEDIO=$FORMATO_INTERMEDIO"
+    export FORMATO_INTERMEDIO=csv
+fi
+
+# Exportación, filtrado, procesamiento, gráficos, mapas y series de tiempo: pipeline.py
+# omite los pasos cuyas entradas no cambiaron y ejecuta en paralelo los independientes
+python3 pipeline.py
+estado=$?
+
+echo "Resultados del procesamiento:"
 ls -la /app/results/
 
-echo "Paso 7: Generando gráficos de los resultados..."
-echo ""
-python3 graficar.py
+if [ $estado -ne 0 ]; then
+    echo "=== Proceso terminado con errores (ver reporte_pipeline.json) ==="
+    exit $estado
+fi
 
 echo ""
 echo "=== Proceso completo terminado ==="
\ No newline at end of file
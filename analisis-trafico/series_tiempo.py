@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Series de tiempo de alertas pre-agregadas por minuto, hora y día, por tipo y comuna.
+
+Los conteos se guardan en SQLite (ESTADO_SERIES) junto con los totales por tipo ('*' en
+comuna), por comuna ('*' en tipo) y globales, así las consultas de ventana deslizante y
+media móvil leen pocos buckets ya sumados. Cada ejecución incorpora solo los archivos
+exportados nuevos (cada uuid se cuenta una vez) y busca picos solo en los buckets que
+esos archivos modificaron, comparándolos con la media de las VENTANA_PICOS anteriores.
+"""
+import os
+import glob
+import sqlite3
+from datetime import datetime
+import pandas as pd
+
+from filtrar_data import DIRECTORIO_DATOS, EXTENSION, COLUMNAS_ALERTAS, NUMERICAS_ALERTAS, cargar_csv, ultima_ejecucion
+
+ESTADO_SERIES = os.environ.get('ESTADO_SERIES', os.path.join(DIRECTORIO_DATOS, 'series_tiempo.db'))
+NIVEL_PICOS = os.environ.get('NIVEL_PICOS', 'hora')
+VENTANA_PICOS = int(os.environ.get('VENTANA_PICOS', 24))
+UMBRAL_PICOS = float(os.environ.get('UMBRAL_PICOS', 3.0))
+# Buckets de la media móvil en los reportes
+VENTANA_MEDIA_MOVIL = int(os.environ.get('VENTANA_MEDIA_MOVIL', 24))
+
+# nivel -> (formato del inicio del bucket, frecuencia de pandas)
+NIVELES = {
+    'minuto': ('%Y-%m-%d %H:%M', 'min'),
+    'hora': ('%Y-%m-%d %H:00', 'h'),
+    'dia': ('%Y-%m-%d', 'D'),
+}
+TODOS = '*'
+
+def conectar(ruta=ESTADO_SERIES):
+    conn = sqlite3.connect(ruta)
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS buckets (
+            nivel TEXT, tipo TEXT, comuna TEXT, inicio TEXT, cantidad INTEGER,
+            PRIMARY KEY (nivel, tipo, comuna, inicio)
+        );
+        CREATE TABLE IF NOT EXISTS vistos (uuid TEXT PRIMARY KEY);
+        CREATE TABLE IF NOT EXISTS picos (
+            nivel TEXT, tipo TEXT, comuna TEXT, inicio TEXT,
+            cantidad INTEGER, media REAL, desviacion REAL, puntaje REAL, detectado_en TEXT,
+            PRIMARY KEY (nivel, tipo, comuna, inicio)
+        );
+        CREATE TABLE IF NOT EXISTS archivos_procesados (ruta TEXT PRIMARY KEY, procesado_en TEXT);
+    """)
+    return conn
+
+def alertas_nuevas(conn, ruta):
+    """Alertas completas del archivo cuyo uuid no se había contado antes."""
+    datos = cargar_csv(ruta, COLUMNAS_ALERTAS, NUMERICAS_ALERTAS)[['uuid', 'type', 'city', 'fecha']]
+    datos = datos[(datos[['uuid', 'type', 'city', 'fecha']].fillna('') != '').all(axis=1)]
+    datos = datos.assign(instante=pd.to_datetime(datos['fecha'], format='ISO8601', errors='coerce'))
+    datos = datos.dropna(subset=['instante']).sort_values('instante', kind='stable').drop_duplicates('uuid')
+
+    datos[['uuid']].to_sql('lote_uuid', conn, if_exists='replace', index=False)
+    nuevos = {fila[0] for fila in conn.execute(
+        "SELECT uuid FROM lote_uuid WHERE uuid NOT IN (SELECT uuid FROM vistos)")}
+    conn.execute("INSERT OR IGNORE INTO vistos SELECT uuid FROM lote_uuid")
+    conn.execute("DROP TABLE lote_uuid")
+    return datos[datos['uuid'].isin(nuevos)]
+
+def sumar_buckets(conn, alertas):
+    """Suma las alertas a los buckets de cada nivel, con sus totales; devuelve los buckets tocados."""
+    tocados = []
+    for nivel, (formato, _) in NIVELES.items():
+        inicio = alertas['instante'].dt.strftime(formato)
+        base = pd.DataFrame({'tipo': alertas['type'], 'comuna': alertas['city'], 'inicio': inicio})
+        for tipo, comuna in (('tipo', 'comuna'), ('tipo', None), (None, 'comuna'), (None, None)):
+            claves = base.assign(tipo=base['tipo'] if tipo else TODOS, comuna=base['comuna'] if comuna else TODOS)
+            conteo = claves.groupby(['tipo', 'comuna', 'inicio'], sort=False).size().reset_index(name='cantidad')
+            conn.executemany(
+                "INSERT INTO buckets VALUES (?, ?, ?, ?, ?) ON CONFLICT (nivel, tipo, comuna, inicio) "
+                "DO UPDATE SET cantidad = cantidad + excluded.cantidad",
+                [(nivel, *fila) for fila in conteo.itertuples(index=False, name=None)])
+            if nivel == NIVEL_PICOS:
+                tocados.append(conteo[['tipo', 'comuna', 'inicio']])
+    return pd.concat(tocados, ignore_index=True) if tocados else pd.DataFrame(columns=['tipo', 'comuna', 'inicio'])
+
+def consultar_serie(conn, nivel='hora', tipo=TODOS, comuna=TODOS, desde=None, hasta=None,
+                    ventana=VENTANA_MEDIA_MOVIL):
+    """Serie continua (buckets sin alertas en 0) con suma de ventana deslizante y media móvil."""
+    formato, frecuencia = NIVELES[nivel]
+    consulta = "SELECT inicio, cantidad FROM buckets WHERE nivel = ? AND tipo = ? AND comuna = ?"
+    parametros = [nivel, tipo, comuna]
+    if desde is not None:
+        consulta += " AND inicio >= ?"
+        parametros.append(pd.Timestamp(desde).strftime(formato))
+    if hasta is not None:
+        consulta += " AND inicio <= ?"
+        parametros.append(pd.Timestamp(hasta).strftime(formato))
+    datos = pd.read_sql_query(consulta + " ORDER BY inicio", conn, params=parametros)
+    if datos.empty:
+        return pd.DataFrame(columns=['inicio', 'cantidad', 'suma_ventana', 'media_movil'])
+
+    serie = datos.set_index(pd.to_datetime(datos['inicio'], format=formato))['cantidad']
+    indice = pd.date_range(pd.Timestamp(desde).floor(frecuencia) if desde is not None else serie.index.min(),
+                           pd.Timestamp(hasta).floor(frecuencia) if hasta is not None else serie.index.max(),
+                           freq=frecuencia)
+    serie = serie.reindex(indice, fill_value=0)
+    resultado = pd.DataFrame({
+        'inicio': serie.index.strftime(formato),
+        'cantidad': serie.to_numpy(),
+        'suma_ventana': serie.rolling(ventana, min_periods=1).sum().astype('int64').to_numpy(),
+        'media_movil': serie.rolling(ventana, min_periods=1).mean().round(3).to_numpy(),
+    })
+    return resultado
+
+def detectar_picos(conn, tocados, nivel=NIVEL_PICOS, ventana=VENTANA_PICOS, umbral=UMBRAL_PICOS):
+    """Evalúa solo los buckets tocados contra la media y desviación de los `ventana` buckets anteriores."""
+    formato, frecuencia = NIVELES[nivel]
+    paso = pd.tseries.frequencies.to_offset(frecuencia)
+    picos = []
+    for (tipo, comuna), grupo in tocados.drop_duplicates().groupby(['tipo', 'comuna']):
+        instantes = pd.to_datetime(grupo['inicio'], format=formato)
+        # Sin historial completo (inicio de la serie) no se puede decir si es un pico
+        primero = pd.to_datetime(conn.execute(
+            "SELECT MIN(inicio) FROM buckets WHERE nivel = ? AND tipo = ? AND comuna = ?",
+            (nivel, tipo, comuna)).fetchone()[0], format=formato)
+        historial = consultar_serie(conn, nivel, tipo, comuna,
+                                    desde=instantes.min() - ventana * paso, hasta=instantes.max(), ventana=ventana)
+        cantidades = historial['cantidad'].to_numpy(dtype='float64')
+        posiciones = {inicio: i for i, inicio in enumerate(historial['inicio'])}
+        for inicio, instante in zip(grupo['inicio'], instantes):
+            if instante - ventana * paso < primero:
+                continue
+            i = posiciones[inicio]
+            anteriores = cantidades[max(0, i - ventana):i]
+            if len(anteriores) < ventana:
+                continue
+            media = anteriores.mean()
+            # Piso de 1 para que una serie casi constante no marque picos por una alerta de más
+            desviacion = max(anteriores.std(), 1.0)
+            puntaje = (cantidades[i] - media) / desviacion
+            if puntaje >= umbral:
+                picos.append((nivel, tipo, comuna, inicio, int(cantidades[i]), float(media),
+                              float(desviacion), float(puntaje), datetime.now().isoformat()))
+    conn.executemany("INSERT OR REPLACE INTO picos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", picos)
+    return picos
+
+def escribir_reportes(conn, directorio_salida):
+    tipos = [fila[0] for fila in conn.execute(
+        "SELECT DISTINCT tipo FROM buckets WHERE nivel = 'dia' AND comuna = ?", (TODOS,))]
+    for nivel, archivo in (('hora', 'serie_horaria.csv'), ('dia', 'serie_diaria.csv')):
+        series = [consultar_serie(conn, nivel, tipo).assign(tipo=tipo) for tipo in tipos]
+        series = [serie for serie in series if not serie.empty]
+        if series:
+            pd.concat(series, ignore_index=True)[['tipo', 'inicio', 'cantidad', 'suma_ventana', 'media_movil']] \
+                .to_csv(os.path.join(directorio_salida, archivo), index=False)
+    pd.read_sql_query("SELECT nivel, tipo, comuna, inicio, cantidad, media, desviacion, puntaje FROM picos "
+                      "ORDER BY inicio DESC, puntaje DESC", conn) \
+        .to_csv(os.path.join(directorio_salida, 'picos.csv'), index=False)
+
+def main():
+    conn = conectar()
+    procesados = {fila[0] for fila in conn.execute("SELECT ruta FROM archivos_procesados")}
+    nuevos_picos = []
+    for ruta in sorted(glob.glob(os.path.join(DIRECTORIO_DATOS, f'transformed_alerta_*.{EXTENSION}'))):
+        if ruta in procesados:
+            continue
+        with conn:
+            alertas = alertas_nuevas(conn, ruta)
+            tocados = sumar_buckets(conn, alertas)
+            picos = detectar_picos(conn, tocados)
+            conn.execute("INSERT INTO archivos_procesados VALUES (?, ?)", (ruta, datetime.now().isoformat()))
+        nuevos_picos += picos
+        print(f"{os.path.basename(ruta)}: {len(alertas)} alertas nuevas, {len(tocados)} buckets actualizados, "
+              f"{len(picos)} picos")
+
+    for nivel, tipo, comuna, inicio, cantidad, media, _, puntaje, _ in nuevos_picos:
+        print(f"PICO {nivel} {inicio} tipo={tipo} comuna={comuna}: {cantidad} alertas "
+              f"(media {media:.1f}, puntaje {puntaje:.1f})")
+
+    directorio_salida = os.environ.get('DIRECTORIO_SALIDA') or ultima_ejecucion()
+    if directorio_salida:
+        os.makedirs(directorio_salida, exist_ok=True)
+        escribir_reportes(conn, directorio_salida)
+        print(f"Series de tiempo guardadas en: {directorio_salida}")
+    conn.close()
+
+if __name__ == "__main__":
+    main()
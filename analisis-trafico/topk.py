@@ -0,0 +1,68 @@
+"""Resumen Space-Saving para obtener las claves más frecuentes de un flujo con memoria acotada."""
+import heapq
+
+class EspacioAhorro:
+    """Space-Saving (Metwally et al., 2005) con a lo más `capacidad` claves monitoreadas.
+
+    Cuando llega una clave nueva y el resumen está lleno, reemplaza a la de menor cuenta y
+    hereda esa cuenta como error máximo. Toda clave con frecuencia real mayor que
+    total / capacidad queda garantizada dentro del resumen. Expone most_common() igual
+    que collections.Counter para poder usarse en su lugar.
+    """
+
+    def __init__(self, capacidad):
+        self.capacidad = capacidad
+        self.cuentas = {}
+        self.errores = {}
+        self.total = 0
+        # (cuenta, clave); las entradas obsoletas se descartan al buscar el mínimo
+        self.monticulo = []
+
+    def __len__(self):
+        return len(self.cuentas)
+
+    def agregar(self, clave, n=1):
+        self.total += n
+        if clave in self.cuentas:
+            self.cuentas[clave] += n
+        elif len(self.cuentas) < self.capacidad:
+            self.cuentas[clave] = n
+            self.errores[clave] = 0
+        else:
+            minimo, victima = self._extraer_minimo()
+            del self.cuentas[victima]
+            del self.errores[victima]
+            self.cuentas[clave] = minimo + n
+            self.errores[clave] = minimo
+        heapq.heappush(self.monticulo, (self.cuentas[clave], clave))
+        if len(self.monticulo) > 4 * self.capacidad:
+            self.monticulo = [(cuenta, c) for c, cuenta in self.cuentas.items()]
+            heapq.heapify(self.monticulo)
+
+    def _extraer_minimo(self):
+        while True:
+            cuenta, clave = heapq.heappop(self.monticulo)
+            if self.cuentas.get(clave) == cuenta:
+                return cuenta, clave
+
+    def error(self, clave):
+        return self.errores.get(clave, 0)
+
+    def most_common(self, n=None):
+        ordenadas = sorted(self.cuentas.items(), key=lambda item: item[1], reverse=True)
+        return ordenadas if n is None else ordenadas[:n]
+
+    def candidatos(self, k):
+        """Claves que pueden estar en el top-k real: su cota superior alcanza la k-ésima cota inferior."""
+        inferiores = sorted((cuenta - self.errores[clave] for clave, cuenta in self.cuentas.items()), reverse=True)
+        if len(inferiores) < k:
+            return set(self.cuentas)
+        umbral = inferiores[k - 1]
+        return {clave for clave, cuenta in self.cuentas.items() if cuenta >= umbral}
+
+    def exacto(self, k):
+        """True si los candidatos contienen con certeza el top-k real (o si nunca hubo reemplazos)."""
+        if len(self.cuentas) < self.capacidad or len(self.cuentas) < k:
+            return True
+        inferiores = sorted((cuenta - self.errores[clave] for clave, cuenta in self.cuentas.items()), reverse=True)
+        return inferiores[k - 1] > min(self.cuentas.values())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""Asigna cada alerta al atasco sobre cuya línea está (por ejemplo, accidentes que causan atascos).
+
+Las líneas de los atascos se parten en segmentos y se indexan en una grilla regular en metros:
+cada segmento se inscribe en las celdas que toca su caja envolvente ampliada en DISTANCIA_UNION_M.
+Cada alerta solo se compara con los segmentos de su celda (un searchsorted sobre las claves
+ordenadas), así que el costo crece con la cantidad de candidatos cercanos y no con
+alertas × segmentos. Una alerta queda asignada al atasco más cercano a menos de
+DISTANCIA_UNION_M metros cuya fecha esté a menos de VENTANA_UNION de la suya.
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from filtrar_data import SALIDA_ATASCOS, ultima_ejecucion
+from procesar_data import ENTRADA_ALERTAS
+from espacial import cargar_puntos_atascos, leer_columnas
+
+DISTANCIA_UNION_M = float(os.environ.get('DISTANCIA_UNION_M', 30))
+VENTANA_UNION = pd.Timedelta(os.environ.get('VENTANA_UNION', '2h'))
+# Lado de la celda del índice; con celdas más chicas que la distancia cada segmento cae en más celdas
+LADO_CELDA_UNION_M = max(float(os.environ.get('LADO_CELDA_UNION_M', 100)), DISTANCIA_UNION_M)
+# Segmentos que cubren más celdas que esto son errores de datos (saltos de cientos de km)
+MAXIMO_CELDAS_SEGMENTO = 10000
+
+METROS_POR_GRADO = 111320.0
+
+def a_metros(x, y, latitud_referencia):
+    """Proyección equirectangular local: suficiente para distancias de decenas de metros."""
+    return x * METROS_POR_GRADO * np.cos(np.radians(latitud_referencia)), y * METROS_POR_GRADO
+
+def segmentos_atascos(puntos):
+    """Segmentos entre vértices consecutivos de cada documento (el orden del archivo es el de la línea)."""
+    uuid = puntos['uuid'].to_numpy()
+    documento = puntos['documento'].to_numpy()
+    x = pd.to_numeric(puntos['x'], errors='coerce').to_numpy(dtype='float64')
+    y = pd.to_numeric(puntos['y'], errors='coerce').to_numpy(dtype='float64')
+    fecha = pd.to_datetime(puntos['fecha'], format='ISO8601', errors='coerce').to_numpy()
+    continua = (documento[:-1] == documento[1:]) & np.isfinite(x[:-1] + y[:-1] + x[1:] + y[1:]) & ~np.isnat(fecha[:-1])
+    return {
+        'uuid': uuid[:-1][continua], 'fecha': fecha[:-1][continua],
+        'x1': x[:-1][continua], 'y1': y[:-1][continua], 'x2': x[1:][continua], 'y2': y[1:][continua],
+    }
+
+def expandir_rangos(inicios, cantidades):
+    """Para cada i, los enteros inicios[i] .. inicios[i] + cantidades[i] - 1, junto con su i."""
+    origen = np.repeat(np.arange(len(cantidades)), cantidades)
+    desplazamiento = np.arange(len(origen)) - np.repeat(np.cumsum(cantidades) - cantidades, cantidades)
+    return origen, np.repeat(inicios, cantidades) + desplazamiento
+
+def clave_celda(ix, iy):
+    return (ix.astype(np.int64) << 32) + iy.astype(np.int64)
+
+def indexar_segmentos(x1, y1, x2, y2, lado, margen):
+    """Pares (clave de celda, segmento) ordenados por clave."""
+    ix0 = np.floor((np.minimum(x1, x2) - margen) / lado).astype(np.int64)
+    ix1 = np.floor((np.maximum(x1, x2) + margen) / lado).astype(np.int64)
+    iy0 = np.floor((np.minimum(y1, y2) - margen) / lado).astype(np.int64)
+    iy1 = np.floor((np.maximum(y1, y2) + margen) / lado).astype(np.int64)
+    ancho = ix1 - ix0 + 1
+    celdas = ancho * (iy1 - iy0 + 1)
+    celdas[celdas > MAXIMO_CELDAS_SEGMENTO] = 0
+    segmento, k = expandir_rangos(np.zeros(len(celdas), dtype=np.int64), celdas)
+    claves = clave_celda(ix0[segmento] + k % ancho[segmento], iy0[segmento] + k // ancho[segmento])
+    orden = np.argsort(claves, kind='stable')
+    return claves[orden], segmento[orden]
+
+def distancia_a_segmento(px, py, x1, y1, x2, y2):
+    dx, dy = x2 - x1, y2 - y1
+    largo2 = dx * dx + dy * dy
+    t = np.where(largo2 > 0, ((px - x1) * dx + (py - y1) * dy) / np.where(largo2 > 0, largo2, 1), 0)
+    t = np.clip(t, 0, 1)
+    return np.hypot(px - (x1 + t * dx), py - (y1 + t * dy))
+
+def unir(alertas, segmentos, distancia=DISTANCIA_UNION_M, ventana=VENTANA_UNION, lado=LADO_CELDA_UNION_M):
+    """Índice de cada alerta asignada, uuid del atasco más cercano y distancia en metros."""
+    ax = pd.to_numeric(alertas['x'], errors='coerce').to_numpy(dtype='float64')
+    ay = pd.to_numeric(alertas['y'], errors='coerce').to_numpy(dtype='float64')
+    afecha = pd.to_datetime(alertas['fecha'], format='ISO8601', errors='coerce').to_numpy()
+    vacio = pd.DataFrame({'alerta': np.array([], dtype=np.int64), 'uuid_atasco': [], 'distancia_m': []})
+    if len(segmentos['uuid']) == 0 or len(ax) == 0:
+        return vacio
+
+    referencia = float(np.nanmean(segmentos['y1']))
+    x1, y1 = a_metros(segmentos['x1'], segmentos['y1'], referencia)
+    x2, y2 = a_metros(segmentos['x2'], segmentos['y2'], referencia)
+    px, py = a_metros(ax, ay, referencia)
+    claves, segmento_de_clave = indexar_segmentos(x1, y1, x2, y2, lado, distancia)
+
+    validas = np.flatnonzero(np.isfinite(px) & np.isfinite(py) & ~np.isnat(afecha))
+    clave_alerta = clave_celda(np.floor(px[validas] / lado).astype(np.int64),
+                               np.floor(py[validas] / lado).astype(np.int64))
+    desde = np.searchsorted(claves, clave_alerta, side='left')
+    hasta = np.searchsorted(claves, clave_alerta, side='right')
+    origen, posicion = expandir_rangos(desde, hasta - desde)
+    alerta = validas[origen]
+    segmento = segmento_de_clave[posicion]
+
+    cerca = np.abs(afecha[alerta] - segmentos['fecha'][segmento]) <= ventana.to_timedelta64()
+    alerta, segmento = alerta[cerca], segmento[cerca]
+    metros = distancia_a_segmento(px[alerta], py[alerta], x1[segmento], y1[segmento], x2[segmento], y2[segmento])
+    cerca = metros <= distancia
+    if not cerca.any():
+        return vacio
+    pares = pd.DataFrame({'alerta': alerta[cerca], 'uuid_atasco': segmentos['uuid'][segmento[cerca]],
+                          'distancia_m': metros[cerca]})
+    return pares.sort_values(['alerta', 'distancia_m'], kind='stable').drop_duplicates('alerta')
+
+def atributos_atascos():
+    if not os.path.exists(SALIDA_ATASCOS):
+        return None
+    atascos = leer_columnas(SALIDA_ATASCOS, ['uuid', 'street', 'city', 'length', 'speed'])
+    return atascos.drop_duplicates('uuid').rename(columns={
+        'uuid': 'uuid_atasco', 'street': 'calle_atasco', 'city': 'comuna_atasco',
+        'length': 'largo', 'speed': 'velocidad'})
+
+def main():
+    directorio_salida = os.environ.get('DIRECTORIO_SALIDA') or ultima_ejecucion()
+    if directorio_salida is None:
+        print("ERROR: No se encontraron directorios de ejecución.")
+        return
+    puntos = cargar_puntos_atascos()
+    if puntos is None or not os.path.exists(ENTRADA_ALERTAS):
+        print("Sin alertas o sin geometría de atascos, se omite la unión espacial")
+        return
+
+    inicio = time.perf_counter()
+    alertas = leer_columnas(ENTRADA_ALERTAS, ['uuid', 'type', 'street', 'city', 'location_x', 'location_y', 'fecha'])
+    alertas = alertas.rename(columns={'location_x': 'x', 'location_y': 'y'}).reset_index(drop=True)
+    segmentos = segmentos_atascos(puntos)
+    pares = unir(alertas, segmentos)
+    segundos = time.perf_counter() - inicio
+
+    asignadas = alertas.iloc[pares['alerta'].to_numpy()].reset_index(drop=True)
+    asignadas = pd.DataFrame({
+        'uuid_alerta': asignadas['uuid'], 'tipo': asignadas['type'], 'calle': asignadas['street'],
+        'comuna': asignadas['city'], 'fecha': asignadas['fecha'],
+        'uuid_atasco': pares['uuid_atasco'].to_numpy(), 'distancia_m': pares['distancia_m'].round(1).to_numpy(),
+    })
+    asignadas.to_csv(os.path.join(directorio_salida, 'alertas_en_atascos.csv'), index=False)
+
+    por_tipo = alertas.groupby('type').size().rename('alertas').to_frame() \
+        .join(asignadas.groupby('tipo').size().rename('en_atasco')).fillna(0).astype('int64')
+    por_tipo['proporcion'] = (por_tipo['en_atasco'] / por_tipo['alertas']).round(4)
+    por_tipo.rename_axis('tipo').sort_values('en_atasco', ascending=False) \
+        .to_csv(os.path.join(directorio_salida, 'tipos_alerta_en_atascos.csv'))
+
+    accidentes = asignadas[asignadas['tipo'] == 'ACCIDENT'].groupby('uuid_atasco').size().rename('accidentes')
+    atascos = accidentes.to_frame().join(asignadas.groupby('uuid_atasco').size().rename('alertas')).reset_index()
+    atributos = atributos_atascos()
+    if atributos is not None:
+        atascos = atascos.merge(atributos, on='uuid_atasco', how='left')
+    atascos.sort_values(['accidentes', 'alertas'], ascending=False) \
+        .to_csv(os.path.join(directorio_salida, 'atascos_con_accidentes.csv'), index=False)
+
+    print(f"Unión espacial: {len(alertas)} alertas y {len(segmentos['uuid'])} segmentos de "
+          f"{len(np.unique(segmentos['uuid']))} atascos en {segundos:.2f} s; {len(asignadas)} alertas sobre un atasco, "
+          f"{len(atascos)} atascos con accidentes")
+    print(f"Resultados guardados en: {directorio_salida}")
+
+if __name__ == "__main__":
+    main()
@@ -1,114 +1,230 @@
-
+import argparse
 import json
 import os
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 
-# Verificar archivos JSON disponibles
-json_files = [f for f in os.listdir('.') if f.endswith('.json')]
-print(f"Archivos JSON encontrados: {json_files}")
-
-# Cargar resultados de archivos individuales
-results = []
-
-# Intentar cargar archivo consolidado primero
-if "all_simulation_results.json" in json_files:
-    try:
-        with open("all_simulation_results.json", "r") as f:
-            results = json.load(f)
-        print("✅ Datos cargados de all_simulation_results.json")
-    except Exception as e:
-        print(f"Error al cargar all_simulation_results.json: {e}")
-
-# Si no hay resultados del archivo consolidado, cargar archivos individuales
-if not results:
-    for file in json_files:
-        if file.startswith("results_") and file != "results_comparison.csv":
-            try:
-                with open(file, "r") as f:
-                    data = json.load(f)
-                    # Si el archivo contiene un solo resultado (diccionario)
-                    if isinstance(data, dict):
-                        results.append(data)
-                    # Si contiene una lista de resultados
-                    elif isinstance(data, list):
-                        results.extend(data)
-                print(f"✅ Datos cargados de {file}")
-            except Exception as e:
-                print(f"Error al cargar {file}: {e}")
-
-# Verificar si tenemos datos para analizar
-if not results:
-    print("❌ No se pudieron cargar datos de ningún archivo JSON.")
-    exit(1)
-
-print(f"Total de resultados cargados: {len(results)}")
-
-# Convertir a DataFrame para facilitar el análisis
-df = pd.DataFrame(results)
-print("\nColumnas disponibles en los datos:")
-print(df.columns.tolist())
-
-# Crear directorio para gráficos si no existe
-if not os.path.exists("graficos"):
-    os.makedirs("graficos")
-
-# Verificar si tenemos las columnas necesarias
-required_columns = ["distribution", "cache_policy", "hit_rate", "avg_latency", "hits", "misses"]
-missing_columns = [col for col in required_columns if col not in df.columns]
-
-if missing_columns:
-    print(f"⚠️ Faltan algunas columnas esperadas: {missing_columns}")
-    print("Mostrando las primeras filas de datos para inspección:")
-    print(df.head())
-else:
-    # 1. Comparar hit rate por política de caché y distribución
-    plt.figure(figsize=(12, 6))
-    ax = sns.barplot(x="cache_policy", y="hit_rate", hue="distribution", data=df)
-    plt.title("Tasa de Aciertos (Hit Rate) por Política de Caché y Distribución")
-    plt.xlabel("Política de Caché")
-    plt.ylabel("Hit Rate")
-    plt.xticks(rotation=0)
-    plt.tight_layout()
-    plt.savefig("graficos/hit_rate_comparison.png")
-    print("✅ Gráfico de hit rate generado")
-
-    # 2. Comparar latencia por política de caché y distribución
-    plt.figure(figsize=(12, 6))
-    ax = sns.barplot(x="cache_policy", y="avg_latency", hue="distribution", data=df)
-    plt.title("Latencia Promedio por Política de Caché y Distribución")
-    plt.xlabel("Política de Caché")
-    plt.ylabel("Latencia Promedio (s)")
-    plt.xticks(rotation=0)
-    plt.tight_layout()
-    plt.savefig("graficos/latency_comparison.png")
-    print("✅ Gráfico de latencia generado")
-
-    # 3. Mostrar la distribución de hits vs misses
-    plt.figure(figsize=(14, 6))
-    df_melted = pd.melt(df, 
-                      id_vars=["distribution", "cache_policy"], 
-                      value_vars=["hits", "misses"],
-                      var_name="metric", value_name="value")
+import results_store
+
+def analyze_json_files():
+    """Modo original: carga los JSON del directorio actual y dibuja las comparaciones."""
+    # Verificar archivos JSON disponibles
+    json_files = [f for f in os.listdir('.') if f.endswith('.json')]
+    print(f"Archivos JSON encontrados: {json_files}")
+
+    # Cargar resultados de archivos individuales
+    results = []
+
+    # Intentar cargar archivo consolidado primero
+    if "all_simulation_results.json" in json_files:
+        try:
+            with open("all_simulation_results.json", "r") as f:
+                results = json.load(f)
+            print("✅ Datos cargados de all_simulation_results.json")
+        except Exception as e:
+            print(f"Error al cargar all_simulation_results.json: {e}")
+
+    # Si no hay resultados del archivo consolidado, cargar archivos individuales
+    if not results:
+        for file in json_files:
+            if file.startswith("results_") and file != "results_comparison.csv":
+                try:
+                    with open(file, "r") as f:
+                        data = json.load(f)
+                        # Si el archivo contiene un solo resultado (diccionario)
+                        if isinstance(data, dict):
+                            results.append(data)
+                        # Si contiene una lista de resultados
+                        elif isinstance(data, list):
+                            results.extend(data)
+                    print(f"✅ Datos cargados de {file}")
+                except Exception as e:
+                    print(f"Error al cargar {file}: {e}")
+
+    # Verificar si tenemos datos para analizar
+    if not results:
+        print("❌ No se pudieron cargar datos de ningún archivo JSON.")
+        return
+
+    print(f"Total de resultados cargados: {len(results)}")
+
+    # Convertir a DataFrame para facilitar el análisis
+    df = pd.DataFrame(results)
+    print("\nColumnas disponibles en los datos:")
+    print(df.columns.tolist())
+
+    # Crear directorio para gráficos si no existe
+    if not os.path.exists("graficos"):
+        os.makedirs("graficos")
+
+    # Verificar si tenemos las columnas necesarias
+    required_columns = ["distribution", "cache_policy", "hit_rate", "avg_latency", "hits", "misses"]
+    missing_columns = [col for col in required_columns if col not in df.columns]
+
+    if missing_columns:
+        print(f"⚠️ Faltan algunas columnas esperadas: {missing_columns}")
+        print("Mostrando las primeras filas de datos para inspección:")
+        print(df.head())
+    else:
+        # 1. Comparar hit rate por política de caché y distribución
+        plt.figure(figsize=(12, 6))
+        ax = sns.barplot(x="cache_policy", y="hit_rate", hue="distribution", data=df)
+        plt.title("Tasa de Aciertos (Hit Rate) por Política de Caché y Distribución")
+        plt.xlabel("Política de Caché")
+        plt.ylabel("Hit Rate")
+        plt.xticks(rotation=0)
+        plt.tight_layout()
+        plt.savefig("graficos/hit_rate_comparison.png")
+        print("✅ Gráfico de hit rate generado")
+
+        # 2. Comparar latencia por política de caché y distribución
+        plt.figure(figsize=(12, 6))
+        ax = sns.barplot(x="cache_policy", y="avg_latency", hue="distribution", data=df)
+        plt.title("Latencia Promedio por Política de Caché y Distribución")
+        plt.xlabel("Política de Caché")
+        plt.ylabel("Latencia Promedio (s)")
+        plt.xticks(rotation=0)
+        plt.tight_layout()
+        plt.savefig("graficos/latency_comparison.png")
+        print("✅ Gráfico de latencia generado")
+
+        # 3. Mostrar la distribución de hits vs misses
+        plt.figure(figsize=(14, 6))
+        df_melted = pd.melt(df, 
+                          id_vars=["distribution", "cache_policy"], 
+                          value_vars=["hits", "misses"],
+                          var_name="metric", value_name="value")
     
-    sns.barplot(x="cache_policy", y="value", hue="metric", data=df_melted)
-    plt.title("Distribución de Hits vs Misses por Política de Caché")
-    plt.xlabel("Política de Caché")
-    plt.ylabel("Cantidad")
-    plt.tight_layout()
-    plt.savefig("graficos/hits_misses_distribution.png")
-    print("✅ Gráfico de hits vs misses generado")
-
-    # 4. Crear tabla comparativa
-    print("\nTabla Comparativa de Resultados:")
-    comp_table = df[["distribution", "cache_policy", "hit_rate", "avg_latency", "hits", "misses"]]
-    comp_table["hit_rate"] = comp_table["hit_rate"].apply(lambda x: f"{x:.2%}")
-    comp_table["avg_latency"] = comp_table["avg_latency"].apply(lambda x: f"{x*1000:.2f} ms")
-    print(comp_table.to_string(index=False))
-
-    # Guardar la tabla como CSV para incluirla en el informe
-    comp_table.to_csv("results_comparison.csv", index=False)
-    print("✅ Tabla comparativa guardada como CSV")
-
-print("\nAnálisis completo. Revisa los gráficos generados en la carpeta 'graficos'.")
\ No newline at end of file
+        sns.barplot(x="cache_policy", y="value", hue="metric", data=df_melted)
+        plt.title("Distribución de Hits vs Misses por Política de Caché")
+        plt.xlabel("Política de Caché")
+        plt.ylabel("Cantidad")
+        plt.tight_layout()
+        plt.savefig("graficos/hits_misses_distribution.png")
+        print("✅ Gráfico de hits vs misses generado")
+
+        # 4. Crear tabla comparativa
+        print("\nTabla Comparativa de Resultados:")
+        comp_table = df[["distribution", "cache_policy", "hit_rate", "avg_latency", "hits", "misses"]]
+        comp_table["hit_rate"] = comp_table["hit_rate"].apply(lambda x: f"{x:.2%}")
+        comp_table["avg_latency"] = comp_table["avg_latency"].apply(lambda x: f"{x*1000:.2f} ms")
+        print(comp_table.to_string(index=False))
+
+        # Guardar la tabla como CSV para incluirla en el informe
+        comp_table.to_csv("results_comparison.csv", index=False)
+        print("✅ Tabla comparativa guardada como CSV")
+
+    print("\nAnálisis completo. Revisa los gráficos generados en la carpeta 'graficos'.")
+
+def build_filters(args):
+    """Traduce los filtros de la línea de comandos a una cláusula WHERE parametrizada."""
+    clauses, params = [], []
+    for column, values in (("distribution", args.distribution), ("cache_policy", args.policy),
+                           ("source", args.source)):
+        if values:
+            clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+    if args.since:
+        clauses.append("recorded_at >= ?")
+        params.append(args.since)
+    if args.sweep_id:
+        clauses.append("json_extract(metadata, '$.sweep_id') = ?")
+        params.append(args.sweep_id)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+def analyze_store(args):
+    """Modo almacén: consulta simulation_results.db con SQL sin recargar cada archivo."""
+    if args.import_json:
+        imported = results_store.import_json_files(path=args.db)
+        print(f"✅ {imported} resultados nuevos importados desde JSON")
+
+    conn = results_store.connect(args.db)
+    where, params = build_filters(args)
+    os.makedirs("graficos", exist_ok=True)
+
+    # 1. Curvas de hit ratio vs tamaño del caché (claves o bytes según la política)
+    curves = pd.read_sql_query(f"""
+        SELECT distribution, cache_policy,
+               CASE WHEN max_bytes IS NULL THEN 'claves' ELSE 'bytes' END AS unit,
+               COALESCE(max_bytes, cache_size) AS capacity,
+               COUNT(*) AS runs,
+               AVG(hit_rate) AS hit_rate,
+               AVG(byte_hit_rate) AS byte_hit_rate,
+               AVG(avg_latency) AS avg_latency
+        FROM runs {where}
+        GROUP BY distribution, cache_policy, unit, capacity
+        ORDER BY distribution, cache_policy, unit, capacity
+    """, conn, params=params)
+
+    if curves.empty:
+        print("❌ No hay corridas que coincidan con los filtros.")
+        conn.close()
+        return
+
+    print(f"\nResumen de {int(curves['runs'].sum())} corridas:")
+    print(curves.to_string(index=False))
+
+    for unit, data in curves.groupby("unit"):
+        plt.figure(figsize=(12, 6))
+        sns.lineplot(x="capacity", y="hit_rate", hue="cache_policy", style="distribution",
+                     marker="o", data=data)
+        plt.xscale("log")
+        plt.title(f"Hit Rate vs Tamaño del Caché ({unit})")
+        plt.xlabel(f"Capacidad ({unit})")
+        plt.ylabel("Hit Rate")
+        plt.tight_layout()
+        plt.savefig(f"graficos/hit_rate_vs_size_{unit}.png")
+        plt.close()
+        print(f"✅ Curva de hit rate vs tamaño ({unit}) generada")
+
+    # 2. CDF de latencia por política, promediando los cuantiles guardados de cada corrida
+    cdf = pd.read_sql_query(f"""
+        SELECT distribution, cache_policy, quantile, AVG(latency) AS latency
+        FROM latency_quantiles JOIN runs USING (run_id) {where}
+        GROUP BY distribution, cache_policy, quantile
+        ORDER BY distribution, cache_policy, quantile
+    """, conn, params=params)
+    conn.close()
+
+    if cdf.empty:
+        print("⚠️ Las corridas seleccionadas no tienen cuantiles de latencia (¿importadas desde JSON?)")
+    else:
+        cdf["latency_ms"] = cdf["latency"] * 1000
+        plt.figure(figsize=(12, 6))
+        sns.lineplot(x="latency_ms", y="quantile", hue="cache_policy", style="distribution",
+                     data=cdf, drawstyle="steps-post")
+        plt.xscale("log")
+        plt.title("CDF de Latencia por Política de Caché y Distribución")
+        plt.xlabel("Latencia (ms)")
+        plt.ylabel("Fracción de consultas")
+        plt.tight_layout()
+        plt.savefig("graficos/latency_cdf.png")
+        plt.close()
+        print("✅ CDF de latencia generada")
+
+    curves.to_csv("results_store_summary.csv", index=False)
+    print("\nAnálisis completo. Revisa los gráficos generados en la carpeta 'graficos'.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis de resultados de simulación de caché")
+    parser.add_argument("--store", action="store_true",
+                        help="consultar el almacén SQLite en lugar de los JSON sueltos")
+    parser.add_argument("--db", default=results_store.RESULTS_DB, help="ruta del almacén SQLite")
+    parser.add_argument("--import-json", action="store_true",
+                        help="importar al almacén los results_*.json nuevos o modificados")
+    parser.add_argument("--distribution", nargs="*", help="filtrar por distribución")
+    parser.add_argument("--policy", nargs="*", help="filtrar por política de caché")
+    parser.add_argument("--source", nargs="*", help="filtrar por origen (sequential, load, sweep, json)")
+    parser.add_argument("--since", help="solo corridas registradas desde esta fecha ISO")
+    parser.add_argument("--sweep-id", help="solo corridas de un barrido")
+    args = parser.parse_args()
+
+    if args.store:
+        analyze_store(args)
+    else:
+        analyze_json_files()
+
+if __name__ == "__main__":
+    main()
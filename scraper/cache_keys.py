@@ -0,0 +1,44 @@
+# Formato de las claves y valores que server.py guarda en Redis.
+# Lo comparten la API y el servicio de precarga para generar exactamente las mismas entradas.
+import os
+import json
+import datetime
+
+EVENT_TTL = 3600    # /api/event/<id>: 1 hora
+EVENTS_TTL = 300    # /api/events: 5 minutos
+
+# Filtros aceptados por /api/events, en el orden en que se arma la clave
+EVENT_FILTERS = ["type", "subtype", "country", "city"]
+
+# Popularidad registrada por la API (sorted sets de Redis, no se borran con /api/cache/clear)
+POPULAR_EVENTS_KEY = "popularity:event"
+POPULAR_QUERIES_KEY = "popularity:events"
+# Miembros que conserva cada sorted set: cuando un set pasa del doble, se recorta a los de mayor
+# puntaje y los puntajes se dividen a la mitad, para que filtros arbitrarios no lo hagan crecer sin
+# límite dentro del maxmemory de Redis. Entre recortes, una clave nueva tiene al menos
+# POPULARITY_MAX_MEMBERS accesos para acumular puntaje, y con la división las claves antiguas que
+# ya no se consultan terminan bajando. Debe ser bastante mayor que WARMUP_EVENTS / WARMUP_QUERIES.
+POPULARITY_MAX_MEMBERS = int(os.getenv("POPULARITY_MAX_MEMBERS", 10000))
+
+def event_key(event_id):
+    return f"event:{event_id}"
+
+def events_key(filters, page, limit):
+    return f"events:{json.dumps(filters)}:{page}:{limit}"
+
+def parse_events_key(key):
+    """Inversa de events_key: devuelve (filters, page, limit)."""
+    body, page, limit = key[len("events:"):].rsplit(":", 2)
+    return json.loads(body), int(page), int(limit)
+
+# Helper para transformar ObjectId y fechas a formato serializable
+def serialize_doc(doc):
+    if doc.get("_id"):
+        doc["_id"] = str(doc["_id"])
+
+    # Convertir fechas a formato ISO
+    for key, value in doc.items():
+        if isinstance(value, datetime.datetime):
+            doc[key] = value.isoformat()
+
+    return doc
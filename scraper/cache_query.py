@@ -1,48 +1,121 @@
-import redis
-import pymongo
 import random
 import time
 import os
 import json
-import numpy as np
+import heapq
+import threading
 from bson import ObjectId
 from datetime import datetime
 from collections import OrderedDict, Counter
 
+import results_store
+
 # Configuración
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
-DB_NAME = "waze_data"
+DB_NAME = os.getenv("DB_NAME", "waze_data")
 COLLECTION_NAME = "waze_events"
 TOTAL_QUERIES = 1000
 CACHE_SIZE = 200  # Tamaño máximo del caché
+# Presupuesto en bytes de las políticas por tamaño (igual al --maxmemory de Redis en docker-compose)
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 100 * 1024 * 1024))
 
 # Distribuciones de tráfico disponibles
 TRAFFIC_DISTRIBUTIONS = ["uniform", "zipf"]
 
 # Políticas de caché disponibles
-CACHE_POLICIES = ["simple", "lru", "lfu"]
+CACHE_POLICIES = ["simple", "lru", "lfu", "lru_bytes", "gdsf"]
+
+# Conexiones: se abren la primera vez que se usan, no al importar el módulo
+_clients = {}
+# Varios hilos (Flask multihilo, clientes de carga) pueden pedir el primer cliente a la vez
+_clients_lock = threading.Lock()
 
-# Conexiones
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-mongo_client = pymongo.MongoClient(MONGO_URI)
-db = mongo_client[DB_NAME]
-collection = db[COLLECTION_NAME]
+def get_redis():
+    with _clients_lock:
+        if "redis" not in _clients:
+            import redis
+            _clients["redis"] = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        return _clients["redis"]
 
-# Obtener 500 _id aleatorios de Mongo
-ids = [str(doc["_id"]) for doc in collection.aggregate([{ "$sample": { "size": 500 } }])]
-print(f"➡️ Obtenidos {len(ids)} IDs únicos para simulación\n")
+def get_collection():
+    with _clients_lock:
+        if "mongo" not in _clients:
+            import pymongo
+            _clients["mongo"] = pymongo.MongoClient(MONGO_URI)
+        return _clients["mongo"][DB_NAME][COLLECTION_NAME]
+
+# Obtener n _id aleatorios de Mongo
+def sample_ids(size=500, collection=None):
+    collection = collection if collection is not None else get_collection()
+    ids = [str(doc["_id"]) for doc in collection.aggregate([{ "$sample": { "size": size } }])]
+    print(f"➡️ Obtenidos {len(ids)} IDs únicos para simulación\n")
+    return ids
 
 # Función para distribución Zipf (favorece algunos IDs sobre otros)
-def zipf_distribution(ids, alpha=1.5):
+def zipf_distribution(ids, alpha=1.5, rng=None):
+    import numpy as np
+    rng = rng or np.random
     weights = np.array([1/(i+1)**alpha for i in range(len(ids))])
     weights = weights / weights.sum()
-    return lambda: np.random.choice(ids, p=weights)
+    return lambda: rng.choice(ids, p=weights)
 
 # Función para distribución uniforme
-def uniform_distribution(ids):
-    return lambda: random.choice(ids)
+def uniform_distribution(ids, rng=None):
+    rng = rng or random
+    return lambda: rng.choice(ids)
+
+# Backend en memoria con la misma interfaz mínima de Redis que usan las políticas.
+# Permite correr simulaciones aisladas (por ejemplo en paralelo) sin un servidor Redis.
+class MemoryBackend:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def _alive(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def get(self, key):
+        with self.lock:
+            return self.data.get(key) if self._alive(key) else None
+
+    def set(self, key, value, ex=None):
+        with self.lock:
+            self.data[key] = value
+            if ex:
+                self.expires[key] = time.time() + ex
+            else:
+                self.expires.pop(key, None)
+        return True
+
+    def delete(self, *keys):
+        with self.lock:
+            deleted = 0
+            for key in keys:
+                if self._alive(key):
+                    del self.data[key]
+                    self.expires.pop(key, None)
+                    deleted += 1
+            return deleted
+
+    def dbsize(self):
+        with self.lock:
+            return sum(1 for key in list(self.data) if self._alive(key))
+
+    def flushdb(self):
+        with self.lock:
+            self.data.clear()
+            self.expires.clear()
+        return True
+
+    flushall = flushdb
 
 # Clase base para políticas de caché
 class CachePolicy:
@@ -50,6 +123,8 @@ class CachePolicy:
         self.redis = redis_client
         self.max_size = max_size
         self.ttl = ttl
+        # Protege las estructuras de seguimiento cuando varios clientes comparten la política
+        self.lock = threading.Lock()
         
     def get(self, key):
         return self.redis.get(key)
@@ -79,21 +154,24 @@ class LRUCache(CachePolicy):
         value = super().get(key)
         if value:
             # Actualizar el uso (mover al final)
-            if key in self.usage_tracker:
-                del self.usage_tracker[key]
-            self.usage_tracker[key] = time.time()
+            with self.lock:
+                if key in self.usage_tracker:
+                    del self.usage_tracker[key]
+                self.usage_tracker[key] = time.time()
         return value
         
     def set(self, key, value):
         super().set(key, value)
-        self.usage_tracker[key] = time.time()
+        with self.lock:
+            self.usage_tracker[key] = time.time()
         
     def evict(self):
         # Eliminar el elemento menos recientemente usado
-        if self.usage_tracker:
-            oldest_key, _ = next(iter(self.usage_tracker.items()))
-            self.redis.delete(oldest_key)
-            del self.usage_tracker[oldest_key]
+        with self.lock:
+            if not self.usage_tracker:
+                return
+            oldest_key, _ = self.usage_tracker.popitem(last=False)
+        self.redis.delete(oldest_key)
 
 # Política LFU (Least Frequently Used)
 class LFUCache(CachePolicy):
@@ -104,50 +182,207 @@ class LFUCache(CachePolicy):
     def get(self, key):
         value = super().get(key)
         if value:
-            self.frequency[key] += 1
+            with self.lock:
+                self.frequency[key] += 1
         return value
         
     def set(self, key, value):
         super().set(key, value)
-        self.frequency[key] = 1
+        with self.lock:
+            self.frequency[key] = 1
         
     def evict(self):
         # Eliminar el elemento menos frecuentemente usado
-        if self.frequency:
+        with self.lock:
             least_common = self.frequency.most_common()[:-2:-1]
-            if least_common:
-                key_to_evict = least_common[0][0]
-                self.redis.delete(key_to_evict)
-                del self.frequency[key_to_evict]
+            if not least_common:
+                return
+            key_to_evict = least_common[0][0]
+            del self.frequency[key_to_evict]
+        self.redis.delete(key_to_evict)
+
+# Tamaño serializado de una entrada (clave + valor en UTF-8)
+def entry_size(key, value):
+    return len(key.encode("utf-8")) + len(value.encode("utf-8"))
+
+# Clase base para políticas que limitan el caché por bytes en vez de por número de claves
+class ByteBudgetCache(CachePolicy):
+    def __init__(self, redis_client, max_size=CACHE_SIZE, ttl=3600, max_bytes=CACHE_MAX_BYTES):
+        super().__init__(redis_client, max_size, ttl)
+        self.max_bytes = max_bytes
+        self.sizes = {}
+        self.used_bytes = 0
+
+    def get(self, key):
+        value = super().get(key)
+        with self.lock:
+            if value and key in self.sizes:
+                self.on_hit(key)
+                return value
+            if key in self.sizes:
+                # La clave expiró en Redis: liberar su espacio
+                self._forget(key)
+            elif value:
+                # En Redis pero ya expulsada por otro hilo: cuenta como miss y se borra
+                self.redis.delete(key)
+        return None
+
+    def set(self, key, value):
+        size = entry_size(key, value)
+        # Las escrituras en Redis se hacen con el lock tomado para que Redis y self.sizes no
+        # diverjan cuando varios hilos comparten la política (DirectTarget, server.py)
+        with self.lock:
+            if key in self.sizes:
+                self._forget(key)
+            if size > self.max_bytes:
+                # La entrada no cabe en el presupuesto completo: tampoco queda la versión anterior
+                self.redis.delete(key)
+                return
+            victims = []
+            while self.sizes and self.used_bytes + size > self.max_bytes:
+                victim = self.choose_victim()
+                self._forget(victim)
+                victims.append(victim)
+            self.sizes[key] = size
+            self.used_bytes += size
+            self.on_insert(key, size)
+            if victims:
+                self.redis.delete(*victims)
+            self.redis.set(key, value, ex=self.ttl)
+
+    def _forget(self, key):
+        self.used_bytes -= self.sizes.pop(key)
+        self.on_remove(key)
+
+    # Ganchos implementados por subclases (se llaman con self.lock tomado)
+    def on_hit(self, key):
+        pass
+
+    def on_insert(self, key, size):
+        pass
+
+    def on_remove(self, key):
+        pass
+
+    def choose_victim(self):
+        # Por defecto FIFO: la entrada más antigua (self.sizes conserva el orden de inserción)
+        return next(iter(self.sizes))
+
+# LRU con presupuesto en bytes
+class ByteLRUCache(ByteBudgetCache):
+    def __init__(self, redis_client, max_size=CACHE_SIZE, ttl=3600, max_bytes=CACHE_MAX_BYTES):
+        super().__init__(redis_client, max_size, ttl, max_bytes)
+        self.usage_tracker = OrderedDict()
+
+    def on_hit(self, key):
+        self.usage_tracker.move_to_end(key)
+
+    def on_insert(self, key, size):
+        self.usage_tracker[key] = size
+
+    def on_remove(self, key):
+        self.usage_tracker.pop(key, None)
+
+    def choose_victim(self):
+        return next(iter(self.usage_tracker))
+
+# GDSF (Greedy Dual Size Frequency): prioridad = L + frecuencia * costo / tamaño.
+# Favorece entradas pequeñas y populares; L sube con cada expulsión para envejecer las antiguas.
+class GDSFCache(ByteBudgetCache):
+    def __init__(self, redis_client, max_size=CACHE_SIZE, ttl=3600, max_bytes=CACHE_MAX_BYTES, cost=1.0):
+        super().__init__(redis_client, max_size, ttl, max_bytes)
+        self.cost = cost
+        self.inflation = 0.0
+        self.frequency = Counter()
+        self.priority = {}
+        self.heap = []  # (prioridad, clave); las entradas obsoletas se descartan al sacar
+
+    def _push(self, key):
+        priority = self.inflation + self.frequency[key] * self.cost / self.sizes[key]
+        self.priority[key] = priority
+        heapq.heappush(self.heap, (priority, key))
+        # Cada hit agrega una entrada: si casi no hay expulsiones, se reconstruye desde las vigentes
+        if len(self.heap) > 4 * len(self.priority):
+            self.heap = [(p, k) for k, p in self.priority.items()]
+            heapq.heapify(self.heap)
+
+    def on_hit(self, key):
+        self.frequency[key] += 1
+        self._push(key)
+
+    def on_insert(self, key, size):
+        self.frequency[key] += 1
+        self._push(key)
+
+    def on_remove(self, key):
+        self.priority.pop(key, None)
+        self.frequency.pop(key, None)
+
+    def choose_victim(self):
+        while self.heap:
+            priority, key = heapq.heappop(self.heap)
+            if self.priority.get(key) == priority:
+                self.inflation = priority
+                return key
+        return super().choose_victim()
+
+# Políticas disponibles por nombre
+POLICY_CLASSES = {
+    "simple": SimpleCache,
+    "lru": LRUCache,
+    "lfu": LFUCache,
+    "lru_bytes": ByteLRUCache,
+    "gdsf": GDSFCache,
+}
+
+def make_distribution(distribution_type, ids, seed=None):
+    if distribution_type == "uniform":
+        rng = random.Random(seed) if seed is not None else None
+        return uniform_distribution(ids, rng=rng)
+    if seed is not None:
+        import numpy as np
+        rng = np.random.default_rng(seed)
+    else:
+        rng = None
+    return zipf_distribution(ids, rng=rng)
+
+def is_byte_policy(cache_policy_type):
+    return issubclass(POLICY_CLASSES.get(cache_policy_type, LFUCache), ByteBudgetCache)
+
+def make_cache(cache_policy_type, redis_client, max_size=CACHE_SIZE, ttl=3600, max_bytes=CACHE_MAX_BYTES):
+    cache_class = POLICY_CLASSES.get(cache_policy_type, LFUCache)
+    if issubclass(cache_class, ByteBudgetCache):
+        return cache_class(redis_client, max_size=max_size, ttl=ttl, max_bytes=max_bytes)
+    return cache_class(redis_client, max_size=max_size, ttl=ttl)
 
 # Función para ejecutar una simulación con parámetros específicos
-def run_simulation(distribution_type, cache_policy_type):
+def run_simulation(distribution_type, cache_policy_type, ids, redis_client=None,
+                   mongo_collection=None, cache_size=CACHE_SIZE, ttl=3600, max_bytes=CACHE_MAX_BYTES,
+                   total_queries=TOTAL_QUERIES, seed=None, think_time=0.01,
+                   verbose=True, save_results=True, store_source="sequential", store_metadata=None):
+    redis_client = redis_client if redis_client is not None else get_redis()
+    mongo_collection = mongo_collection if mongo_collection is not None else get_collection()
+
     # Inicializar distribución
-    if distribution_type == "uniform":
-        next_query = uniform_distribution(ids)
-    else:  # zipf
-        next_query = zipf_distribution(ids)
+    next_query = make_distribution(distribution_type, ids, seed=seed)
     
     # Inicializar política de caché
-    if cache_policy_type == "simple":
-        cache = SimpleCache(r)
-    elif cache_policy_type == "lru":
-        cache = LRUCache(r)
-    else:  # lfu
-        cache = LFUCache(r)
+    cache = make_cache(cache_policy_type, redis_client, max_size=cache_size, ttl=ttl, max_bytes=max_bytes)
     
-    # Limpiar caché antes de empezar
-    r.flushall()
+    # Limpiar caché antes de empezar (solo la base de datos de esta simulación)
+    redis_client.flushdb()
     
     # Métricas
     hits = 0
     misses = 0
+    byte_hits = 0
+    bytes_requested = 0
     latencies = []
     
     print(f"🚀 Iniciando simulación con distribución {distribution_type} y política {cache_policy_type}")
     
     # Ejecutar consultas
-    for i in range(TOTAL_QUERIES):
+    for i in range(total_queries):
         eid = next_query()
         start_time = time.time()
         
@@ -157,62 +392,90 @@ def run_simulation(distribution_type, cache_policy_type):
         if cached:
             # Hit de caché
             hits += 1
-            print(f"[{i}] HIT ✅  -> {eid}")
+            size = entry_size(eid, cached)
+            byte_hits += size
+            bytes_requested += size
+            if verbose:
+                print(f"[{i}] HIT ✅  -> {eid}")
         else:
             # Miss de caché
             misses += 1
-            print(f"[{i}] MISS ❌ -> {eid}")
+            if verbose:
+                print(f"[{i}] MISS ❌ -> {eid}")
             
             # Obtener de MongoDB
-            event = collection.find_one({"_id": ObjectId(eid)})
+            event = mongo_collection.find_one({"_id": ObjectId(eid)})
             if event:
                 event["_id"] = str(event["_id"])
-                cache.set(eid, str(event))
+                value = str(event)
+                bytes_requested += entry_size(eid, value)
+                cache.set(eid, value)
         
         # Medir latencia
         latency = time.time() - start_time
         latencies.append(latency)
         
-        time.sleep(0.01)  # Simular tiempo entre consultas
+        if think_time:
+            time.sleep(think_time)  # Simular tiempo entre consultas
     
     # Calcular métricas finales
-    hit_rate = hits / TOTAL_QUERIES if TOTAL_QUERIES > 0 else 0
+    hit_rate = hits / total_queries if total_queries > 0 else 0
     avg_latency = sum(latencies) / len(latencies) if latencies else 0
+    byte_hit_rate = byte_hits / bytes_requested if bytes_requested > 0 else 0
     
     # Resultados
     results = {
         "distribution": distribution_type,
         "cache_policy": cache_policy_type,
-        "cache_size": CACHE_SIZE,
-        "total_queries": TOTAL_QUERIES,
+        "cache_size": cache_size,
+        "max_bytes": max_bytes if is_byte_policy(cache_policy_type) else None,
+        "ttl": ttl,
+        "seed": seed,
+        "total_queries": total_queries,
         "hits": hits,
         "misses": misses,
         "hit_rate": hit_rate,
+        "byte_hits": byte_hits,
+        "bytes_requested": bytes_requested,
+        "byte_hit_rate": byte_hit_rate,
         "avg_latency": avg_latency,
         "timestamp": datetime.now().isoformat()
     }
     
-    print(f"\n📊 Resultados:")
-    print(f"   Hit rate: {hit_rate:.2%}")
-    print(f"   Latencia promedio: {avg_latency*1000:.2f} ms\n")
+    if verbose:
+        print(f"\n📊 Resultados:")
+        print(f"   Hit rate: {hit_rate:.2%}")
+        print(f"   Byte hit rate: {byte_hit_rate:.2%}")
+        print(f"   Latencia promedio: {avg_latency*1000:.2f} ms\n")
     
     # Guardar resultados
-    with open(f"results_{distribution_type}_{cache_policy_type}.json", "w") as f:
-        json.dump(results, f, indent=2)
+    json_file = f"results_{distribution_type}_{cache_policy_type}.json" if save_results else None
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump(results, f, indent=2)
+    if store_source:
+        results_store.append_result(results, latencies, source=store_source, metadata=store_metadata,
+                                    json_file=json_file)
     
     return results
 
-# Ejecutar todas las combinaciones de simulaciones
-all_results = []
+def main():
+    ids = sample_ids()
+
+    # Ejecutar todas las combinaciones de simulaciones
+    all_results = []
+
+    for dist in TRAFFIC_DISTRIBUTIONS:
+        for policy in CACHE_POLICIES:
+            result = run_simulation(dist, policy, ids)
+            all_results.append(result)
+            time.sleep(1)  # Pausa entre simulaciones
 
-for dist in TRAFFIC_DISTRIBUTIONS:
-    for policy in CACHE_POLICIES:
-        result = run_simulation(dist, policy)
-        all_results.append(result)
-        time.sleep(1)  # Pausa entre simulaciones
+    # Guardar todos los resultados juntos
+    with open("all_simulation_results.json", "w") as f:
+        json.dump(all_results, f, indent=2)
 
-# Guardar todos los resultados juntos
-with open("all_simulation_results.json", "w") as f:
-    json.dump(all_results, f, indent=2)
+    print("✅ Todas las simulaciones completadas!")
 
-print("✅ Todas las simulaciones completadas!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
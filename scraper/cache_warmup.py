@@ -0,0 +1,128 @@
+import os
+import json
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from cache_keys import (
+    EVENT_TTL, EVENTS_TTL, POPULAR_EVENTS_KEY, POPULAR_QUERIES_KEY,
+    event_key, events_key, parse_events_key, serialize_doc,
+)
+
+# Configuración
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+DB_NAME = os.getenv("DB_NAME", "waze_data")
+COLLECTION_NAME = "waze_events"
+
+WARMUP_EVENTS = int(os.getenv("WARMUP_EVENTS", 2000))       # Claves event: a precargar
+WARMUP_QUERIES = int(os.getenv("WARMUP_QUERIES", 200))      # Claves events: a precargar
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", 200))
+DEFAULT_PAGE_LIMIT = 10  # limit por defecto de /api/events
+
+def popular_event_ids(r, collection, limit):
+    """IDs más consultados según la API; si no hay historial, eventos de las calles con más alertas."""
+    ids = r.zrevrange(POPULAR_EVENTS_KEY, 0, limit - 1)
+    if ids:
+        return ids, "access"
+
+    # Mismo ranking que calles_con_mas_alertas.csv, calculado en Mongo
+    top_streets = [row["_id"] for row in collection.aggregate([
+        {"$match": {"street": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$street", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": 50},
+    ], allowDiskUse=True)]
+    cursor = (collection.find({"street": {"$in": top_streets}}, {"_id": 1})
+              .sort("pubMillis", -1).limit(limit))
+    return [str(doc["_id"]) for doc in cursor], "rollup"
+
+def popular_event_queries(r, collection, limit):
+    """Claves events: más consultadas; si no hay historial, primera página por comuna y por tipo."""
+    keys = r.zrevrange(POPULAR_QUERIES_KEY, 0, limit - 1)
+    if keys:
+        return keys, "access"
+
+    # Mismo ranking que comunas_con_mas_alertas.csv y tipos_alerta_frecuencia.csv
+    keys = []
+    for field in ("city", "type"):
+        for row in collection.aggregate([
+            {"$match": {field: {"$nin": [None, ""]}}},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}},
+            {"$limit": limit},
+        ], allowDiskUse=True):
+            keys.append(events_key({field: row["_id"]}, 1, DEFAULT_PAGE_LIMIT))
+    return keys[:limit], "rollup"
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def warm_cache(r, collection, max_events=WARMUP_EVENTS, max_queries=WARMUP_QUERIES,
+               batch_size=WARMUP_BATCH_SIZE):
+    """Precarga en Redis las claves event: y events: más populares y devuelve un reporte.
+
+    Solo se escriben las claves que aún no están en caché; cada lote se lee de Mongo con
+    una sola consulta y se escribe con un pipeline de Redis.
+    """
+    start = time.time()
+    report = {"started_at": datetime.now().isoformat(), "batches": []}
+
+    ids, report["events_source"] = popular_event_ids(r, collection, max_events)
+    loaded_events = 0
+    for batch in _chunks(ids, batch_size):
+        batch_start = time.time()
+        present = r.exists(*[event_key(eid) for eid in batch])
+        object_ids = [ObjectId(eid) for eid in batch if ObjectId.is_valid(eid)]
+        pipe = r.pipeline(transaction=False)
+        for doc in collection.find({"_id": {"$in": object_ids}}):
+            serialized = serialize_doc(doc)
+            pipe.set(event_key(serialized["_id"]), json.dumps(serialized), ex=EVENT_TTL, nx=True)
+        written = sum(1 for ok in pipe.execute() if ok)
+        loaded_events += written
+        report["batches"].append({"kind": "event", "requested": len(batch), "already_cached": present,
+                                  "written": written, "seconds": time.time() - batch_start})
+        print(f"🔥 event: {loaded_events}/{len(ids)} precargados")
+
+    keys, report["queries_source"] = popular_event_queries(r, collection, max_queries)
+    loaded_queries = 0
+    for batch in _chunks(keys, batch_size):
+        batch_start = time.time()
+        pipe = r.pipeline(transaction=False)
+        for key in batch:
+            filters, page, limit = parse_events_key(key)
+            cursor = collection.find(filters).skip((page - 1) * limit).limit(limit)
+            events = [serialize_doc(doc) for doc in cursor]
+            pipe.set(key, json.dumps(events), ex=EVENTS_TTL, nx=True)
+        written = sum(1 for ok in pipe.execute() if ok)
+        loaded_queries += written
+        report["batches"].append({"kind": "events", "requested": len(batch),
+                                  "written": written, "seconds": time.time() - batch_start})
+        print(f"🔥 events: {loaded_queries}/{len(keys)} precargados")
+
+    elapsed = time.time() - start
+    report.update({
+        "event_keys_loaded": loaded_events,
+        "events_keys_loaded": loaded_queries,
+        "elapsed": elapsed,
+        "keys_per_second": (loaded_events + loaded_queries) / elapsed if elapsed > 0 else 0,
+        "finished_at": datetime.now().isoformat(),
+    })
+    print(f"✅ Precarga completada: {loaded_events} event: y {loaded_queries} events: en {elapsed:.2f} s")
+    return report
+
+def main():
+    import pymongo
+    import redis
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+    collection = pymongo.MongoClient(MONGO_URI)[DB_NAME][COLLECTION_NAME]
+    report = warm_cache(r, collection)
+    with open("warmup_report.json", "w") as f:
+        json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+# scraper/e2e_benchmark.py
+"""Benchmark de punta a punta sin depender de Waze: recolección → MongoDB → API con caché → análisis.
+
+Para cada tamaño de BENCH_EVENTS levanta waze_stub.py con esa cantidad de eventos, corre
+scraper.py contra él sobre una base propia (BENCH_DB_NAME, que se vacía antes), carga
+server.py con simulate_cache_stress.py (LOAD_TARGET=api) y ejecuta pipeline.py sobre lo
+recolectado. El resultado queda en un JSON con la versión del código; con BENCH_BASELINE se
+compara contra uno anterior y el proceso termina con código 1 si alguna métrica empeora más
+que BENCH_TOLERANCE.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import subprocess
+import urllib.request
+from datetime import datetime
+
+import pymongo
+
+from scraper import REGION_LIMITS
+from waze_stub import WazeStub, SEED, STUB_JAM_SHARE
+
+SCHEMA_VERSION = 1
+SCALES = [int(n) for n in os.getenv("BENCH_EVENTS", "1000,10000").split(",") if n.strip()]
+PHASES = os.getenv("BENCH_PHASES", "ingest,api,pipeline").split(",")
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
+REDIS_HOST = os.getenv("REDIS_HOST", "redis")
+# Base lógica de Redis exclusiva del benchmark: /api/cache/clear y las claves events: no tocan las de producción
+BENCH_REDIS_DB = int(os.getenv("BENCH_REDIS_DB", 15))
+# Base exclusiva del benchmark: se borra al comienzo de cada tamaño
+BENCH_DB_NAME = os.getenv("BENCH_DB_NAME", "waze_e2e_benchmark")
+BENCH_DIR = os.path.abspath(os.getenv("BENCH_DIR", "e2e_benchmark"))
+# Vacío: se levanta un server.py local con las bases del benchmark (una API externa debe usar su propio REDIS_DB)
+BENCH_API_URL = os.getenv("BENCH_API_URL", "")
+LOCAL_API_URL = "http://127.0.0.1:5000"
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_DIR = os.path.abspath(os.getenv("BENCH_PIPELINE_DIR", os.path.join(SCRIPT_DIR, "..", "analisis-trafico")))
+BENCH_BASELINE = os.getenv("BENCH_BASELINE", "")
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", 0.10))
+# Variables de la carga que se registran en el resultado (definen qué resultados son comparables)
+LOAD_SETTINGS = ["NUM_CLIENTS", "ARRIVAL_RATE", "LOAD_QUERIES", "MOTOR_ANALISIS", "FORMATO_INTERMEDIO"]
+
+# Métricas comparadas entre versiones y si conviene que suban o que bajen
+HIGHER_IS_BETTER = {"events_per_second", "throughput", "hit_rate"}
+LOWER_IS_BETTER = {"seconds", "fetch_seconds", "save_seconds", "staging_seconds",
+                   "p50_latency", "p95_latency", "p99_latency"}
+
+def code_version():
+    if os.getenv("BENCH_VERSION"):
+        return os.getenv("BENCH_VERSION")
+    proc = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=SCRIPT_DIR,
+                          capture_output=True, text=True)
+    return proc.stdout.strip() if proc.returncode == 0 else "unknown"
+
+def run_logged(command, cwd, env, log_name):
+    """Corre el comando con su salida en BENCH_DIR/log_name y devuelve los segundos que tomó."""
+    start = time.perf_counter()
+    with open(os.path.join(BENCH_DIR, log_name), "w") as log:
+        proc = subprocess.run(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} terminó con código {proc.returncode} (ver {log_name})")
+    return elapsed
+
+def span_seconds(report, name):
+    spans = report["metrics"].get("span_duration_seconds", {})
+    return sum(stats["sum"] for label, stats in spans.items() if f'span="{name}"' in label)
+
+def ingest(db, events):
+    """Recolecta la región completa desde el stub y mide eventos guardados por segundo."""
+    db.client.drop_database(BENCH_DB_NAME)
+    stub = WazeStub(0, REGION_LIMITS, events=events, seed=SEED).start()
+    report_path = os.path.join(BENCH_DIR, f"metrics_scraper_{events}.json")
+    env = dict(os.environ, WAZE_API_URL=stub.url, MONGO_URI=MONGO_URI, DB_NAME=BENCH_DB_NAME,
+               METRICS_REPORT=report_path)
+    try:
+        seconds = run_logged([sys.executable, "scraper.py"], SCRIPT_DIR, env, f"scraper_{events}.log")
+    finally:
+        stub.stop()
+    with open(report_path) as f:
+        report = json.load(f)
+    stored = db["waze_events"].estimated_document_count()
+    return {
+        "seconds": seconds,
+        "events": report["total_events"],
+        "stored": stored,
+        "events_per_second": stored / seconds if seconds > 0 else 0,
+        "fetch_seconds": span_seconds(report, "waze_fetch"),
+        "save_seconds": span_seconds(report, "mongo_save"),
+        "stub_requests": stub.requests,
+        "stub_megabytes": stub.bytes_sent / 1e6,
+    }
+
+def wait_for_api(url, timeout=30):
+    start = time.time()
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url}/metrics", timeout=2):
+                return
+        except OSError:
+            if time.time() - start > timeout:
+                raise RuntimeError(f"La API no respondió en {url}")
+            time.sleep(0.5)
+
+def api_load(db, events):
+    """Carga server.py con el perfil de simulate_cache_stress.py y resume cada distribución."""
+    if not db["waze_events"].estimated_document_count():
+        raise RuntimeError("La base del benchmark está vacía: la fase api necesita la fase ingest")
+    api_url = BENCH_API_URL or LOCAL_API_URL
+    server = None
+    if not BENCH_API_URL:
+        env = dict(os.environ, MONGO_URI=MONGO_URI, REDIS_HOST=REDIS_HOST, REDIS_DB=str(BENCH_REDIS_DB),
+                   DB_NAME=BENCH_DB_NAME)
+        log = open(os.path.join(BENCH_DIR, f"server_{events}.log"), "w")
+        server = subprocess.Popen([sys.executable, "server.py"], cwd=SCRIPT_DIR, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_for_api(api_url)
+        work_dir = os.path.join(BENCH_DIR, f"load_{events}")
+        os.makedirs(work_dir, exist_ok=True)
+        env = dict(os.environ, LOAD_TARGET="api", API_URL=api_url, MONGO_URI=MONGO_URI, REDIS_HOST=REDIS_HOST,
+                   REDIS_DB=str(BENCH_REDIS_DB), DB_NAME=BENCH_DB_NAME, SEED=str(SEED), RESULTS_DB=os.path.join(work_dir, "simulation_results.db"))
+        seconds = run_logged([sys.executable, os.path.join(SCRIPT_DIR, "simulate_cache_stress.py")],
+                             work_dir, env, f"load_{events}.log")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            log.close()
+    with open(os.path.join(work_dir, "all_load_results.json")) as f:
+        results = json.load(f)
+    keys = ["throughput", "hit_rate", "errors", "p50_latency", "p95_latency", "p99_latency"]
+    return {"seconds": seconds, **{r["distribution"]: {key: r[key] for key in keys} for r in results}}
+
+def stage_collections(db):
+    """Separa waze_events en las colecciones alertas/atascos con el esquema que lee exportar_mongo.py."""
+    events = db["waze_events"]
+    events.aggregate([{"$match": {"type": {"$ne": "Jam"}}},
+                      {"$addFields": {"fecha": "$dateTime"}},
+                      {"$out": "alertas"}])
+    events.aggregate([{"$match": {"type": "Jam"}},
+                      # Ni Waze ni el stub traen region, y el filtrado descarta los atascos sin ella
+                      {"$addFields": {"fecha": "$dateTime", "severity": "$level",
+                                      "region": {"$ifNull": ["$region", "$country"]}}},
+                      {"$out": "atascos"}])
+
+def filtered_jam_rows(results_dir):
+    """Filas de atascos_por_ciudad.csv de la última ejecución: todos los motores lo escriben desde los atascos filtrados."""
+    runs = sorted(glob.glob(os.path.join(results_dir, "ejecucion_*", "atascos_por_ciudad.csv")))
+    if not runs:
+        return 0
+    with open(runs[-1]) as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+def pipeline(db, events):
+    """Tiempo total y por paso de pipeline.py sobre los eventos recolectados."""
+    start = time.perf_counter()
+    stage_collections(db)
+    staging = time.perf_counter() - start
+    results_dir = os.path.join(BENCH_DIR, f"results_{events}")
+    env = dict(os.environ, MONGODB_URI=MONGO_URI, MONGODB_DB=BENCH_DB_NAME, PIPELINE_FORZAR="1",
+               DIRECTORIO_DATOS=os.path.join(BENCH_DIR, f"data_{events}"), DIRECTORIO_RESULTADOS=results_dir)
+    for directory in (env["DIRECTORIO_DATOS"], results_dir):
+        os.makedirs(directory, exist_ok=True)
+    seconds = run_logged([sys.executable, "pipeline.py"], PIPELINE_DIR, env, f"pipeline_{events}.log")
+    with open(os.path.join(results_dir, "reporte_pipeline.json")) as f:
+        report = json.load(f)
+    if not filtered_jam_rows(results_dir):
+        raise RuntimeError(f"El filtrado no dejó atascos (ver pipeline_{events}.log): los tiempos no medirían esa rama")
+    return {"staging_seconds": staging, "seconds": seconds,
+            "steps": {name: {"seconds": step["segundos"]} for name, step in report["pasos"].items()}}
+
+PHASE_RUNNERS = {"ingest": ingest, "api": api_load, "pipeline": pipeline}
+
+def flatten(result):
+    """{"1000/ingest/events_per_second": valor, ...} con las métricas comparables del resultado."""
+    values = {}
+
+    def walk(prefix, node):
+        for key, value in node.items():
+            if isinstance(value, dict):
+                walk(f"{prefix}/{key}", value)
+            elif key in HIGHER_IS_BETTER or key in LOWER_IS_BETTER:
+                values[f"{prefix}/{key}"] = value
+
+    for scale in result["scales"]:
+        walk(str(scale["events"]), {phase: scale[phase] for phase in PHASES if phase in scale})
+    return values
+
+def compare(result, baseline):
+    """Imprime la variación de cada métrica y devuelve las que empeoraron más que la tolerancia."""
+    if baseline.get("config") != result["config"]:
+        print("⚠️ La configuración del resultado base es distinta; la comparación es solo orientativa")
+    current, previous = flatten(result), flatten(baseline)
+    regressions = []
+    print(f"\n📊 Comparación con {baseline['version']} (tolerancia {BENCH_TOLERANCE:.0%}):")
+    for key in sorted(current.keys() & previous.keys()):
+        before, after = previous[key], current[key]
+        if not before:
+            continue
+        change = (after - before) / before
+        worse = -change if key.rsplit("/", 1)[1] in HIGHER_IS_BETTER else change
+        status = "❌" if worse > BENCH_TOLERANCE else "✅"
+        if worse > BENCH_TOLERANCE:
+            regressions.append(key)
+        print(f"   {status} {key}: {before:.4g} → {after:.4g} ({change:+.1%})")
+    return regressions
+
+def main():
+    if BENCH_DB_NAME == os.getenv("DB_NAME", "waze_data"):
+        sys.exit("❌ BENCH_DB_NAME no puede ser la base de producción: el benchmark la vacía")
+    if BENCH_REDIS_DB == int(os.getenv("REDIS_DB", 0)) or BENCH_REDIS_DB == 0:
+        sys.exit("❌ BENCH_REDIS_DB no puede ser la base de Redis de producción: el benchmark limpia su caché")
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    db = pymongo.MongoClient(MONGO_URI)[BENCH_DB_NAME]
+    version = code_version()
+    result = {
+        "schema_version": SCHEMA_VERSION,
+        "version": version,
+        "date": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "config": {"seed": SEED, "jam_share": STUB_JAM_SHARE, "phases": PHASES,
+                   **{name: os.getenv(name) for name in LOAD_SETTINGS}},
+        "scales": [],
+    }
+
+    for events in SCALES:
+        print(f"🛰️ {events} eventos sintéticos (semilla {SEED})")
+        scale = {"events": events}
+        for phase in PHASES:
+            scale[phase] = PHASE_RUNNERS[phase](db, events)
+            print(f"   {phase}: {scale[phase]['seconds']:.2f} s")
+        if "ingest" in scale:
+            print(f"   ingesta: {scale['ingest']['events_per_second']:.0f} eventos/s")
+        result["scales"].append(scale)
+
+    output = os.path.join(BENCH_DIR, f"e2e_{version}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Resultados guardados en {output}")
+
+    if BENCH_BASELINE:
+        with open(BENCH_BASELINE) as f:
+            regressions = compare(result, json.load(f))
+        if regressions:
+            print(f"❌ Regresiones: {', '.join(regressions)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,119 +1,240 @@
 import csv
 import os
+import gzip
 import json
+import time
+from itertools import islice
+from bson import ObjectId
 from pymongo import MongoClient
-from datetime import datetime
 
 # Conexión a MongoDB
 mongo_uri = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 db_name = os.getenv("DB_NAME", "waze_data")
 collection_name = os.getenv("COLLECTION_NAME", "waze_events")
 
-# Ruta de salida
-output_path = "/export/waze_incidents.csv"
+# Salida: formato (csv o parquet), gzip para CSV y partición opcional por "date", "type" o "date,type"
+output_dir = os.getenv("EXPORT_DIR", "/export")
+output_name = os.getenv("EXPORT_NAME", "waze_incidents")
+output_format = os.getenv("EXPORT_FORMAT", "csv")
+use_gzip = os.getenv("EXPORT_GZIP", "0") == "1"
+partition_by = [p for p in os.getenv("EXPORT_PARTITION", "").split(",") if p]
+# Documentos por lote leído del cursor y filas por archivo. Con 0 (por defecto) se escribe un solo
+# archivo, /export/waze_incidents.csv; con N > 0 se escriben partes <nombre>_partNNNNN de N filas
+# y cada parte completa es un punto de reanudación
+batch_size = int(os.getenv("EXPORT_BATCH_SIZE", 5000))
+chunk_rows = int(os.getenv("EXPORT_CHUNK_ROWS", 0))
+resume = os.getenv("EXPORT_RESUME", "1") == "1"
+checkpoint_path = os.path.join(output_dir, f"{output_name}_checkpoint.json")
 
-print(f"[INFO] Conectando a MongoDB: {mongo_uri}")
-print(f"[INFO] Base de datos: {db_name}")
-print(f"[INFO] Colección: {collection_name}")
+# Columnas exportadas y su expresión en el $project (adaptadas a la estructura de Waze).
+# Las coordenadas vienen en location.{x,y} o sueltas en latitude/longitude/x/y.
+LOCATION_IS_OBJECT = {"$eq": [{"$type": "$location"}, "object"]}
+SCHEMA = [
+    ("_id", {"$toString": "$_id"}),
+    ("type", "$type"),
+    ("subtype", "$subtype"),
+    ("uuid", "$uuid"),
+    ("pubMillis", "$pubMillis"),
+    ("dateTime", "$dateTime"),
+    ("country", "$country"),
+    ("state", "$state"),
+    ("city", "$city"),
+    ("street", "$street"),
+    ("magvar", "$magvar"),
+    ("reliability", "$reliability"),
+    ("reportDescription", "$reportDescription"),
+    ("reportRating", "$reportRating"),
+    ("confidence", "$confidence"),
+    ("nComments", "$nComments"),
+    ("latitude", {"$cond": [LOCATION_IS_OBJECT, "$location.y", {"$ifNull": ["$latitude", "$y"]}]}),
+    ("longitude", {"$cond": [LOCATION_IS_OBJECT, "$location.x", {"$ifNull": ["$longitude", "$x"]}]}),
+    ("x", {"$cond": [LOCATION_IS_OBJECT, "$location.x", "$x"]}),
+    ("y", {"$cond": [LOCATION_IS_OBJECT, "$location.y", "$y"]}),
+]
+FIELDS = [column for column, _ in SCHEMA]
+NUMERIC = {"pubMillis", "magvar", "reliability", "reportRating", "confidence", "nComments",
+           "latitude", "longitude", "x", "y"}
+
+def build_projection(typed):
+    """$project del esquema; para Parquet el servidor ya entrega cada columna con su tipo (o nulo)."""
+    projection = {"_oid": "$_id"}
+    for column, expression in SCHEMA:
+        if typed and column != "_id":
+            target = "double" if column in NUMERIC else "string"
+            expression = {"$convert": {"input": expression, "to": target, "onError": None, "onNull": None}}
+        projection[column] = expression
+    return projection
+
+def partition_key(doc):
+    values = []
+    for part in partition_by:
+        if part == "date":
+            values.append(f"date={(doc.get('dateTime') or '')[:10] or 'unknown'}")
+        else:
+            values.append(f"{part}={doc.get(part) or 'unknown'}")
+    return tuple(values)
+
+class CsvWriter:
+    def __init__(self, path):
+        self.file = gzip.open(path, "wt", newline="", encoding="utf-8") if use_gzip \
+            else open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(FIELDS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+class ParquetWriter:
+    """Cada lote es un row group; los tipos ya vienen convertidos desde el $project."""
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.schema = pa.schema([(c, pa.float64() if c in NUMERIC else pa.string()) for c in FIELDS])
+        self.writer = pq.ParquetWriter(path, self.schema, compression=os.getenv("EXPORT_COMPRESSION", "zstd"))
+
+    def write(self, rows):
+        arrays = [self.pa.array(values, type=field.type) for values, field in zip(zip(*rows), self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def extension():
+    if output_format == "parquet":
+        return "parquet"
+    return "csv.gz" if use_gzip else "csv"
+
+def chunk_path(key, part):
+    if key:
+        return os.path.join(output_dir, output_name, *key, f"part{part:05d}.{extension()}")
+    if not chunk_rows:
+        return os.path.join(output_dir, f"{output_name}.{extension()}")
+    return os.path.join(output_dir, f"{output_name}_part{part:05d}.{extension()}")
+
+def settings():
+    return {"format": output_format, "gzip": use_gzip, "partition": partition_by, "chunk_rows": chunk_rows}
+
+def load_checkpoint():
+    if not (resume and os.path.exists(checkpoint_path)):
+        return None
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("settings") != settings():
+        print("[WARNING] El checkpoint es de otra configuración de salida; se exporta desde el inicio")
+        return None
+    if checkpoint.get("completed"):
+        return None
+    return checkpoint
+
+def save_checkpoint(checkpoint):
+    temporary = checkpoint_path + ".tmp"
+    with open(temporary, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temporary, checkpoint_path)
+
+def export_chunk(cursor, part):
+    """Escribe hasta chunk_rows filas (todas si es 0) en archivos temporales y los publica al terminar.
+
+    Devuelve (filas escritas, último _id, archivos); si el proceso se corta a mitad, la
+    reanudación vuelve a escribir el mismo número de parte desde el último checkpoint.
+    """
+    writers, paths = {}, {}
+    written, last_id = 0, None
+    started = time.time()
+    while not chunk_rows or written < chunk_rows:
+        batch = list(islice(cursor, min(batch_size, chunk_rows - written) if chunk_rows else batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]["_oid"]
+        groups = {}
+        if partition_by:
+            for doc in batch:
+                groups.setdefault(partition_key(doc), []).append(doc)
+        else:
+            groups[()] = batch
+        for key, docs in groups.items():
+            if key not in writers:
+                paths[key] = chunk_path(key, part)
+                os.makedirs(os.path.dirname(paths[key]), exist_ok=True)
+                writers[key] = (ParquetWriter if output_format == "parquet" else CsvWriter)(paths[key] + ".tmp")
+            writers[key].write([tuple(map(doc.get, FIELDS)) for doc in docs])
+        written += len(batch)
+        elapsed = time.time() - started
+        print(f"[INFO] Parte {part}: {written} registros ({written / max(elapsed, 1e-9):.0f} reg/s)")
+
+    for key, writer in writers.items():
+        writer.close()
+        os.replace(paths[key] + ".tmp", paths[key])
+    return written, last_id, list(paths.values())
+
+def main():
+    print(f"[INFO] Conectando a MongoDB: {mongo_uri}")
+    print(f"[INFO] Base de datos: {db_name}")
+    print(f"[INFO] Colección: {collection_name}")
 
-try:
     client = MongoClient(mongo_uri)
-    db = client[db_name]
-    collection = db[collection_name]
-    
-    # Verificar conexión
-    client.admin.command('ping')
-    print("[✓] Conexión a MongoDB exitosa")
-    
-    # Contar documentos
-    total_docs = collection.count_documents({})
-    print(f"[INFO] Total de documentos en la colección: {total_docs}")
-    
-    if total_docs == 0:
-        print("[WARNING] No hay documentos para exportar")
-        exit(0)
-    
-    # Campos que vamos a exportar (adaptados a la estructura de Waze)
-    fields = [
-        "_id", "type", "subtype", "uuid", "pubMillis", "dateTime",
-        "country", "state", "city", "street", "magvar", "reliability",
-        "reportDescription", "reportRating", "confidence", "nComments",
-        "latitude", "longitude", "x", "y"
-    ]
-    
-    print(f"[INFO] Exportando a: {output_path}")
-    
-    # Crear directorio si no existe
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    
-    # Extraer y escribir datos
-    with open(output_path, mode="w", newline='', encoding="utf-8") as csv_file:
-        writer = csv.DictWriter(csv_file, fieldnames=fields)
-        writer.writeheader()
-        
-        documents = collection.find({})
-        exported_count = 0
-        
-        for doc in documents:
-            # Preparar el documento para CSV
-            row = {}
-            
-            # Convertir ObjectId a string
-            row["_id"] = str(doc.get("_id", ""))
-            
-            # Campos básicos
-            row["type"] = doc.get("type", "")
-            row["subtype"] = doc.get("subtype", "")
-            row["uuid"] = doc.get("uuid", "")
-            row["pubMillis"] = doc.get("pubMillis", "")
-            row["dateTime"] = doc.get("dateTime", "")
-            
-            # Ubicación
-            row["country"] = doc.get("country", "")
-            row["state"] = doc.get("state", "")
-            row["city"] = doc.get("city", "")
-            row["street"] = doc.get("street", "")
-            
-            # Coordenadas - pueden estar en diferentes formatos
-            location = doc.get("location", {})
-            if isinstance(location, dict):
-                row["latitude"] = location.get("y", "")
-                row["longitude"] = location.get("x", "")
-                row["x"] = location.get("x", "")
-                row["y"] = location.get("y", "")
-            else:
-                row["latitude"] = doc.get("latitude", "") or doc.get("y", "")
-                row["longitude"] = doc.get("longitude", "") or doc.get("x", "")
-                row["x"] = doc.get("x", "")
-                row["y"] = doc.get("y", "")
-            
-            # Otros campos
-            row["magvar"] = doc.get("magvar", "")
-            row["reliability"] = doc.get("reliability", "")
-            row["reportDescription"] = doc.get("reportDescription", "")
-            row["reportRating"] = doc.get("reportRating", "")
-            row["confidence"] = doc.get("confidence", "")
-            row["nComments"] = doc.get("nComments", "")
-            
-            writer.writerow(row)
-            exported_count += 1
-            
-            if exported_count % 1000 == 0:
-                print(f"[INFO] Exportados {exported_count} registros...")
-    
-    print(f"[✓] Exportación completada: {exported_count} registros exportados a {output_path}")
-    
-    # Verificar el archivo creado
-    if os.path.exists(output_path):
-        file_size = os.path.getsize(output_path)
-        print(f"[INFO] Tamaño del archivo: {file_size/1024:.2f} KB")
-    
-except Exception as e:
-    print(f"[ERROR] Error durante la exportación: {e}")
-    import traceback
-    traceback.print_exc()
-finally:
     try:
+        collection = client[db_name][collection_name]
+
+        # Verificar conexión
+        client.admin.command('ping')
+        print("[✓] Conexión a MongoDB exitosa")
+
+        total_docs = collection.estimated_document_count()
+        print(f"[INFO] Total de documentos en la colección (estimado): {total_docs}")
+        if total_docs == 0:
+            print("[WARNING] No hay documentos para exportar")
+            return
+
+        checkpoint = load_checkpoint() or {"settings": settings(), "last_id": None, "part": 0,
+                                           "exported": 0, "files": []}
+        if checkpoint["last_id"]:
+            print(f"[INFO] Reanudando desde la parte {checkpoint['part']} "
+                  f"({checkpoint['exported']} registros ya exportados)")
+
+        match = {"_id": {"$gt": ObjectId(checkpoint["last_id"])}} if checkpoint["last_id"] else {}
+        cursor = collection.aggregate([
+            {"$match": match},
+            {"$sort": {"_id": 1}},
+            {"$project": build_projection(output_format == "parquet")},
+        ], allowDiskUse=True, batchSize=batch_size)
+
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"[INFO] Exportando a: {output_dir} ({extension()}"
+              f"{', partición ' + ','.join(partition_by) if partition_by else ''})")
+        if resume and not chunk_rows:
+            print("[WARNING] Sin EXPORT_CHUNK_ROWS se escribe un solo archivo y el checkpoint se guarda al "
+                  "terminar: si la exportación falla, se reanuda desde cero")
+        started = time.time()
+        exported = 0
+        while True:
+            written, last_id, files = export_chunk(cursor, checkpoint["part"])
+            if not written:
+                break
+            exported += written
+            checkpoint.update(last_id=str(last_id), part=checkpoint["part"] + 1,
+                              exported=checkpoint["exported"] + written, files=checkpoint["files"] + files)
+            save_checkpoint(checkpoint)
+
+        elapsed = time.time() - started
+        print(f"[✓] Exportación completada: {exported} registros en {elapsed:.1f} s "
+              f"({exported / max(elapsed, 1e-9):.0f} reg/s), {checkpoint['exported']} en total")
+        size = sum(os.path.getsize(path) for path in checkpoint["files"] if os.path.exists(path))
+        print(f"[INFO] {len(checkpoint['files'])} archivos, {size / 1024:.2f} KB")
+        checkpoint["completed"] = True
+        save_checkpoint(checkpoint)
+    finally:
         client.close()
-    except:
-        pass
\ No newline at end of file
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        print(f"[ERROR] Error durante la exportación: {e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,60 @@
+# scraper/geometry.py
+"""Codificación compacta de las líneas de los atascos (formato polyline de Google, precisión 1e-5)."""
+
+PRECISION = 1e5
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+def encode_polyline(points):
+    """[{"x": lon, "y": lat}, ...] -> texto; cada punto guarda solo la diferencia con el anterior."""
+    encoded = []
+    prev_lat = prev_lon = 0
+    for point in points:
+        lat = int(round(point["y"] * PRECISION))
+        lon = int(round(point["x"] * PRECISION))
+        encoded.append(_encode_value(lat - prev_lat))
+        encoded.append(_encode_value(lon - prev_lon))
+        prev_lat, prev_lon = lat, lon
+    return "".join(encoded)
+
+def decode_polyline(text):
+    """Inverso de encode_polyline: lista de {"x": lon, "y": lat}."""
+    points = []
+    index = lat = lon = 0
+    values = []
+    while index < len(text):
+        result = shift = 0
+        while True:
+            byte = ord(text[index]) - 63
+            index += 1
+            result |= (byte & 0x1f) << shift
+            shift += 5
+            if byte < 0x20:
+                break
+        values.append(~(result >> 1) if result & 1 else result >> 1)
+        if len(values) == 2:
+            lat += values[0]
+            lon += values[1]
+            points.append({"x": lon / PRECISION, "y": lat / PRECISION})
+            values = []
+    return points
+
+def compact_line(points):
+    """Campos que reemplazan a `line` en el documento: polilínea, cantidad de puntos y caja envolvente."""
+    points = [p for p in points or [] if isinstance(p, dict) and "x" in p and "y" in p]
+    if not points:
+        return {}
+    xs = [p["x"] for p in points]
+    ys = [p["y"] for p in points]
+    return {
+        "polyline": encode_polyline(points),
+        "linePoints": len(points),
+        "bbox": [min(xs), min(ys), max(xs), max(ys)],
+    }
@@ -0,0 +1,153 @@
+# scraper/metrics.py
+"""Contadores, histogramas y spans en memoria, exportables en formato Prometheus o como JSON.
+
+Cada observación es una suma bajo un lock (sin asignar objetos nuevos si la combinación de
+etiquetas ya existe), así que se puede dejar activo en producción.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Límites de los buckets de latencia en segundos (de 1 ms a 10 s)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Se puede apagar por completo con METRICS_ENABLED=0
+ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+_lock = threading.Lock()
+_metrics = {}
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in self.values.items()]
+
+    def snapshot(self):
+        return {_format_labels(key) or "total": value for key, value in self.values.items()}
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # etiquetas -> [conteo por bucket (el último es +Inf), suma, conteo]
+        self.values = {}
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def quantile(self, key, q):
+        """Cota superior del cuantil q según los buckets; None si cae sobre el último límite."""
+        counts, _, count = self.values[key]
+        target, cumulative = q * count, 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return None
+
+    def snapshot(self):
+        return {_format_labels(key) or "total": {
+            "count": count,
+            "sum": total,
+            "avg": total / count if count else None,
+            "p50": self.quantile(key, 0.5),
+            "p95": self.quantile(key, 0.95),
+            "p99": self.quantile(key, 0.99),
+        } for key, (_, total, count) in self.values.items()}
+
+def _register(cls, name, documentation, *args):
+    with _lock:
+        metric = _metrics.get(name)
+        if metric is None:
+            metric = _metrics[name] = cls(name, documentation, *args)
+        return metric
+
+def counter(name, documentation=""):
+    return _register(Counter, name, documentation)
+
+def histogram(name, documentation="", buckets=LATENCY_BUCKETS):
+    return _register(Histogram, name, documentation, buckets)
+
+SPANS = histogram("span_duration_seconds", "Duración de cada tramo instrumentado")
+
+@contextmanager
+def span(name, **labels):
+    """Mide la duración del bloque en span_duration_seconds{span=name, ...}, también si falla."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        SPANS.observe(time.perf_counter() - start, span=name, **labels)
+
+def render_prometheus():
+    """Texto para el endpoint /metrics (formato de exposición 0.0.4 de Prometheus)."""
+    lines = []
+    with _lock:
+        for metric in _metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    with _lock:
+        return {name: metric.snapshot() for name, metric in _metrics.items()}
+
+def write_report(path, **extra):
+    """Reporte JSON para procesos batch (sin servidor que Prometheus pueda consultar)."""
+    report = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **extra, "metrics": snapshot()}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return report
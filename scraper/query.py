@@ -1,34 +1,133 @@
 import pymongo
-import pandas as pd  # Para visualizar los datos en forma de tabla
 import os
+import argparse
+from bson import ObjectId
 
 # Configuración de MongoDB
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 DB_NAME = os.getenv("DB_NAME", "waze_data")
 COLLECTION_NAME = "waze_events"
 
-def visualize_data_from_db():
-    """Visualiza los datos de la base de datos en forma de tabla y muestra el número total de eventos."""
+# Filas por página y campos que se traen del servidor (nunca el documento completo)
+PAGE_SIZE = int(os.getenv("INSPECT_PAGE_SIZE", 20))
+SAMPLE_FIELDS = os.getenv("INSPECT_FIELDS", "type,subtype,city,street,dateTime,uuid").split(",")
+# Cuántas comunas mostrar en el resumen
+TOP_CITIES = int(os.getenv("INSPECT_TOP_CITIES", 10))
+# Tiempo máximo para el conteo exacto con filtro (el estimado usa metadatos de la colección)
+COUNT_TIMEOUT_MS = int(os.getenv("INSPECT_COUNT_TIMEOUT_MS", 5000))
+
+def get_collection(client):
+    return client[DB_NAME][COLLECTION_NAME]
+
+def count_events(collection, query=None):
+    """Sin filtro usa los metadatos de la colección; con filtro cuenta en el servidor con tiempo límite."""
+    if not query:
+        return collection.estimated_document_count()
+    return collection.count_documents(query, maxTimeMS=COUNT_TIMEOUT_MS)
+
+def fetch_page(collection, after=None, limit=PAGE_SIZE, fields=SAMPLE_FIELDS, query=None):
+    """Una página ordenada por _id a partir de `after`, solo con los campos pedidos."""
+    query = dict(query or {})
+    if after is not None:
+        query["_id"] = {"$gt": ObjectId(after) if isinstance(after, str) else after}
+    projection = {field: 1 for field in fields}
+    return list(collection.find(query, projection).sort("_id", 1).limit(limit))
+
+def iter_pages(collection, limit=PAGE_SIZE, fields=SAMPLE_FIELDS, query=None, after=None):
+    """Recorre la colección página a página; en memoria solo queda la página actual."""
+    while True:
+        page = fetch_page(collection, after, limit, fields, query)
+        if not page:
+            return
+        yield page
+        after = page[-1]["_id"]
+
+def summary_stats(collection, query=None, top_cities=TOP_CITIES):
+    """Conteos por tipo y comunas más frecuentes, agregados en el servidor."""
+    match = [{"$match": query}] if query else []
+    by_type = list(collection.aggregate(match + [
+        {"$group": {
+            "_id": "$type",
+            "count": {"$sum": 1},
+            "first": {"$min": "$dateTime"},
+            "last": {"$max": "$dateTime"},
+            "avg_reliability": {"$avg": "$reliability"},
+        }},
+        {"$sort": {"count": -1}},
+    ], allowDiskUse=True))
+    by_city = list(collection.aggregate(match + [
+        {"$group": {"_id": "$city", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": top_cities},
+    ], allowDiskUse=True))
+    return by_type, by_city
+
+def print_page(page, fields):
+    columns = ["_id"] + [field for field in fields if field != "_id"]
+    widths = {column: max([len(column)] + [len(str(doc.get(column, ""))[:40]) for doc in page])
+              for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for doc in page:
+        print("  ".join(str(doc.get(column, ""))[:40].ljust(widths[column]) for column in columns))
+
+def print_stats(by_type, by_city):
+    print("\n📊 Eventos por tipo:")
+    for row in by_type:
+        line = f"  {row['_id']}: {row['count']} (desde {row['first']} hasta {row['last']}"
+        if row["avg_reliability"] is not None:
+            line += f", confiabilidad media {row['avg_reliability']:.2f}"
+        print(line + ")")
+    print("\n🏙️ Comunas con más eventos:")
+    for row in by_city:
+        print(f"  {row['_id']}: {row['count']}")
+
+def visualize_data_from_db(limit=PAGE_SIZE, fields=SAMPLE_FIELDS, after=None, pages=1, query=None, stats=False):
+    """Muestra una o más páginas de eventos y el número total, sin cargar la colección en memoria."""
     client = pymongo.MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    collection = db[COLLECTION_NAME]
+    try:
+        collection = get_collection(client)
+        shown = 0
+        for number, page in enumerate(iter_pages(collection, limit, fields, query, after), start=1):
+            print(f"\n📄 Página {number}:")
+            print_page(page, fields)
+            shown += len(page)
+            if number >= pages:
+                # Una página incompleta es la última; si está llena, se confirma con un solo _id
+                if len(page) == limit and fetch_page(collection, page[-1]["_id"], 1, ["_id"], query):
+                    print(f"\n➡️ Siguiente página: --after {page[-1]['_id']}")
+                break
 
-    # Obtiene todos los documentos de la colección
-    data = list(collection.find())
+        if not shown:
+            print("No hay datos en la base de datos.")
+            return
 
-    if not data:
-        print("No hay datos en la base de datos.")
-        return
+        # Muestra el número total de eventos
+        total_events = count_events(collection, query)
+        label = "Número total de eventos" if query else "Número total de eventos (estimado)"
+        print(f"\n{label} en la base de datos: {total_events}")
 
-    # Convierte los datos a un DataFrame de pandas
-    df = pd.DataFrame(data)
+        if stats:
+            print_stats(*summary_stats(collection, query))
+    finally:
+        client.close()
 
-    # Muestra los datos en forma de tabla
-    print(df.head(20))  # Muestra las primeras 20 filas
+def main():
+    parser = argparse.ArgumentParser(description="Inspección paginada de los eventos guardados en MongoDB")
+    parser.add_argument("--limit", type=int, default=PAGE_SIZE, help="filas por página")
+    parser.add_argument("--pages", type=int, default=1, help="cuántas páginas mostrar")
+    parser.add_argument("--after", help="mostrar desde el _id siguiente a este")
+    parser.add_argument("--fields", default=",".join(SAMPLE_FIELDS), help="campos a mostrar, separados por coma")
+    parser.add_argument("--type", help="filtrar por tipo de evento (Alert o Jam)")
+    parser.add_argument("--city", help="filtrar por comuna")
+    parser.add_argument("--stats", action="store_true", help="mostrar resumen por tipo y comuna")
+    args = parser.parse_args()
 
-    # Muestra el número total de eventos
-    total_events = len(data)
-    print(f"Número total de eventos en la base de datos: {total_events}")
+    query = {}
+    if args.type:
+        query["type"] = args.type
+    if args.city:
+        query["city"] = args.city
+    visualize_data_from_db(args.limit, args.fields.split(","), args.after, args.pages, query, args.stats)
 
 if __name__ == "__main__":
-    visualize_data_from_db()
\ No newline at end of file
+    main()
@@ -0,0 +1,140 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+# Almacén único de resultados de simulación (SQLite, una fila por corrida)
+RESULTS_DB = os.getenv("RESULTS_DB", "simulation_results.db")
+
+# Cuantiles de latencia guardados por corrida (0%, 1%, ..., 100%) para dibujar CDFs
+LATENCY_QUANTILES = [q / 100 for q in range(101)]
+
+# Columnas de la tabla runs que se copian directamente desde el diccionario de resultados
+RUN_COLUMNS = [
+    "distribution", "cache_policy", "cache_size", "max_bytes", "ttl", "seed",
+    "total_queries", "hits", "misses", "hit_rate", "byte_hit_rate",
+    "avg_latency", "p50_latency", "p95_latency", "p99_latency", "max_latency",
+    "throughput", "num_clients", "arrival_rate", "timestamp",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    distribution TEXT,
+    cache_policy TEXT,
+    cache_size INTEGER,
+    max_bytes INTEGER,
+    ttl INTEGER,
+    seed INTEGER,
+    total_queries INTEGER,
+    hits INTEGER,
+    misses INTEGER,
+    hit_rate REAL,
+    byte_hit_rate REAL,
+    avg_latency REAL,
+    p50_latency REAL,
+    p95_latency REAL,
+    p99_latency REAL,
+    max_latency REAL,
+    throughput REAL,
+    num_clients INTEGER,
+    arrival_rate REAL,
+    timestamp TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_by_combination ON runs (distribution, cache_policy);
+CREATE TABLE IF NOT EXISTS latency_quantiles (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    quantile REAL NOT NULL,
+    latency REAL NOT NULL,
+    PRIMARY KEY (run_id, quantile)
+);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+def connect(path=RESULTS_DB):
+    # Varios procesos (p. ej. el barrido) pueden escribir a la vez: WAL + espera ante bloqueos
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+def latency_quantiles(latencies):
+    """Cuantiles empíricos (vecino más cercano) de una lista de latencias."""
+    if not latencies:
+        return []
+    values = sorted(latencies)
+    last = len(values) - 1
+    return [(q, values[round(q * last)]) for q in LATENCY_QUANTILES]
+
+def _insert_run(conn, result, source, metadata):
+    cursor = conn.execute(
+        f"INSERT INTO runs (source, recorded_at, {', '.join(RUN_COLUMNS)}, metadata) "
+        f"VALUES (?, ?, {', '.join('?' for _ in RUN_COLUMNS)}, ?)",
+        [source, datetime.now().isoformat()]
+        + [result.get(column) for column in RUN_COLUMNS]
+        + [json.dumps(metadata) if metadata else None],
+    )
+    return cursor.lastrowid
+
+def _mark_imported(conn, file_path):
+    file_path = os.path.abspath(file_path)
+    conn.execute("INSERT OR REPLACE INTO imported_files (path, mtime) VALUES (?, ?)",
+                 (file_path, os.path.getmtime(file_path)))
+
+def append_result(result, latencies=None, source="sequential", metadata=None, path=RESULTS_DB, json_file=None):
+    """Agrega una corrida al almacén y devuelve su run_id.
+
+    `json_file` es el results_*.json ya escrito con la misma corrida: queda marcado como
+    importado para que import_json_files no la cuente dos veces.
+    """
+    conn = connect(path)
+    try:
+        with conn:
+            run_id = _insert_run(conn, result, source, metadata)
+            conn.executemany(
+                "INSERT INTO latency_quantiles (run_id, quantile, latency) VALUES (?, ?, ?)",
+                [(run_id, q, latency) for q, latency in latency_quantiles(latencies)],
+            )
+            if json_file:
+                _mark_imported(conn, json_file)
+        return run_id
+    finally:
+        conn.close()
+
+def import_json_files(directory=".", path=RESULTS_DB):
+    """Importa los results_*.json sueltos que aún no estén en el almacén.
+
+    Si un archivo ya importado cambió, sus filas anteriores se reemplazan en lugar de sumarse.
+    """
+    conn = connect(path)
+    imported = 0
+    try:
+        known = dict(conn.execute("SELECT path, mtime FROM imported_files"))
+        for name in sorted(os.listdir(directory)):
+            if not (name.endswith(".json") and name.startswith("results_")):
+                continue
+            file_path = os.path.abspath(os.path.join(directory, name))
+            mtime = os.path.getmtime(file_path)
+            if known.get(file_path) == mtime:
+                continue
+            with open(file_path) as f:
+                data = json.load(f)
+            rows = data if isinstance(data, list) else [data]
+            metadata = {"file": name}
+            with conn:
+                stale = "SELECT run_id FROM runs WHERE metadata = ?"
+                conn.execute(f"DELETE FROM latency_quantiles WHERE run_id IN ({stale})", (json.dumps(metadata),))
+                conn.execute("DELETE FROM runs WHERE metadata = ?", (json.dumps(metadata),))
+                for row in rows:
+                    _insert_run(conn, row, row.get("mode", "json"), metadata)
+                _mark_imported(conn, file_path)
+            imported += len(rows)
+    finally:
+        conn.close()
+    return imported
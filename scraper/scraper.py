@@ -1,14 +1,15 @@
 import requests
 import pymongo
 import os
-import folium
 from datetime import datetime
-import pandas as pd
 import time
 from pymongo.errors import ServerSelectionTimeoutError
 
-# URL base de Waze para recolectar eventos
-WAZE_API_URL = "https://www.waze.com/live-map/api/georss"
+import metrics
+from geometry import compact_line
+
+# URL base de Waze para recolectar eventos (se puede apuntar a waze_stub.py para pruebas)
+WAZE_API_URL = os.getenv("WAZE_API_URL", "https://www.waze.com/live-map/api/georss")
 
 # Límites de la Región Metropolitana
 REGION_LIMITS = {
@@ -24,6 +25,14 @@ GRID_DIVISIONS = 6
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 DB_NAME = os.getenv("DB_NAME", "waze_data")
 COLLECTION_NAME = "waze_events"
+# Guardar la línea de cada atasco como polilínea codificada en lugar de la lista de puntos
+COMPACT_JAM_LINES = os.getenv("COMPACT_JAM_LINES", "1") == "1"
+# Reporte JSON de tiempos y contadores de cada recolección
+METRICS_REPORT = os.getenv("METRICS_REPORT", "metrics_scraper.json")
+
+WAZE_REQUESTS = metrics.counter("waze_requests_total", "Peticiones a la API de Waze por resultado")
+EVENTS_FETCHED = metrics.counter("waze_events_fetched_total", "Eventos recibidos de la API de Waze por tipo")
+EVENTS_SAVED = metrics.counter("mongo_events_saved_total", "Eventos guardados en MongoDB por resultado")
 
 def wait_for_mongo(uri, timeout=30):
     client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=1000)
@@ -75,10 +84,16 @@ def fetch_waze_data(top, bottom, left, right):
         "types": "alerts,traffic,users",
     }
     try:
-        response = requests.get(WAZE_API_URL, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        return response.json()
+        with metrics.span("waze_fetch"):
+            response = requests.get(WAZE_API_URL, headers=headers, params=params, timeout=10)
+            response.raise_for_status()
+            data = response.json()
+        WAZE_REQUESTS.inc(status="ok")
+        EVENTS_FETCHED.inc(len(data.get("alerts", [])), type="Alert")
+        EVENTS_FETCHED.inc(len(data.get("jams", [])), type="Jam")
+        return data
     except requests.RequestException as e:
+        WAZE_REQUESTS.inc(status="error")
         print(f"Error al realizar la petición a la API de Waze: {e}")
         return None
 
@@ -96,6 +111,10 @@ def process_waze_data(data):
         })
 
     for jam in data.get('jams', []):
+        if COMPACT_JAM_LINES and 'line' in jam:
+            line = jam['line']
+            jam = {key: value for key, value in jam.items() if key != 'line'}
+            jam.update(compact_line(line))
         events.append({
             'type': 'Jam',
             **jam,
@@ -109,27 +128,19 @@ def save_to_mongodb(db, events):
         print("No hay eventos para guardar.")
         return
     collection = db[COLLECTION_NAME]
-    for event in events:
-        try:
-            collection.insert_one(event)
-        except Exception as e:
-            print(f"Error al guardar el evento: {e}")
+    with metrics.span("mongo_save"):
+        for event in events:
+            try:
+                collection.insert_one(event)
+                EVENTS_SAVED.inc(status="ok")
+            except Exception as e:
+                EVENTS_SAVED.inc(status="error")
+                print(f"Error al guardar el evento: {e}")
 
 def visualize_data_from_db():
-    client = pymongo.MongoClient(MONGO_URI)
-    try:
-        db = client[DB_NAME]
-        collection = db[COLLECTION_NAME]
-        data = list(collection.find())
-
-        if not data:
-            print("No hay datos en la base de datos.")
-            return
-
-        df = pd.DataFrame(data)
-        print(df.head(20))
-    finally:
-        client.close()
+    """Muestra una página de eventos con el total estimado (ver query.py para paginar y resumir)."""
+    from query import visualize_data_from_db as inspect_events
+    inspect_events()
 
 def main():
     wait_for_mongo(MONGO_URI)
@@ -137,6 +148,7 @@ def main():
     grid = divide_region(REGION_LIMITS, GRID_DIVISIONS)
 
     total_events = 0
+    started = time.perf_counter()
     for square in grid:
         print(f"Recolectando datos para el área: {square}")
         data = fetch_waze_data(
@@ -151,6 +163,9 @@ def main():
             total_events += len(events)
 
     print(f"✅ Recolección completada. Total de eventos guardados: {total_events}")
+    metrics.write_report(METRICS_REPORT, total_events=total_events,
+                         duration_seconds=time.perf_counter() - started)
+    print(f"📊 Métricas guardadas en {METRICS_REPORT}")
 
 if __name__ == "__main__":
     main()
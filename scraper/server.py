@@ -1,37 +1,108 @@
 # scraper/server.py
-from flask import Flask, jsonify, request
-import redis
-import pymongo
+from flask import Flask, Response, g, jsonify, request
 import os
 import json
+import time
+import threading
 from bson import ObjectId
-import datetime
+
+from cache_keys import (
+    EVENT_FILTERS, EVENT_TTL, EVENTS_TTL, POPULAR_EVENTS_KEY, POPULAR_QUERIES_KEY, POPULARITY_MAX_MEMBERS,
+    event_key, events_key, serialize_doc,
+)
+from cache_warmup import WARMUP_EVENTS, WARMUP_QUERIES, warm_cache
+import metrics
 
 # Config
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongo:27017/")
 REDIS_HOST = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))  # Base lógica de Redis (el benchmark usa una propia)
 DB_NAME = os.getenv("DB_NAME", "waze_data")
 COLLECTION_NAME = "waze_events"
+STATS_TTL = 24 * 3600  # Retención de los contadores de hit/miss por minuto
 
-# Conexiones
+# Conexiones: se abren con la primera petición que las necesita, no al importar
 app = Flask(__name__)
-mongo_client = pymongo.MongoClient(MONGO_URI)
-db = mongo_client[DB_NAME]
-collection = db[COLLECTION_NAME]
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
-
-# Helper para transformar ObjectId y fechas a formato serializable
-def serialize_doc(doc):
-    if doc.get("_id"):
-        doc["_id"] = str(doc["_id"])
-    
-    # Convertir fechas a formato ISO
-    for key, value in doc.items():
-        if isinstance(value, datetime.datetime):
-            doc[key] = value.isoformat()
-    
-    return doc
+_clients = {}
+# Varios hilos (Flask multihilo, clientes de carga) pueden pedir el primer cliente a la vez
+_clients_lock = threading.Lock()
+
+def get_redis():
+    with _clients_lock:
+        if "redis" not in _clients:
+            import redis
+            _clients["redis"] = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=True)
+        return _clients["redis"]
+
+def get_collection():
+    with _clients_lock:
+        if "mongo" not in _clients:
+            import pymongo
+            _clients["mongo"] = pymongo.MongoClient(MONGO_URI)
+        return _clients["mongo"][DB_NAME][COLLECTION_NAME]
+
+# Métricas
+HTTP_REQUESTS = metrics.counter("http_requests_total", "Peticiones a la API por endpoint y código")
+HTTP_LATENCY = metrics.histogram("http_request_duration_seconds", "Latencia de la API por endpoint")
+CACHE_ACCESS = metrics.counter("api_cache_access_total", "Hits y misses del caché de la API por tipo de clave")
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_LATENCY.observe(time.perf_counter() - g.started, endpoint=endpoint)
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    return response
+
+# Registra la popularidad de la clave y el hit/miss del minuto actual en un solo viaje a Redis
+def record_access(popularity_key, member, hit):
+    CACHE_ACCESS.inc(key=popularity_key, result="hit" if hit else "miss")
+    stats_key = f"stats:cache:{int(time.time() // 60)}"
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.zincrby(popularity_key, 1, member)
+    pipe.zcard(popularity_key)
+    pipe.hincrby(stats_key, "hits" if hit else "misses", 1)
+    pipe.expire(stats_key, STATS_TTL)
+    with metrics.span("redis", op="record_access"):
+        _, members, _, _ = pipe.execute()
+    if members > 2 * POPULARITY_MAX_MEMBERS:
+        trim_popularity(popularity_key)
+
+# Recorta el set a los POPULARITY_MAX_MEMBERS más populares y divide los puntajes a la mitad, para que
+# las claves antiguas pierdan peso frente a las nuevas. El candado evita que dos workers lo hagan a la vez.
+def trim_popularity(popularity_key):
+    r = get_redis()
+    if not r.set(f"{popularity_key}:trim", 1, nx=True, ex=10):
+        return
+    pipe = r.pipeline(transaction=True)
+    pipe.zunionstore(popularity_key, {popularity_key: 0.5})
+    pipe.zremrangebyrank(popularity_key, 0, -(POPULARITY_MAX_MEMBERS + 1))
+    with metrics.span("redis", op="trim_popularity"):
+        pipe.execute()
+
+def hit_rate_timeline(minutes):
+    """Hits, misses y hit rate de la API en los últimos `minutes` minutos."""
+    current = int(time.time() // 60)
+    pipe = get_redis().pipeline(transaction=False)
+    for minute in range(current - minutes + 1, current + 1):
+        pipe.hgetall(f"stats:cache:{minute}")
+    with metrics.span("redis", op="hit_rate_timeline"):
+        results = pipe.execute()
+    timeline = []
+    for offset, counts in enumerate(results):
+        hits = int(counts.get("hits", 0))
+        misses = int(counts.get("misses", 0))
+        timeline.append({
+            "minute": (current - minutes + 1 + offset) * 60,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        })
+    return timeline
 
 @app.route("/", methods=["GET"])
 def index():
@@ -42,7 +113,9 @@ def index():
             "/api/event/<event_id>",
             "/api/random_ids",
             "/api/cache/stats",
-            "/api/cache/clear"
+            "/api/cache/clear",
+            "/api/cache/warmup",
+            "/metrics"
         ]
     })
 
@@ -56,13 +129,15 @@ def get_events():
     
     # Filtros
     filters = {}
-    for key in ["type", "subtype", "country", "city"]:
+    for key in EVENT_FILTERS:
         if key in request.args:
             filters[key] = request.args.get(key)
     
     # Verificar si esta consulta está en caché
-    cache_key = f"events:{json.dumps(filters)}:{page}:{limit}"
-    cached = r.get(cache_key)
+    cache_key = events_key(filters, page, limit)
+    with metrics.span("redis", op="get"):
+        cached = get_redis().get(cache_key)
+    record_access(POPULAR_QUERIES_KEY, cache_key, bool(cached))
     
     if cached:
         return jsonify({
@@ -73,11 +148,12 @@ def get_events():
         })
     
     # Consultar MongoDB si no está en caché
-    cursor = collection.find(filters).skip(skip).limit(limit)
-    events = [serialize_doc(doc) for doc in cursor]
+    with metrics.span("mongo", op="find"):
+        events = [serialize_doc(doc) for doc in get_collection().find(filters).skip(skip).limit(limit)]
     
     # Guardar en caché (expira en 5 minutos)
-    r.set(cache_key, json.dumps(events), ex=300)
+    with metrics.span("redis", op="set"):
+        get_redis().set(cache_key, json.dumps(events), ex=EVENTS_TTL)
     
     return jsonify({
         "source": "mongo",
@@ -90,8 +166,10 @@ def get_events():
 def get_event(event_id):
     """Endpoint para obtener un evento específico por ID"""
     # Verificar si está en caché
-    cached = r.get(f"event:{event_id}")
+    with metrics.span("redis", op="get"):
+        cached = get_redis().get(event_key(event_id))
     if cached:
+        record_access(POPULAR_EVENTS_KEY, event_id, True)
         return jsonify({
             "source": "cache",
             "event": json.loads(cached)
@@ -99,14 +177,19 @@ def get_event(event_id):
     
     # Si no está en caché, consultarlo en MongoDB
     try:
-        doc = collection.find_one({"_id": ObjectId(event_id)})
+        with metrics.span("mongo", op="find_one"):
+            doc = get_collection().find_one({"_id": ObjectId(event_id)})
     except:
         return jsonify({"error": "ID de evento inválido"}), 400
     
     if doc:
+        # Solo los eventos que existen cuentan para la popularidad: un ID inválido o
+        # inexistente no debe llegar a la precarga
+        record_access(POPULAR_EVENTS_KEY, event_id, False)
         serialized_doc = serialize_doc(doc)
         # Guardar en caché (expira en 1 hora)
-        r.set(f"event:{event_id}", json.dumps(serialized_doc), ex=3600)
+        with metrics.span("redis", op="set"):
+            get_redis().set(event_key(event_id), json.dumps(serialized_doc), ex=EVENT_TTL)
         return jsonify({
             "source": "mongo",
             "event": serialized_doc
@@ -120,9 +203,10 @@ def get_random_ids():
     n = min(int(request.args.get("n", 10)), 50)  # Limitar a máximo 50 IDs
     
     # Ejecutar una agregación para obtener documentos aleatorios
-    random_docs = list(collection.aggregate([
-        {"$sample": {"size": n}}
-    ]))
+    with metrics.span("mongo", op="sample"):
+        random_docs = list(get_collection().aggregate([
+            {"$sample": {"size": n}}
+        ]))
     
     ids = [str(doc["_id"]) for doc in random_docs]
     return jsonify(ids)
@@ -131,6 +215,7 @@ def get_random_ids():
 def cache_stats():
     """Endpoint para ver estadísticas del cache"""
     try:
+        r = get_redis()
         # Obtener información sobre el uso de memoria
         info = r.info()
         
@@ -156,6 +241,7 @@ def cache_stats():
             "maxmemory": info.get("maxmemory_human", "N/A"),
             "maxmemory_policy": info.get("maxmemory_policy", "N/A"),
             "hit_rate": f"{info.get('keyspace_hits', 0) / (info.get('keyspace_hits', 0) + info.get('keyspace_misses', 1)) * 100:.2f}%",
+            "hit_rate_timeline": hit_rate_timeline(min(int(request.args.get("minutes", 15)), 1440)),
             "key_ttl_info": ttl_info
         }
         return jsonify(cache_info)
@@ -166,6 +252,7 @@ def cache_stats():
 def clear_cache():
     """Endpoint para limpiar el cache"""
     try:
+        r = get_redis()
         # Borrar solo las claves relacionadas con eventos
         event_keys = r.keys("event:*")
         events_list_keys = r.keys("events:*")
@@ -176,12 +263,34 @@ def clear_cache():
         if events_list_keys:
             deleted += r.delete(*events_list_keys)
             
-        return jsonify({
+        response = {
             "message": "Cache limpiado correctamente",
             "keys_deleted": deleted
-        })
+        }
+        # Opcionalmente precargar las claves populares inmediatamente (?warmup=1)
+        if request.args.get("warmup") == "1":
+            response["warmup"] = warm_cache(r, get_collection())
+        return jsonify(response)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/cache/warmup", methods=["POST"])
+def warmup_cache():
+    """Endpoint para precargar el cache con las claves más populares"""
+    try:
+        max_events = int(request.args.get("events", WARMUP_EVENTS))
+        max_queries = int(request.args.get("queries", WARMUP_QUERIES))
+        return jsonify(warm_cache(get_redis(), get_collection(), max_events=max_events, max_queries=max_queries))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Métricas de la API en formato de exposición de Prometheus"""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    # Precargar el caché antes de aceptar tráfico (p. ej. después de un deploy)
+    if os.getenv("CACHE_WARMUP_ON_START") == "1":
+        warm_cache(get_redis(), get_collection())
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import redis
+import requests
+from bson import ObjectId
+
+import cache_query
+import results_store
+
+from cache_query import (
+    REDIS_HOST, REDIS_PORT, REDIS_DB, TRAFFIC_DISTRIBUTIONS, CACHE_POLICIES, CACHE_MAX_BYTES,
+    get_collection, sample_ids, make_distribution, make_cache, is_byte_policy,
+)
+
+# Configuración de la carga
+NUM_CLIENTS = int(os.getenv("NUM_CLIENTS", 16))            # Clientes virtuales concurrentes
+ARRIVAL_RATE = float(os.getenv("ARRIVAL_RATE", 200))       # Consultas/segundo (0 = lazo cerrado, sin pausa)
+LOAD_QUERIES = int(os.getenv("LOAD_QUERIES", 5000))        # Consultas por combinación
+LOAD_TARGET = os.getenv("LOAD_TARGET", "direct")           # "direct" (Redis + Mongo) o "api" (server.py)
+API_URL = os.getenv("API_URL", "http://api:5000")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+SEED = int(os.getenv("SEED", 42))
+# Dimensionamiento del caché en modo "direct" (en modo "api" lo fija server.py)
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", cache_query.CACHE_SIZE))  # Entradas (políticas por cantidad)
+CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))                      # Segundos
+# Base de Redis del modo "direct": se vacía en cada combinación, así que no puede ser la de la API
+LOAD_REDIS_DB = int(os.getenv("LOAD_REDIS_DB", 14))
+
+def latency_percentiles(latencies):
+    """Resume las latencias (en segundos) con percentiles p50/p95/p99 y máximo."""
+    if not latencies:
+        return {"avg_latency": 0, "p50_latency": 0, "p95_latency": 0, "p99_latency": 0, "max_latency": 0}
+    values = np.asarray(latencies)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "avg_latency": float(values.mean()),
+        "p50_latency": float(p50),
+        "p95_latency": float(p95),
+        "p99_latency": float(p99),
+        "max_latency": float(values.max()),
+    }
+
+class DirectTarget:
+    """Consulta Redis a través de una política de caché y cae a MongoDB en los miss.
+
+    Lleva la cuenta de los miss que ocurren mientras otro cliente ya está trayendo
+    la misma clave desde Mongo (estampida sobre claves calientes).
+    """
+
+    def __init__(self, cache_policy_type):
+        pool = redis.BlockingConnectionPool(
+            host=REDIS_HOST, port=REDIS_PORT, db=LOAD_REDIS_DB, decode_responses=True,
+            max_connections=REDIS_MAX_CONNECTIONS, timeout=5,
+        )
+        self.redis = redis.Redis(connection_pool=pool)
+        self.redis.flushdb()
+        self.cache = make_cache(cache_policy_type, self.redis, max_size=CACHE_SIZE, ttl=CACHE_TTL,
+                                max_bytes=CACHE_MAX_BYTES)
+        self.inflight = Counter()
+        self.lock = threading.Lock()
+        self.stampede_misses = 0
+
+    def request(self, eid):
+        if self.cache.get(eid):
+            return True
+
+        with self.lock:
+            if self.inflight[eid]:
+                self.stampede_misses += 1
+            self.inflight[eid] += 1
+        try:
+            event = get_collection().find_one({"_id": ObjectId(eid)})
+            if event:
+                event["_id"] = str(event["_id"])
+                self.cache.set(eid, str(event))
+        finally:
+            with self.lock:
+                self.inflight[eid] -= 1
+        return False
+
+    def extra_metrics(self):
+        return {"stampede_misses": self.stampede_misses}
+
+    def sizing(self, cache_policy_type):
+        return {
+            "cache_size": CACHE_SIZE,
+            "max_bytes": CACHE_MAX_BYTES if is_byte_policy(cache_policy_type) else None,
+            "ttl": CACHE_TTL,
+        }
+
+class ApiTarget:
+    """Consulta el endpoint /api/event/<id> de server.py; el hit lo informa el campo "source"."""
+
+    def __init__(self):
+        self.local = threading.local()
+        requests.post(f"{API_URL}/api/cache/clear", timeout=10)
+
+    def _session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request(self, eid):
+        response = self._session().get(f"{API_URL}/api/event/{eid}", timeout=10)
+        response.raise_for_status()
+        return response.json().get("source") == "cache"
+
+    def extra_metrics(self):
+        return {}
+
+    def sizing(self, cache_policy_type):
+        return {"cache_size": None, "max_bytes": None, "ttl": None}
+
+def run_load(distribution_type, cache_policy_type, ids):
+    """Ejecuta LOAD_QUERIES consultas repartidas entre NUM_CLIENTS clientes concurrentes.
+
+    Con ARRIVAL_RATE > 0 las llegadas siguen un proceso de Poisson (lazo abierto) y la
+    latencia se mide desde el instante de llegada programado, incluyendo la espera en
+    cola cuando todos los clientes están ocupados. Con ARRIVAL_RATE = 0 cada cliente
+    envía su siguiente consulta apenas recibe la respuesta anterior.
+    """
+    random.seed(SEED)
+    np.random.seed(SEED)
+    next_query = make_distribution(distribution_type, ids)
+    keys = [next_query() for _ in range(LOAD_QUERIES)]
+
+    if LOAD_TARGET == "api":
+        target = ApiTarget()
+        cache_policy_type = "server"
+    else:
+        target = DirectTarget(cache_policy_type)
+
+    latencies = []
+    hits = 0
+    errors = 0
+    lock = threading.Lock()
+
+    def handle(eid, arrival):
+        nonlocal hits, errors
+        try:
+            hit = target.request(eid)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        latency = time.perf_counter() - arrival
+        with lock:
+            latencies.append(latency)
+            hits += hit
+
+    print(f"🚀 Carga {distribution_type}/{cache_policy_type}: {NUM_CLIENTS} clientes, "
+          f"{ARRIVAL_RATE or 'máx'} consultas/s, destino {LOAD_TARGET}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=NUM_CLIENTS) as executor:
+        if ARRIVAL_RATE > 0:
+            gaps = np.random.exponential(1 / ARRIVAL_RATE, size=len(keys))
+            arrivals = start + np.cumsum(gaps)
+            for eid, arrival in zip(keys, arrivals):
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(handle, eid, arrival)
+        else:
+            cursor = iter(keys)
+            cursor_lock = threading.Lock()
+
+            def client():
+                while True:
+                    with cursor_lock:
+                        eid = next(cursor, None)
+                    if eid is None:
+                        return
+                    handle(eid, time.perf_counter())
+
+            for _ in range(NUM_CLIENTS):
+                executor.submit(client)
+    elapsed = time.perf_counter() - start
+
+    completed = len(latencies)
+    results = {
+        "distribution": distribution_type,
+        "cache_policy": cache_policy_type,
+        "mode": "load",
+        "target": LOAD_TARGET,
+        "num_clients": NUM_CLIENTS,
+        "arrival_rate": ARRIVAL_RATE,
+        **target.sizing(cache_policy_type),
+        "seed": SEED,
+        "total_queries": len(keys),
+        "completed": completed,
+        "errors": errors,
+        "hits": hits,
+        "misses": completed - hits,
+        "hit_rate": hits / completed if completed else 0,
+        "throughput": completed / elapsed if elapsed > 0 else 0,
+        "elapsed": elapsed,
+        **latency_percentiles(latencies),
+        **target.extra_metrics(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+    print(f"\n📊 Resultados:")
+    print(f"   Throughput: {results['throughput']:.1f} consultas/s ({errors} errores)")
+    print(f"   Hit rate: {results['hit_rate']:.2%}")
+    print(f"   Latencia p50/p95/p99/max: {results['p50_latency']*1000:.2f} / "
+          f"{results['p95_latency']*1000:.2f} / {results['p99_latency']*1000:.2f} / "
+          f"{results['max_latency']*1000:.2f} ms\n")
+
+    json_file = f"results_load_{distribution_type}_{cache_policy_type}.json"
+    with open(json_file, "w") as f:
+        json.dump(results, f, indent=2)
+    results_store.append_result(results, latencies, source="load", metadata={"target": LOAD_TARGET},
+                                json_file=json_file)
+
+    return results
+
+def main():
+    if LOAD_TARGET != "api" and LOAD_REDIS_DB in (0, REDIS_DB):
+        sys.exit("❌ LOAD_REDIS_DB no puede ser la base de Redis de la API: el modo direct la vacía")
+    ids = sample_ids()
+    policies = ["server"] if LOAD_TARGET == "api" else CACHE_POLICIES
+
+    all_results = []
+    for dist in TRAFFIC_DISTRIBUTIONS:
+        for policy in policies:
+            all_results.append(run_load(dist, policy, ids))
+
+    with open("all_load_results.json", "w") as f:
+        json.dump(all_results, f, indent=2)
+
+    print("✅ Pruebas de carga completadas!")
+
+if __name__ == "__main__":
+    main()
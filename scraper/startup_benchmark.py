@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+from datetime import datetime
+
+# Módulos de entrada cuyo tiempo de importación se mide (cada uno en un intérprete nuevo)
+ENTRY_POINTS = os.getenv("STARTUP_MODULES", "scraper,server,cache_query,query,export_to_csv").split(",")
+RUNS = int(os.getenv("STARTUP_RUNS", 5))
+# Presupuesto por módulo en ms, descontando el arranque del intérprete
+BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", 400))
+# Bibliotecas que ninguna entrada debería cargar al importarse
+HEAVY_MODULES = {"pandas", "folium", "matplotlib", "numpy", "seaborn", "pyarrow"}
+OUTPUT_FILE = os.getenv("STARTUP_OUTPUT", "startup_benchmark.json")
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Direcciones que no responden: si un módulo se conecta al importarse, se nota en el tiempo
+ISOLATED_ENV = dict(os.environ, MONGO_URI="mongodb://192.0.2.1:27017/?serverSelectionTimeoutMS=2000",
+                    REDIS_HOST="192.0.2.1")
+
+def run_import(code):
+    """Tiempo de pared de un intérprete nuevo que ejecuta `code`, y su salida de -X importtime."""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=SCRIPT_DIR,
+                          env=ISOLATED_ENV, capture_output=True, text=True)
+    return time.perf_counter() - start, proc
+
+def parse_importtime(stderr):
+    """Módulos cargados con su tiempo acumulado en ms; la sangría del nombre indica quién lo importó."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name[1:].rstrip()] = int(cumulative) / 1000
+    return modules
+
+def measure(module, baseline):
+    samples = []
+    for _ in range(RUNS):
+        elapsed, proc = run_import(f"import {module}")
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"código {proc.returncode}"
+            return {"module": module, "error": error}
+        samples.append(elapsed)
+    modules = parse_importtime(proc.stderr)
+    # Importaciones directas del módulo medido (un nivel de sangría bajo él)
+    direct = {name.strip(): ms for name, ms in modules.items()
+              if name.startswith("  ") and not name.startswith("   ")}
+    import_ms = max(0.0, (statistics.median(samples) - baseline) * 1000)
+    return {
+        "module": module,
+        "import_ms": import_ms,
+        "min_ms": max(0.0, (min(samples) - baseline) * 1000),
+        "within_budget": import_ms <= BUDGET_MS,
+        "heavy_modules_loaded": sorted(HEAVY_MODULES & {name.strip().split(".")[0] for name in modules}),
+        "slowest_imports": sorted(direct.items(), key=lambda item: -item[1])[:5],
+    }
+
+def main():
+    baseline = statistics.median(run_import("pass")[0] for _ in range(RUNS))
+    print(f"⏱️ Arranque del intérprete: {baseline * 1000:.1f} ms (mediana de {RUNS})")
+
+    results = []
+    for module in ENTRY_POINTS:
+        result = measure(module, baseline)
+        results.append(result)
+        if "error" in result:
+            print(f"❌ {module}: no se pudo importar ({result['error']})")
+            continue
+        status = "✅" if result["within_budget"] and not result["heavy_modules_loaded"] else "❌"
+        print(f"{status} {module}: {result['import_ms']:.1f} ms (presupuesto {BUDGET_MS:.0f} ms)")
+        if result["heavy_modules_loaded"]:
+            print(f"   carga al importarse: {', '.join(result['heavy_modules_loaded'])}")
+        for name, ms in result["slowest_imports"]:
+            print(f"   {name}: {ms:.1f} ms")
+
+    with open(OUTPUT_FILE, "w") as f:
+        json.dump({"date": datetime.now().isoformat(), "python": sys.version.split()[0], "runs": RUNS,
+                   "budget_ms": BUDGET_MS, "interpreter_ms": baseline * 1000, "results": results}, f, indent=2)
+    print(f"Resultados guardados en {OUTPUT_FILE}")
+
+    failed = [r["module"] for r in results
+              if "error" in r or not r["within_budget"] or r["heavy_modules_loaded"]]
+    if failed:
+        print(f"❌ Fuera de presupuesto: {', '.join(failed)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import csv
+import json
+import math
+import time
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from itertools import product
+
+import pymongo
+import redis
+
+from cache_query import (
+    REDIS_HOST, REDIS_PORT, MONGO_URI, DB_NAME, COLLECTION_NAME,
+    TOTAL_QUERIES, TRAFFIC_DISTRIBUTIONS, CACHE_POLICIES,
+    MemoryBackend, is_byte_policy, sample_ids, run_simulation,
+)
+
+def _env_list(name, default, cast=str):
+    return [cast(v.strip()) for v in os.getenv(name, default).split(",") if v.strip()]
+
+# Configuración del barrido
+SWEEP_DISTRIBUTIONS = _env_list("SWEEP_DISTRIBUTIONS", ",".join(TRAFFIC_DISTRIBUTIONS))
+SWEEP_POLICIES = _env_list("SWEEP_POLICIES", ",".join(CACHE_POLICIES))
+SWEEP_CACHE_SIZES = _env_list("SWEEP_CACHE_SIZES", "50,100,200,400", int)
+# Las políticas por bytes barren presupuestos en bytes en lugar de cantidad de claves
+SWEEP_CACHE_BYTES = _env_list("SWEEP_CACHE_BYTES", "65536,131072,262144,524288", int)
+SWEEP_TTLS = _env_list("SWEEP_TTLS", "60,3600", int)
+SWEEP_REPETITIONS = int(os.getenv("SWEEP_REPETITIONS", 5))    # Semillas distintas por combinación
+SWEEP_QUERIES = int(os.getenv("SWEEP_QUERIES", TOTAL_QUERIES))
+SWEEP_THINK_TIME = float(os.getenv("SWEEP_THINK_TIME", 0))
+SWEEP_BACKEND = os.getenv("SWEEP_BACKEND", "redis")           # "redis" (un DB index por worker) o "memory"
+
+# Bases de Redis que el barrido vacía (una por worker). Redis trae 16 por defecto; se excluyen
+# la 0, la de la API (REDIS_DB), la del benchmark de punta a punta (BENCH_REDIS_DB) y la de la
+# carga concurrente (LOAD_REDIS_DB)
+RESERVED_REDIS_DBS = {0, int(os.getenv("REDIS_DB", 0)), int(os.getenv("BENCH_REDIS_DB", 15)),
+                      int(os.getenv("LOAD_REDIS_DB", 14))}
+REDIS_DB_INDEXES = [i for i in _env_list("SWEEP_REDIS_DBS", ",".join(map(str, range(16))), int)
+                    if i not in RESERVED_REDIS_DBS]
+# Sin SWEEP_WORKERS se usan tantos procesos como núcleos, hasta una base de Redis por proceso
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS") or (
+    (os.cpu_count() or 4) if SWEEP_BACKEND == "memory" else min(os.cpu_count() or 4, len(REDIS_DB_INDEXES))))
+
+# Valores críticos t de Student (dos colas, 95%) para 1..30 grados de libertad
+T_CRITICAL_95 = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]
+
+# Estado propio de cada proceso del pool (clientes creados después del fork)
+_worker = {}
+
+def _init_worker(db_queue):
+    mongo_client = pymongo.MongoClient(MONGO_URI)
+    _worker["collection"] = mongo_client[DB_NAME][COLLECTION_NAME]
+    if SWEEP_BACKEND == "memory":
+        _worker["backend"] = MemoryBackend()
+        _worker["backend_name"] = "memory"
+    else:
+        db_index = db_queue.get()
+        _worker["backend"] = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=db_index,
+                                         decode_responses=True)
+        _worker["backend_name"] = f"redis/db{db_index}"
+
+def _run_combination(distribution, policy, capacity, ttl, seed, ids, sweep_id):
+    if is_byte_policy(policy):
+        sizing = {"max_bytes": capacity}
+    else:
+        sizing = {"cache_size": capacity}
+    result = run_simulation(
+        distribution, policy, ids,
+        redis_client=_worker["backend"],
+        mongo_collection=_worker["collection"],
+        ttl=ttl, total_queries=SWEEP_QUERIES, **sizing,
+        seed=seed, think_time=SWEEP_THINK_TIME,
+        verbose=False, save_results=False,
+        store_source="sweep", store_metadata={"sweep_id": sweep_id, "backend": _worker["backend_name"]},
+    )
+    result["backend"] = _worker["backend_name"]
+    return result
+
+def confidence_interval(values):
+    """Media y semiancho del intervalo de confianza del 95% (t de Student)."""
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, 0.0
+    df = len(values) - 1
+    t = T_CRITICAL_95[df - 1] if df <= len(T_CRITICAL_95) else 1.96
+    return mean, t * statistics.stdev(values) / math.sqrt(len(values))
+
+def summarize(runs):
+    """Agrupa las repeticiones de cada combinación y calcula medias con IC 95%."""
+    groups = {}
+    for run in runs:
+        key = (run["distribution"], run["cache_policy"], run["cache_size"], run["max_bytes"] or 0, run["ttl"])
+        groups.setdefault(key, []).append(run)
+
+    summary = []
+    for (distribution, policy, cache_size, max_bytes, ttl), group in sorted(groups.items()):
+        hit_rate, hit_rate_ci = confidence_interval([run["hit_rate"] for run in group])
+        byte_hit_rate, byte_hit_rate_ci = confidence_interval([run["byte_hit_rate"] for run in group])
+        latency, latency_ci = confidence_interval([run["avg_latency"] for run in group])
+        summary.append({
+            "distribution": distribution,
+            "cache_policy": policy,
+            "cache_size": cache_size,
+            "max_bytes": max_bytes or None,
+            "ttl": ttl,
+            "repetitions": len(group),
+            "hit_rate": hit_rate,
+            "hit_rate_ci95": hit_rate_ci,
+            "byte_hit_rate": byte_hit_rate,
+            "byte_hit_rate_ci95": byte_hit_rate_ci,
+            "avg_latency": latency,
+            "avg_latency_ci95": latency_ci,
+        })
+    return summary
+
+def main():
+    ids = sample_ids()
+    combinations = []
+    for policy in SWEEP_POLICIES:
+        capacities = SWEEP_CACHE_BYTES if is_byte_policy(policy) else SWEEP_CACHE_SIZES
+        for dist, capacity, ttl, seed in product(SWEEP_DISTRIBUTIONS, capacities, SWEEP_TTLS,
+                                                 range(SWEEP_REPETITIONS)):
+            combinations.append((dist, policy, capacity, ttl, seed))
+
+    workers = SWEEP_WORKERS
+    db_queue = multiprocessing.Manager().Queue()
+    if SWEEP_BACKEND != "memory":
+        if len(REDIS_DB_INDEXES) < workers:
+            sys.exit(f"❌ {workers} workers necesitan {workers} bases de Redis y solo hay {len(REDIS_DB_INDEXES)} "
+                     f"disponibles ({REDIS_DB_INDEXES}); ajusta SWEEP_REDIS_DBS o SWEEP_WORKERS")
+        for db_index in REDIS_DB_INDEXES:
+            db_queue.put(db_index)
+
+    print(f"🚀 Barrido de {len(combinations)} simulaciones en {workers} procesos (backend {SWEEP_BACKEND})")
+
+    runs = []
+    sweep_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(db_queue,)) as executor:
+        futures = [executor.submit(_run_combination, dist, policy, capacity, ttl, seed, ids, sweep_id)
+                   for dist, policy, capacity, ttl, seed in combinations]
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                runs.append(future.result())
+            except Exception as e:
+                print(f"❌ Error en una simulación: {e}")
+            if done % 10 == 0 or done == len(futures):
+                print(f"[{done}/{len(futures)}] simulaciones terminadas")
+
+    summary = summarize(runs)
+    sweep = {
+        "sweep_id": sweep_id,
+        "timestamp": datetime.now().isoformat(),
+        "backend": SWEEP_BACKEND,
+        "workers": workers,
+        "elapsed": time.time() - start,
+        "runs": runs,
+        "summary": summary,
+    }
+    with open("sweep_results.json", "w") as f:
+        json.dump(sweep, f, indent=2)
+
+    with open("sweep_summary.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(summary[0].keys()) if summary else [])
+        writer.writeheader()
+        writer.writerows(summary)
+
+    print(f"✅ Barrido completado en {sweep['elapsed']:.1f} s: {len(runs)} simulaciones, "
+          f"{len(summary)} combinaciones en sweep_results.json y sweep_summary.csv")
+
+if __name__ == "__main__":
+    main()
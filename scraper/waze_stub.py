@@ -0,0 +1,135 @@
+# scraper/waze_stub.py
+"""Imitación local del endpoint georss de Waze con eventos sintéticos reproducibles.
+
+Los eventos no se guardan: cada petición genera los de su rectángulo con una semilla derivada
+de SEED y de las coordenadas pedidas, así que el mismo rectángulo devuelve siempre lo mismo.
+La cantidad es proporcional al área que el rectángulo comparte con la región, de modo que la
+grilla del scraper recibe en total unos STUB_EVENTS eventos, sean 1.000 o 10 millones.
+"""
+import os
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STUB_EVENTS = int(os.getenv("STUB_EVENTS", 10000))   # Eventos en toda la región
+STUB_JAM_SHARE = float(os.getenv("STUB_JAM_SHARE", 0.3))  # Proporción de atascos
+STUB_PORT = int(os.getenv("STUB_PORT", 8081))
+SEED = int(os.getenv("SEED", 42))
+# Los eventos se reparten en la semana que parte en este instante (ms)
+START_MILLIS = 1767225600000  # 2026-01-01T00:00:00Z
+SPAN_MILLIS = 7 * 24 * 3600 * 1000
+
+ALERT_TYPES = [("JAM", "JAM_HEAVY_TRAFFIC"), ("ACCIDENT", "ACCIDENT_MINOR"), ("HAZARD", "HAZARD_ON_ROAD_POT_HOLE"),
+               ("ROAD_CLOSED", "ROAD_CLOSED_EVENT"), ("POLICE", "POLICE_VISIBLE")]
+CITIES = ["Santiago", "Providencia", "Las Condes", "Maipú", "Puente Alto", "La Florida", "Ñuñoa", "San Bernardo"]
+STREETS = ["Av. Libertador Bernardo O'Higgins", "Av. Apoquindo", "Av. Vicuña Mackenna", "Autopista Central",
+           "Av. Providencia", "Costanera Norte", "Av. Pajaritos", "Av. Irarrázaval"]
+
+def overlap_share(box, region):
+    """Fracción del área de la región que cubre el rectángulo pedido."""
+    height = min(box["top"], region["top"]) - max(box["bottom"], region["bottom"])
+    width = min(box["right"], region["right"]) - max(box["left"], region["left"])
+    total = (region["top"] - region["bottom"]) * (region["right"] - region["left"])
+    return max(height, 0) * max(width, 0) / total if total > 0 else 0
+
+def _alert(rng, x, y, millis):
+    kind, subtype = rng.choice(ALERT_TYPES)
+    return {
+        "uuid": f"{rng.getrandbits(128):032x}", "type": kind, "subtype": subtype,
+        "city": rng.choice(CITIES), "street": rng.choice(STREETS), "country": "CI",
+        "reportByMunicipalityUser": "false", "confidence": rng.randint(0, 5), "reliability": rng.randint(5, 10),
+        "reportRating": rng.randint(0, 6), "roadType": rng.choice([1, 2, 3, 6, 7]), "magvar": rng.randint(0, 359),
+        "location": {"x": x, "y": y}, "pubMillis": millis,
+    }
+
+def _jam(rng, x, y, millis):
+    points = [{"x": x, "y": y}]
+    for _ in range(rng.randint(1, 5)):
+        points.append({"x": round(points[-1]["x"] + rng.uniform(-0.002, 0.002), 6),
+                       "y": round(points[-1]["y"] + rng.uniform(-0.002, 0.002), 6)})
+    speed = round(rng.uniform(0, 12), 2)
+    return {
+        "uuid": f"{rng.getrandbits(128):032x}", "city": rng.choice(CITIES), "street": rng.choice(STREETS),
+        "country": "CI", "level": rng.randint(1, 5), "length": rng.randint(50, 3000), "speed": speed,
+        "speedKMH": round(speed * 3.6, 2), "roadType": rng.choice([1, 2, 3, 6, 7]), "endNode": rng.choice(STREETS),
+        "delay": rng.randint(0, 900), "line": points, "pubMillis": millis,
+    }
+
+def generate(box, region, events=STUB_EVENTS, seed=SEED, jam_share=STUB_JAM_SHARE):
+    """Respuesta georss para el rectángulo pedido: {"alerts": [...], "jams": [...]}."""
+    count = round(events * overlap_share(box, region))
+    rng = random.Random(f"{seed}:{box['top']:.6f}:{box['bottom']:.6f}:{box['left']:.6f}:{box['right']:.6f}")
+    bottom, top = max(box["bottom"], region["bottom"]), min(box["top"], region["top"])
+    left, right = max(box["left"], region["left"]), min(box["right"], region["right"])
+    alerts, jams = [], []
+    for _ in range(count):
+        x, y = round(rng.uniform(left, right), 6), round(rng.uniform(bottom, top), 6)
+        millis = START_MILLIS + rng.randrange(SPAN_MILLIS)
+        if rng.random() < jam_share:
+            jams.append(_jam(rng, x, y, millis))
+        else:
+            alerts.append(_alert(rng, x, y, millis))
+    return {"alerts": alerts, "jams": jams, "startTimeMillis": START_MILLIS,
+            "endTimeMillis": START_MILLIS + SPAN_MILLIS}
+
+class WazeStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, region, events=STUB_EVENTS, seed=SEED, jam_share=STUB_JAM_SHARE):
+        super().__init__(("127.0.0.1", port), StubHandler)
+        self.region = region
+        self.events = events
+        self.seed = seed
+        self.jam_share = jam_share
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/live-map/api/georss"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/live-map/api/georss":
+            self.send_error(404)
+            return
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        try:
+            box = {side: float(params[side]) for side in ("top", "bottom", "left", "right")}
+        except (KeyError, ValueError):
+            self.send_error(400, "top, bottom, left y right son obligatorios")
+            return
+        server = self.server
+        body = json.dumps(generate(box, server.region, server.events, server.seed, server.jam_share)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with server.lock:
+            server.requests += 1
+            server.bytes_sent += len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def main():
+    from scraper import REGION_LIMITS
+    stub = WazeStub(STUB_PORT, REGION_LIMITS)
+    print(f"🛰️ Stub de Waze con {STUB_EVENTS} eventos (semilla {SEED}) en {stub.url}")
+    stub.serve_forever()
+
+if __name__ == "__main__":
+    main()